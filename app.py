@@ -5,16 +5,22 @@ Interfaz principal con Streamlit
 import streamlit as st
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Importar módulos del sistema
 from processors.pdf_processor import PDFProcessor
 from processors.image_processor import ImageProcessor
 from processors.notebook_processor import NotebookProcessor
-from vector_store.pinecone_manager import PineconeManager
+from vector_store import create_vector_store
 from feedback.gpt_feedback import GPTFeedbackGenerator
 from feedback.phase_validator import PhaseValidator
 from feedback.document_type_validator import DocumentTypeValidator
+from feedback.deadline import Deadline
+from feedback.llm_client import get_metrics as get_llm_metrics
+from storage.evaluation_cache import EvaluationCache, file_hash
+from storage.similarity_index import SimilarityIndex
+from storage.submission_history import SubmissionHistory
 
 # Configuración de la página
 st.set_page_config(
@@ -28,19 +34,33 @@ if 'initialized' not in st.session_state:
     st.session_state.initialized = False
     st.session_state.pinecone_manager = None
     st.session_state.feedback_generator = None
+    st.session_state.last_evaluation = None
+
+@st.cache_resource(show_spinner=False)
+def get_detail_executor():
+    """Hilos para generar en segundo plano el feedback detallado (modo de calificación rápida), uno por proceso"""
+    return ThreadPoolExecutor(max_workers=4)
+
+@st.cache_resource(show_spinner=False)
+def get_vector_store():
+    """Almacén vectorial compartido por todas las sesiones (Pinecone conecta su índice en segundo plano)"""
+    return create_vector_store()
+
+@st.cache_resource(show_spinner=False)
+def get_feedback_generator():
+    """Generador de feedback compartido por todas las sesiones"""
+    return GPTFeedbackGenerator()
 
 def initialize_system():
-    """Inicializa los componentes del sistema"""
+    """Inicializa los componentes del sistema (una sola vez por proceso, sin esperar al índice)"""
     try:
-        with st.spinner("Inicializando sistema..."):
-            # Inicializar Pinecone
-            st.session_state.pinecone_manager = PineconeManager()
+        # Almacén vectorial (Pinecone o local según VECTOR_STORE)
+        st.session_state.pinecone_manager = get_vector_store()
 
-            # Inicializar generador de feedback
-            st.session_state.feedback_generator = GPTFeedbackGenerator()
+        # Generador de feedback
+        st.session_state.feedback_generator = get_feedback_generator()
 
-            st.session_state.initialized = True
-            st.success("✓ Sistema inicializado correctamente")
+        st.session_state.initialized = True
     except Exception as e:
         st.error(f"✗ Error inicializando sistema: {e}")
         st.stop()
@@ -53,30 +73,36 @@ def load_available_courses():
     if not courses_dir.exists():
         return courses
 
-    # Configuración de cursos
-    course_configs = {
-        'machine_learning': 'rubrica_estructurada.json',
-        'machine_learning_fase3': 'rubrica_estructurada.json',
-        'big_data_integration': 'rubrica_estructurada.json'
-    }
+    # Todas las carpetas de curso con rúbrica estructurada
+    for rubric_json_path in sorted(courses_dir.glob('*/rubrica_estructurada.json')):
+        with open(rubric_json_path, 'r', encoding='utf-8') as f:
+            rubric_data = json.load(f)
+            courses[rubric_data['nombre_curso']] = {
+                'path': str(rubric_json_path),
+                'data': rubric_data,
+                'from_json': True
+            }
 
-    for course_folder, json_file in course_configs.items():
-        course_path = courses_dir / course_folder
-        rubric_json_path = course_path / json_file
+    return courses
 
-        if rubric_json_path.exists():
-            with open(rubric_json_path, 'r', encoding='utf-8') as f:
-                rubric_data = json.load(f)
-                courses[rubric_data['nombre_curso']] = {
-                    'path': str(rubric_json_path),
-                    'data': rubric_data,
-                    'from_json': True
-                }
+def load_course_condiciones(rubric_path: str) -> dict:
+    """Carga condiciones.json junto a la rúbrica del curso (si existe)"""
+    condiciones_path = Path(rubric_path).parent / 'condiciones.json'
+    if not condiciones_path.exists():
+        return {}
 
-    return courses
+    with open(condiciones_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def process_document(file, file_type, deadline=None):
+    """
+    Procesa el documento subido según su tipo
 
-def process_document(file, file_type):
-    """Procesa el documento subido según su tipo"""
+    Returns:
+        (contenido, error, metadatos): metadatos de la extracción para los evaluadores
+        locales (file_name, file_type, total_pages, total_cells, markdown_cells, images, attachments)
+        y 'partial'=True si el OCR (PDF o imagen) se detuvo por el plazo
+    """
     try:
         # Guardar archivo temporalmente
         temp_path = f"uploads/{file.name}"
@@ -88,12 +114,12 @@ def process_document(file, file_type):
         # Procesar según tipo
         if file_type == 'pdf':
             processor = PDFProcessor()
-            result = processor.process(temp_path)
+            result = processor.process(temp_path, deadline)
             content = result.get('full_text', '')
 
         elif file_type in ['png', 'jpg', 'jpeg']:
             processor = ImageProcessor()
-            result = processor.process(temp_path)
+            result = processor.process(temp_path, deadline=deadline)
             content = result.get('full_text', '')
 
         elif file_type == 'ipynb':
@@ -101,7 +127,7 @@ def process_document(file, file_type):
             result = processor.process(temp_path)
             content = result.get('full_text', '')
         else:
-            return None, "Formato no soportado"
+            return None, "Formato no soportado", {}
 
         # Limpiar archivo temporal
         try:
@@ -109,12 +135,73 @@ def process_document(file, file_type):
         except:
             pass
 
-        return content, None
+        metadata = {
+            'file_name': file.name,
+            'file_type': file_type,
+            'partial': result.get('partial', False)
+        }
+        if file_type == 'pdf':
+            metadata['total_pages'] = result.get('total_pages', 0)
+        elif file_type == 'ipynb':
+            metadata.update({
+                'total_cells': result.get('total_cells', 0),
+                'code_cells': len(result.get('code_cells', [])),
+                'markdown_cells': len(result.get('markdown_cells', [])),
+                'images': result.get('images', 0),
+                'attachments': result.get('attachments', 0)
+            })
+
+        return content, None, metadata
 
     except Exception as e:
-        return None, str(e)
+        return None, str(e), {}
+
+def start_detail_prefetch(last_evaluation: dict):
+    """Genera en segundo plano el feedback detallado de los criterios calificados en modo rápido"""
+    generator = st.session_state.feedback_generator
+    last_evaluation['pending_details'] = {
+        fb['criterion_number']: get_detail_executor().submit(
+            generator.complete_criterion_feedback, fb, last_evaluation['content'], last_evaluation['rubric_data'],
+            last_evaluation['result'].get('evidence_map')
+        )
+        for fb in last_evaluation['result'].get('criteria_feedbacks', [])
+        if fb.get('detail_pending')
+    }
 
-def display_feedback(evaluation_result):
+def merge_detailed_feedback(criterion_number: int = None, wait: bool = False):
+    """
+    Incorpora al resultado el feedback detallado ya generado
+
+    Args:
+        criterion_number: Criterio a completar (None = todos los pendientes)
+        wait: Si True, espera (o genera) el feedback de los criterios solicitados
+    """
+    last_evaluation = st.session_state.last_evaluation
+    result = last_evaluation['result']
+    pending = last_evaluation.get('pending_details', {})
+    updated = False
+
+    for i, fb in enumerate(result.get('criteria_feedbacks', [])):
+        number = fb['criterion_number']
+        if not fb.get('detail_pending') or (criterion_number is not None and number != criterion_number):
+            continue
+
+        future = pending.get(number)
+        if future is not None and (wait or future.done()):
+            result['criteria_feedbacks'][i] = future.result()
+            pending.pop(number)
+            updated = True
+        elif future is None and wait:
+            result['criteria_feedbacks'][i] = st.session_state.feedback_generator.complete_criterion_feedback(
+                fb, last_evaluation['content'], last_evaluation['rubric_data'], result.get('evidence_map')
+            )
+            updated = True
+
+    # Guardar en caché el feedback completado para futuras consultas (nunca resultados parciales)
+    if updated and not result.get('partial'):
+        EvaluationCache().put(last_evaluation['cache_key'], evaluation_result=result)
+
+def display_feedback(evaluation_result, detail_callback=None):
     """Muestra la retroalimentación de manera estructurada - SOPORTA NUEVA ESTRUCTURA"""
 
     # Encabezado con puntaje
@@ -153,6 +240,13 @@ def display_feedback(evaluation_result):
     with col3:
         st.metric("Timestamp", evaluation_result.get('timestamp', 'N/A'))
 
+    if evaluation_result.get('partial'):
+        st.warning("⏱ **Evaluación parcial**: algunos criterios tienen puntaje provisional. Vuelve a evaluar el documento para obtener el resultado completo.")
+
+    # Entregas casi idénticas ya evaluadas (plantillas compartidas o posible plagio)
+    for similar in evaluation_result.get('similar_submissions', []):
+        st.warning(f"👥 **Posible entrega duplicada**: {similar['similarity'] * 100:.0f}% similar a `{similar.get('file_name', 'sin nombre')}` (evaluada el {similar.get('evaluated_at', 'N/A')}). Revisa si se trata de trabajo en grupo o de un posible plagio.")
+
     st.divider()
 
     # Retroalimentación General
@@ -208,6 +302,38 @@ def display_feedback(evaluation_result):
                 level_display = level.upper()
 
             with st.expander(f"🔍 Criterio {criterion_num}: {criterion_name} - {score}/{max_score} pts ({level_color} {level_display})"):
+                if criterion_fb.get('reused'):
+                    reference = criterion_fb['reused'].get('reference')
+                    st.caption(f"♻️ Resultado reutilizado ({criterion_fb['reused']['source']}{': ' + reference if reference else ''}): el contenido de este criterio no cambió.")
+
+                if criterion_fb.get('provisional'):
+                    st.caption("⏱ Estimación provisional calculada localmente: no alcanzó a evaluarse con GPT dentro del tiempo máximo.")
+
+                if criterion_fb.get('method') == 'local':
+                    st.caption("📐 Calificado automáticamente con verificaciones estructurales de la entrega (sin GPT).")
+
+                if criterion_fb.get('method') == 'retrieval':
+                    st.caption(f"🔎 Sin evidencia en el documento según la búsqueda semántica (similitud {criterion_fb['relevance_score']}); no se evaluó con GPT.")
+
+                task_check = criterion_fb.get('task_check')
+                if task_check:
+                    summary = task_check['summary']
+                    st.caption(f"🧾 Tareas de la guía: {task_check['completion_percentage']}% cumplidas ({summary['completed']} completas, {summary['partial']} parciales de {summary['total_tasks']}).")
+                    for task in task_check.get('tasks_missing', []):
+                        st.markdown(f"- ❌ {task}")
+
+                # Calificación rápida: razones breves; el feedback detallado se genera bajo demanda
+                if criterion_fb.get('detail_pending'):
+                    st.markdown("**📌 Razones de la calificación:**")
+                    for reason in criterion_fb.get('reasons', []):
+                        st.markdown(f"- {reason}")
+
+                    if detail_callback and st.button("📝 Ver retroalimentación detallada", key=f"detalle_{criterion_num}"):
+                        with st.spinner("Generando retroalimentación detallada..."):
+                            detail_callback(criterion_num)
+                        st.rerun()
+                    continue
+
                 # Feedback del criterio
                 st.write(criterion_fb['feedback'])
 
@@ -255,6 +381,119 @@ def display_feedback(evaluation_result):
                     for improvement in section_fb['improvements']:
                         st.markdown(f"- {improvement}")
 
+def complete_batch_detail(submission_id: str, criterion_number: int):
+    """Genera el feedback detallado de un criterio de una entrega del lote y lo guarda en caché"""
+    batch = st.session_state.batch_results
+    result = batch['results'][submission_id]
+
+    for i, fb in enumerate(result.get('criteria_feedbacks', [])):
+        if fb['criterion_number'] == criterion_number and fb.get('detail_pending'):
+            result['criteria_feedbacks'][i] = st.session_state.feedback_generator.complete_criterion_feedback(
+                fb, batch['contents'][submission_id], batch['rubric_data'], result.get('evidence_map')
+            )
+
+    if submission_id in batch['cache_keys'] and not result.get('partial'):
+        EvaluationCache().put(batch['cache_keys'][submission_id], evaluation_result=result)
+
+def evaluate_batch_ui(selected_course: dict, selected_course_name: str, rubric_data: dict, max_seconds: int):
+    """Modo lote: evalúa varias entregas agrupando el mismo criterio de varias entregas por llamada"""
+    uploaded_files = st.file_uploader(
+        "Selecciona las entregas de los estudiantes:",
+        type=['pdf', 'png', 'jpg', 'jpeg', 'ipynb'],
+        accept_multiple_files=True,
+        help="Cada criterio se califica para varias entregas en una sola llamada. El feedback detallado de cada criterio se genera bajo demanda al revisar la entrega."
+    )
+
+    if uploaded_files and st.button("🚀 Evaluar Lote", type="primary"):
+        deadline = Deadline(max_seconds or None)
+        generator = st.session_state.feedback_generator
+        cache = EvaluationCache()
+        condiciones = load_course_condiciones(selected_course['path'])
+        type_validator = DocumentTypeValidator()
+        phase_validator = PhaseValidator()
+
+        # Cada entrega se identifica por su posición en la carga: varios estudiantes suelen
+        # subir archivos con el mismo nombre (p. ej. Fase3.ipynb); el nombre es solo una etiqueta
+        results, submissions, cache_keys, rejected, contents, labels = {}, [], {}, {}, {}, {}
+        progress = st.progress(0.0, text="Procesando documentos...")
+
+        for i, uploaded_file in enumerate(uploaded_files, 1):
+            submission_id = str(i)
+            labels[submission_id] = f"{i}. {uploaded_file.name}"
+            progress.progress(i / len(uploaded_files), text=f"Procesando {uploaded_file.name}...")
+            cache_key = cache.fingerprint(uploaded_file.getvalue(), rubric_data, generator.model_config(), condiciones,
+                                          uploaded_file.name)
+            cached = cache.get(cache_key) or {}
+            if cached.get('evaluation_result'):
+                results[submission_id] = cached['evaluation_result']
+                contents[submission_id] = cached.get('content', '')
+                cache_keys[submission_id] = cache_key
+                continue
+
+            content, error, document_metadata = process_document(uploaded_file, uploaded_file.name.split('.')[-1].lower(), deadline)
+            if error or not content or len(content.strip()) < 50:
+                rejected[submission_id] = error or "Documento vacío o sin texto extraíble"
+                continue
+
+            # Mismas validaciones que la evaluación individual (bloquean solo con confianza alta/media)
+            type_result = type_validator.validate_is_student_work(content, deadline.stage(30))
+            if not type_result['is_student_work'] and type_result['confidence'] in ['alta', 'media']:
+                rejected[submission_id] = type_result['recommendation']
+                continue
+            phase_result = phase_validator.validate_document_phase(content, rubric_data, deadline.stage(30))
+            if not phase_result['is_valid'] and phase_result['confidence'] in ['alta', 'media']:
+                rejected[submission_id] = phase_result['recommendation']
+                continue
+
+            if not document_metadata.get('partial'):
+                cache.put(cache_key, content=content, document_metadata=document_metadata,
+                          file_name=uploaded_file.name, course=selected_course_name)
+                cache_keys[submission_id] = cache_key
+            contents[submission_id] = content
+            submissions.append({'id': submission_id, 'content': content, 'file_name': uploaded_file.name,
+                                'metadata': document_metadata})
+
+        if submissions:
+            with st.spinner(f"Calificando {len(submissions)} entrega(s) por lotes..."):
+                batch_results = generator.evaluate_batch(submissions, rubric_data, deadline=deadline)
+
+            for submission_id, evaluation_result in batch_results.items():
+                results[submission_id] = evaluation_result
+                if submission_id in cache_keys and not evaluation_result.get('partial'):
+                    cache.put(cache_keys[submission_id], evaluation_result=evaluation_result)
+
+        progress.empty()
+        st.session_state.batch_results = {
+            'course': selected_course_name, 'results': results, 'rejected': rejected, 'labels': labels,
+            'contents': contents, 'cache_keys': cache_keys, 'rubric_data': rubric_data
+        }
+
+    batch = st.session_state.get('batch_results')
+    if not batch or batch['course'] != selected_course_name:
+        return
+
+    st.divider()
+    st.subheader("📚 Resultados del lote")
+    st.dataframe(
+        [
+            {
+                'Archivo': batch['labels'][submission_id],
+                'Puntaje': f"{result['total_score']}/{result['max_score']}",
+                'Estado': 'Parcial' if result.get('partial') else 'Completo'
+            }
+            for submission_id, result in batch['results'].items()
+        ],
+        use_container_width=True
+    )
+    for submission_id, reason in batch['rejected'].items():
+        st.warning(f"⚠️ `{batch['labels'][submission_id]}` no se evaluó: {reason}")
+
+    if batch['results']:
+        selected_id = st.selectbox("Ver detalle de la entrega:", list(batch['results'].keys()),
+                                   format_func=lambda submission_id: batch['labels'][submission_id])
+        display_feedback(batch['results'][selected_id],
+                         detail_callback=lambda number: complete_batch_detail(selected_id, number))
+
 def main():
     """Función principal de la aplicación"""
 
@@ -320,10 +559,13 @@ def main():
             st.sidebar.warning("No hay cursos configurados. Crea uno nuevo.")
             st.stop()
 
-        # Seleccionar curso
+        # Seleccionar curso (preselecciona el sugerido por el enrutador local, si existe)
+        course_names = list(courses.keys())
+        suggested_course = st.session_state.get('suggested_course')
         selected_course_name = st.sidebar.selectbox(
             "Selecciona un curso:",
-            list(courses.keys())
+            course_names,
+            index=course_names.index(suggested_course) if suggested_course in course_names else 0
         )
 
         selected_course = courses[selected_course_name]
@@ -342,22 +584,57 @@ def main():
 
         st.sidebar.info(f"📋 {label}: {num_items}")
 
+        # Presupuesto de tiempo: al agotarse se entrega un resultado parcial marcado como provisional
+        max_seconds = st.sidebar.number_input(
+            "⏱ Tiempo máximo de evaluación (segundos)",
+            min_value=0,
+            value=int(os.getenv('EVALUATION_TIME_BUDGET', '180')),
+            step=30,
+            help="0 = sin límite. Los criterios que no alcancen a evaluarse reciben una estimación provisional."
+        )
+
+        # Métricas de las llamadas a GPT (hedging y circuit breaker por modelo)
+        llm_metrics = get_llm_metrics()
+        if llm_metrics:
+            with st.sidebar.expander("📈 Métricas de GPT"):
+                for model, metrics in llm_metrics.items():
+                    st.markdown(f"**{model}** — circuito `{metrics['breaker_state']}`")
+                    st.caption(
+                        f"Llamadas: {metrics['calls']} · Hedging: {metrics['hedge_rate'] * 100:.1f}% "
+                        f"({metrics['hedge_wins']} ganadas) · Fallas: {metrics['failures']} · "
+                        f"Rechazadas: {metrics['short_circuited']} · p95: {metrics['p95_seconds'] or 'N/A'} s"
+                    )
+
+        if not st.session_state.pinecone_manager.is_ready():
+            st.sidebar.caption("⏳ Conectando con el índice vectorial; mientras tanto se evalúa sin búsqueda de criterios relevantes.")
+
         # Botón para recargar rúbricas en Pinecone
         if st.sidebar.button("🔄 Recargar Rúbricas en Pinecone"):
             with st.spinner("Cargando rúbricas..."):
-                st.session_state.pinecone_manager.load_all_rubrics()
-                st.sidebar.success("✓ Rúbricas recargadas")
+                sync = st.session_state.pinecone_manager.load_all_rubrics()
+                if sync['failed']:
+                    st.sidebar.error(f"✗ No se pudieron cargar: {', '.join(sync['failed'])} (sus criterios no se modificaron)")
+                if sync['indexed'] or sync['deleted']:
+                    st.sidebar.success(f"✓ Rúbricas recargadas: {sync['indexed']} criterio(s) indexado(s), {sync['deleted']} eliminado(s)")
+                elif not sync['failed']:
+                    st.sidebar.success("✓ Rúbricas al día: no hubo cambios")
 
         st.divider()
 
         # Área principal - Subir documento
         st.header(f"📤 Subir Documento para: {selected_course_name}")
 
-        uploaded_file = st.file_uploader(
-            "Selecciona el documento del estudiante:",
-            type=['pdf', 'png', 'jpg', 'jpeg', 'ipynb'],
-            help="Formatos soportados: PDF, imágenes (PNG/JPG), Jupyter Notebooks (.ipynb)"
-        )
+        batch_mode = st.toggle("📚 Modo lote (varias entregas)", help="Evalúa varias entregas agrupando cada criterio de varias entregas en una sola llamada a GPT.")
+
+        if batch_mode:
+            evaluate_batch_ui(selected_course, selected_course_name, rubric_data, max_seconds)
+            uploaded_file = None
+        else:
+            uploaded_file = st.file_uploader(
+                "Selecciona el documento del estudiante:",
+                type=['pdf', 'png', 'jpg', 'jpeg', 'ipynb'],
+                help="Formatos soportados: PDF, imágenes (PNG/JPG), Jupyter Notebooks (.ipynb)"
+            )
 
         if uploaded_file:
             # Detectar tipo de archivo
@@ -365,27 +642,82 @@ def main():
 
             st.info(f"📄 Archivo: {uploaded_file.name} ({file_extension.upper()})")
 
+            student_id = st.text_input(
+                "👤 Estudiante (nombre o código, opcional):",
+                help="Permite enlazar reentregas: solo se re-evalúan los ejercicios que cambiaron respecto a la versión anterior."
+            )
+
+            force_reevaluate = st.checkbox(
+                "🔁 Forzar re-evaluación",
+                help="Ignora el resultado guardado para este mismo archivo, rúbrica y modelo, y vuelve a evaluar desde cero."
+            )
+
+            check_tasks = st.checkbox(
+                "🧾 Verificar tareas punto por punto",
+                help="Verifica cada tarea de la guía (condiciones del curso) y la combina con el puntaje de cada criterio. Agrega una llamada a GPT solo para las tareas que no se resuelven localmente."
+            )
+
             # Botón para evaluar
             if st.button("🚀 Evaluar Documento", type="primary"):
+                deadline = Deadline(max_seconds or None)
+                document_metadata = {}
+
+                # CACHE: mismo archivo + misma versión de rúbrica + mismo modelo y búsqueda = mismo resultado
+                cache = EvaluationCache()
+                file_digest = file_hash(uploaded_file.getvalue())
+                vector_store = st.session_state.pinecone_manager
+                model_config = st.session_state.feedback_generator.model_config(
+                    check_tasks, vector_store.retrieval_config() if vector_store.is_ready() else None
+                )
+                cache_key = cache.fingerprint(
+                    uploaded_file.getvalue(),
+                    rubric_data,
+                    model_config,
+                    load_course_condiciones(selected_course['path']),
+                    uploaded_file.name
+                )
+
+                if force_reevaluate:
+                    cache.invalidate(cache_key)
+
+                cached = cache.get(cache_key) or {}
+
+                if cached.get('evaluation_result'):
+                    st.info(f"⚡ **Resultado en caché**: esta entrega ya fue evaluada el {cached['updated_at']} con la misma rúbrica y modelo. No se repitió OCR ni llamadas a GPT. Marca *Forzar re-evaluación* para evaluarla de nuevo.")
 
                 # Procesar documento
-                with st.spinner("Procesando documento..."):
-                    content, error = process_document(uploaded_file, file_extension)
+                if 'content' in cached:
+                    content = cached['content']
+                    document_metadata = cached.get('document_metadata', {})
+                    st.success(f"✓ Documento recuperado de caché: {len(content)} caracteres extraídos")
+                else:
+                    with st.spinner("Procesando documento..."):
+                        content, error, document_metadata = process_document(uploaded_file, file_extension, deadline)
 
-                if error:
-                    st.error(f"✗ Error procesando documento: {error}")
-                    st.stop()
+                    if error:
+                        st.error(f"✗ Error procesando documento: {error}")
+                        st.stop()
 
-                if not content or len(content.strip()) < 50:
-                    st.warning("⚠ El documento parece estar vacío o no se pudo extraer texto.")
-                    st.stop()
+                    if not content or len(content.strip()) < 50:
+                        st.warning("⚠ El documento parece estar vacío o no se pudo extraer texto.")
+                        st.stop()
 
-                st.success(f"✓ Documento procesado: {len(content)} caracteres extraídos")
+                    if document_metadata.get('partial'):
+                        st.warning("⏱ Se alcanzó el tiempo máximo durante el OCR: solo se procesaron algunas páginas. La evaluación será parcial.")
+                    else:
+                        cache.put(cache_key, content=content, document_metadata=document_metadata,
+                                  file_name=uploaded_file.name, course=selected_course_name)
+                    st.success(f"✓ Documento procesado: {len(content)} caracteres extraídos")
 
                 # VALIDACIÓN 1: Tipo de Documento - Prevenir calificar guías/instrucciones
                 with st.spinner("🔍 Validando que el documento sea una entrega del estudiante..."):
-                    type_validator = DocumentTypeValidator()
-                    type_result = type_validator.validate_is_student_work(content)
+                    type_result = cached.get('type_validation')
+                    if type_result is None:
+                        type_validator = DocumentTypeValidator()
+                        type_result = type_validator.validate_is_student_work(content, deadline.stage(30))
+                        # Un veredicto sobre el texto truncado por el plazo no se guarda
+                        if type_result.get('method') != 'error' and not document_metadata.get('partial'):
+                            cache.put(cache_key, type_validation=type_result)
 
                     # Mostrar resultado de validación de tipo
                     if type_result['is_student_work']:
@@ -429,8 +761,13 @@ def main():
 
                 # VALIDACIÓN 2: Fase - Prevenir evaluación cruzada
                 with st.spinner("🔍 Validando correspondencia con la fase seleccionada..."):
-                    validator = PhaseValidator()
-                    validation_result = validator.validate_document_phase(content, rubric_data)
+                    validation_result = cached.get('phase_validation')
+                    if validation_result is None:
+                        validator = PhaseValidator()
+                        validation_result = validator.validate_document_phase(content, rubric_data, deadline.stage(30))
+                        # Un veredicto sobre el texto truncado por el plazo no se guarda
+                        if validation_result.get('method') != 'error' and not document_metadata.get('partial'):
+                            cache.put(cache_key, phase_validation=validation_result)
 
                     # Mostrar resultado de validación
                     if validation_result['is_valid']:
@@ -463,6 +800,11 @@ def main():
                                 if validation_result['phase_mismatch']:
                                     st.info(f"💡 **Sugerencia**: Este documento parece corresponder a **'{validation_result['phase_mismatch']}'**. Por favor, selecciona esa fase en lugar de '{rubric_data.get('fase', 'esta fase')}'.")
 
+                                    # Enrutamiento local: dejar preseleccionado el curso sugerido
+                                    if validation_result.get('method') == 'local' and validation_result['phase_mismatch'] in courses:
+                                        st.session_state.suggested_course = validation_result['phase_mismatch']
+                                        st.info("🔀 El curso sugerido quedó preseleccionado en el menú lateral. Presiona **Evaluar Documento** de nuevo para continuar.")
+
                             st.warning("⚠️ **La evaluación ha sido bloqueada para evitar resultados incorrectos.** Por favor, verifica que hayas seleccionado la fase correcta que corresponde a tu documento.")
                             st.stop()  # Detener ejecución
                         else:
@@ -470,38 +812,145 @@ def main():
                             st.warning(validation_result['recommendation'])
                             st.info("⚠️ La validación tiene confianza baja. Procede con precaución. Si sabes que el documento corresponde a esta fase, puedes continuar con la evaluación.")
 
-                # Buscar secciones relevantes en Pinecone (opcional)
-                with st.spinner("Analizando relevancia con rúbrica..."):
-                    relevant_sections = st.session_state.pinecone_manager.search_relevant_criteria(
-                        content, selected_course_name, top_k=5
+                evaluation_result = cached.get('evaluation_result')
+
+                if evaluation_result is None:
+                    context_key = cache.context_fingerprint(
+                        rubric_data,
+                        model_config,
+                        load_course_condiciones(selected_course['path'])
                     )
 
-                # Generar retroalimentación
-                with st.spinner("Generando retroalimentación con GPT..."):
-                    evaluation_result = st.session_state.feedback_generator.evaluate_document(
-                        document_content=content,
-                        rubric_data=rubric_data,
-                        relevant_sections=relevant_sections,
-                        file_name=uploaded_file.name  # NUEVO: Pasar nombre del archivo
+                    generator = st.session_state.feedback_generator
+                    reusable_feedbacks = {}
+
+                    # RÚBRICA EDITADA: el mismo archivo ya se evaluó con otra versión de la rúbrica
+                    previous = None if force_reevaluate else cache.previous_evaluation(
+                        file_digest, selected_course_name, exclude_key=cache_key
+                    )
+                    if previous:
+                        reusable_feedbacks = generator.select_unchanged_definition_feedbacks(
+                            previous['evaluation_result'], rubric_data
+                        )
+                        st.info(f"📝 Este archivo ya fue evaluado con otra versión de la rúbrica. Se reutilizarán {len(reusable_feedbacks)} criterio(s) sin cambios y solo se re-evaluarán los criterios editados.")
+
+                    # REENTREGA: reutilizar los ejercicios que no cambiaron respecto a la versión anterior
+                    history = SubmissionHistory()
+                    previous_version = history.latest(student_id, selected_course_name) if student_id.strip() else None
+                    if previous_version and not force_reevaluate and previous_version['key'] != cache_key:
+                        reference = cache.get(previous_version['key']) or {}
+                        if reference.get('evaluation_result'):
+                            resubmission_feedbacks = generator.select_reusable_feedbacks(
+                                reference['evaluation_result'], reference['content'], content, rubric_data,
+                                source='versión anterior del estudiante', reference_label=previous_version['file_name']
+                            )
+                            reusable_feedbacks = {**resubmission_feedbacks, **reusable_feedbacks}
+                            total_criteria = len(rubric_data.get('criterios_evaluacion', []))
+                            st.info(f"🔁 Reentrega detectada (versión anterior: `{previous_version['file_name']}`, {previous_version['evaluated_at']}). {len(resubmission_feedbacks)} de {total_criteria} criterio(s) sin cambios se conservarán; solo se re-evalúan los ejercicios modificados.")
+
+                    # CASI DUPLICADOS: reutilizar criterios de una entrega ya evaluada casi idéntica
+                    similarity_index = SimilarityIndex()
+                    similar_submissions = similarity_index.find_similar(
+                        content, selected_course_name, exclude_key=cache_key
                     )
 
-                # Mostrar resultados
+                    for similar in ([] if force_reevaluate else similar_submissions):
+                        reference = cache.get(similar['key']) or {}
+                        if similar.get('context') == context_key and reference.get('evaluation_result'):
+                            near_duplicate_feedbacks = generator.select_reusable_feedbacks(
+                                reference['evaluation_result'], reference['content'], content, rubric_data,
+                                source='entrega casi idéntica', reference_label=similar.get('file_name', ''),
+                                exercise_only=True
+                            )
+                            reusable_feedbacks = {**near_duplicate_feedbacks, **reusable_feedbacks}
+                            break
+
+                    if similar_submissions:
+                        st.warning(f"👥 Se encontraron {len(similar_submissions)} entrega(s) casi idéntica(s) ya evaluada(s). Se reutilizarán los criterios sin cambios.")
+
+                    # Buscar criterios relevantes (todos, con su similitud): descarta los claramente
+                    # ausentes sin GPT y ordena la evaluación por relevancia
+                    with st.spinner("Analizando relevancia con rúbrica..."):
+                        relevant_sections = st.session_state.pinecone_manager.search_relevant_criteria(
+                            content, selected_course_name,
+                            top_k=len(rubric_data.get('criterios_evaluacion') or rubric_data.get('condiciones_entrega', [])) or 5
+                        )
+
+                    # Generar retroalimentación
+                    with st.spinner("Generando retroalimentación con GPT..."):
+                        evaluation_result = generator.evaluate_document(
+                            document_content=content,
+                            rubric_data=rubric_data,
+                            relevant_sections=relevant_sections,
+                            file_name=uploaded_file.name,  # NUEVO: Pasar nombre del archivo
+                            reusable_feedbacks=reusable_feedbacks,
+                            detail='fast',  # Calificación rápida; feedback detallado bajo demanda
+                            deadline=deadline,
+                            document_metadata=document_metadata,  # Criterios estructurales sin GPT
+                            check_tasks=check_tasks
+                        )
+
+                    if evaluation_result.get('partial') or document_metadata.get('partial'):
+                        # Resultado parcial: se muestra pero no se guarda ni se reutiliza
+                        evaluation_result['partial'] = True
+                        st.warning(f"⏱ Se alcanzó el tiempo máximo de evaluación. {evaluation_result.get('provisional_criteria', 0)} criterio(s) tienen una estimación provisional. Presiona **Evaluar Documento** de nuevo para completarlos.")
+                    elif evaluation_result.get('success'):
+                        evaluation_result['similar_submissions'] = [
+                            {k: similar[k] for k in ('file_name', 'similarity', 'evaluated_at') if k in similar}
+                            for similar in similar_submissions
+                        ]
+                        cache.put(cache_key, evaluation_result=evaluation_result)
+                        cache.link_version(file_digest, selected_course_name, cache_key)
+                        if student_id.strip():
+                            history.record(student_id, selected_course_name, cache_key,
+                                           uploaded_file.name, evaluation_result['timestamp'])
+                        similarity_index.add(
+                            cache_key, content, selected_course_name,
+                            file_name=uploaded_file.name,
+                            context=context_key,
+                            evaluated_at=evaluation_result['timestamp']
+                        )
+
+                # Guardar resultado en la sesión (el feedback detallado se completa después)
                 if evaluation_result.get('success'):
-                    st.divider()
-                    display_feedback(evaluation_result)
-
-                    # Opción para descargar reporte
-                    st.divider()
-                    report_json = json.dumps(evaluation_result, indent=2, ensure_ascii=False)
-                    st.download_button(
-                        label="📥 Descargar Reporte (JSON)",
-                        data=report_json,
-                        file_name=f"evaluacion_{selected_course_name.replace(' ', '_')}_{uploaded_file.name}.json",
-                        mime="application/json"
-                    )
+                    st.session_state.last_evaluation = {
+                        'result': evaluation_result,
+                        'content': content,
+                        'rubric_data': rubric_data,
+                        'cache_key': cache_key,
+                        'file_name': uploaded_file.name,
+                        'course': selected_course_name
+                    }
+                    start_detail_prefetch(st.session_state.last_evaluation)
                 else:
+                    st.session_state.last_evaluation = None
                     st.error("✗ Error generando retroalimentación")
 
+            # Mostrar resultados (persisten entre interacciones para generar el feedback detallado)
+            last_evaluation = st.session_state.get('last_evaluation')
+            if last_evaluation and last_evaluation['file_name'] == uploaded_file.name and last_evaluation['course'] == selected_course_name:
+                merge_detailed_feedback()
+                evaluation_result = last_evaluation['result']
+
+                st.divider()
+                if any(fb.get('detail_pending') for fb in evaluation_result.get('criteria_feedbacks', [])):
+                    if st.button("📝 Completar toda la retroalimentación detallada"):
+                        with st.spinner("Generando retroalimentación detallada..."):
+                            merge_detailed_feedback(wait=True)
+                        st.rerun()
+
+                display_feedback(evaluation_result, detail_callback=lambda number: merge_detailed_feedback(number, wait=True))
+
+                # Opción para descargar reporte
+                st.divider()
+                report_json = json.dumps(evaluation_result, indent=2, ensure_ascii=False)
+                st.download_button(
+                    label="📥 Descargar Reporte (JSON)",
+                    data=report_json,
+                    file_name=f"evaluacion_{selected_course_name.replace(' ', '_')}_{uploaded_file.name}.json",
+                    mime="application/json"
+                )
+
     else:
         # Modo: Crear nuevo curso
         st.header("➕ Crear Nuevo Curso")
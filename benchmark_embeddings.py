@@ -0,0 +1,123 @@
+"""
+Benchmark de dimensión y cuantización de embeddings en el almacén vectorial local
+
+Compara, sobre las rúbricas de courses/, la calidad de recuperación frente a la
+configuración de referencia (3072 dimensiones en float32) con la memoria recorrida
+por búsqueda y la latencia de consulta:
+
+    python benchmark_embeddings.py [--top-k 5] [--dims 3072 1024 512 256] [--repeat 50]
+
+Requiere OPENAI_API_KEY (los embeddings quedan en el cache de disco, así que repetir
+el benchmark no vuelve a llamar a la API).
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Agregar path del proyecto
+sys.path.insert(0, str(Path(__file__).parent))
+
+from feedback.detailed_task_checker import DetailedTaskChecker
+from feedback.evidence_extractor import split_segments
+from vector_store.local_vector_store import LocalVectorStore
+
+
+def load_queries():
+    """
+    Consultas de prueba: fragmentos del documento de ejemplo, condiciones de entrega de los
+    cursos y ejercicios con sus tareas (cursos como Fase 3 solo describen 'ejercicios')
+    """
+    queries = []
+    document = Path('test_dbscan_document.txt')
+    if document.exists():
+        queries.extend(segment['text'] for segment in split_segments(document.read_text(encoding='utf-8'), 1500))
+
+    for condiciones_path in sorted(Path('courses').glob('*/condiciones.json')):
+        with open(condiciones_path, 'r', encoding='utf-8') as f:
+            condiciones = json.load(f)
+        for seccion in condiciones.get('condiciones_entrega', []):
+            queries.append(f"{seccion['seccion']}: " + '; '.join(seccion.get('criterios', [])))
+        for ejercicio in condiciones.get('ejercicios', []):
+            tasks = DetailedTaskChecker.get_tasks(ejercicio.get('numero'), condiciones)['tasks']
+            queries.append(f"{ejercicio.get('nombre', '')}: {ejercicio.get('descripcion', '')}")
+            queries.extend(tasks)
+    return queries
+
+
+def ranked_ids(results):
+    return [(metadata.get('course'), metadata.get('criterion_number', metadata.get('section'))) for metadata, _ in results]
+
+
+def run_config(dimensions, quantization, rescore, queries, top_k, repeat):
+    """Indexa las rúbricas con la configuración dada y mide las búsquedas de todas las consultas en todos los cursos"""
+    store = LocalVectorStore(tempfile.mkdtemp(prefix='bench_vs_'), dimensions=dimensions,
+                             quantization=quantization, rescore=rescore)
+    store.load_all_rubrics()
+    courses = list(store.get_index_stats()['courses'].keys())
+    query_vectors = store.create_embeddings(queries)
+
+    rankings = {course: store._query_many(query_vectors, top_k, course) for course in courses}
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for course in courses:
+            store._query_many(query_vectors, top_k, course)
+    elapsed = time.perf_counter() - start
+
+    stats = store.get_index_stats()
+    return {
+        'rankings': {course: [ranked_ids(results) for results in per_query] for course, per_query in rankings.items()},
+        'search_bytes': stats['search_bytes'],
+        'disk_bytes': store.vectors_path.stat().st_size,
+        'ms_per_query': elapsed / (repeat * len(courses) * len(queries)) * 1000
+    }
+
+
+def recall_at_k(rankings, reference, top_k):
+    """Proporción de los top-k de referencia que recupera la configuración (promedio por consulta y curso)"""
+    values = []
+    for course, per_query in reference.items():
+        for expected, got in zip(per_query, rankings[course]):
+            if expected:
+                values.append(len(set(expected[:top_k]) & set(got[:top_k])) / len(expected[:top_k]))
+    return sum(values) / len(values) if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--dims', type=int, nargs='+', default=[3072, 1536, 1024, 512, 256])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    queries = load_queries()
+    print(f"✓ {len(queries)} consultas de prueba")
+
+    configs = [('none', False), ('int8', True), ('int8', False)]
+    reference = run_config(3072, 'none', False, queries, args.top_k, args.repeat)
+
+    rows = []
+    for dimensions in args.dims:
+        for quantization, rescore in configs:
+            result = reference if (dimensions, quantization) == (3072, 'none') else \
+                run_config(dimensions, quantization, rescore, queries, args.top_k, args.repeat)
+            rows.append((dimensions, quantization + (' + rescore' if rescore else ''), result))
+
+    print("\n" + "=" * 80)
+    print(f"{'Dim':>6}  {'Almacenamiento':<16} {'Recall@' + str(args.top_k):>9} {'Top-1':>7} {'KB búsqueda':>12} {'KB disco':>10} {'ms/consulta':>12}")
+    print("=" * 80)
+    for dimensions, label, result in rows:
+        print(
+            f"{dimensions:>6}  {label:<16} "
+            f"{recall_at_k(result['rankings'], reference['rankings'], args.top_k):>9.3f} "
+            f"{recall_at_k(result['rankings'], reference['rankings'], 1):>7.3f} "
+            f"{result['search_bytes'] / 1024:>12.1f} {result['disk_bytes'] / 1024:>10.1f} "
+            f"{result['ms_per_query']:>12.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
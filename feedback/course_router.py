@@ -0,0 +1,190 @@
+"""
+Enrutador Local de Curso/Fase
+Clasifica un documento contra todos los cursos usando centroides TF-IDF
+construidos desde rubrica_estructurada.json y condiciones.json (sin LLM)
+"""
+import json
+import math
+import re
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+# Palabras vacías (español/inglés) que no aportan al vocabulario del curso
+STOPWORDS = {
+    'the', 'and', 'for', 'with', 'that', 'this', 'are', 'from', 'into', 'each', 'their', 'his', 'her',
+    'los', 'las', 'del', 'con', 'por', 'para', 'una', 'uno', 'unos', 'unas', 'que', 'como', 'sus',
+    'cada', 'segun', 'entre', 'sobre', 'este', 'esta', 'estos', 'estas', 'ese', 'esa', 'sin', 'mas',
+    'muy', 'tambien', 'cual', 'cuales', 'donde', 'cuando', 'ser', 'son', 'fue', 'han', 'hay', 'puede',
+    'debe', 'estudiante', 'pts', 'puntos', 'puntaje', 'nivel', 'alto', 'medio', 'bajo', 'high',
+    'average', 'low', 'criterio', 'ejercicio', 'fase', 'curso', 'manera', 'detallada', 'palabras'
+}
+
+TOKEN_PATTERN = re.compile(r'[a-z][a-z0-9_]{2,}')
+
+
+def tokenize(text: str) -> List[str]:
+    """Normaliza (minúsculas, sin tildes) y divide el texto en términos"""
+    normalized = unicodedata.normalize('NFKD', text.lower())
+    normalized = ''.join(c for c in normalized if not unicodedata.combining(c))
+    return [t for t in TOKEN_PATTERN.findall(normalized) if t not in STOPWORDS]
+
+
+def _collect_strings(data) -> List[str]:
+    """Recorre un JSON y devuelve todos sus textos"""
+    if isinstance(data, str):
+        return [data]
+    if isinstance(data, dict):
+        return [s for value in data.values() for s in _collect_strings(value)]
+    if isinstance(data, list):
+        return [s for value in data for s in _collect_strings(value)]
+    return []
+
+
+def _normalize(vector: Dict[str, float]) -> Dict[str, float]:
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    if norm == 0:
+        return {}
+    return {term: w / norm for term, w in vector.items()}
+
+
+def _cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(term, 0.0) for term, w in a.items())
+
+
+class CourseRouter:
+    """Clasifica documentos por curso comparando vectores TF-IDF dispersos con centroides"""
+
+    # Cache a nivel de proceso: {courses_dir: (firma de archivos, router)}
+    _cache = {}
+
+    def __init__(self, course_documents: Dict[str, List[str]]):
+        """
+        Construye los centroides de cada curso
+
+        Args:
+            course_documents: {nombre_curso: [textos del curso (criterios, tareas, ...)]}
+        """
+        self.course_names = list(course_documents.keys())
+
+        # Frecuencia documental: cada curso cuenta como un documento
+        doc_freq = Counter()
+        course_terms = {}
+        for course_name, texts in course_documents.items():
+            term_lists = [tokenize(text) for text in texts]
+            course_terms[course_name] = [terms for terms in term_lists if terms]
+            doc_freq.update({term for terms in term_lists for term in terms})
+
+        total = len(course_documents)
+        self.idf = {term: math.log((1 + total) / (1 + df)) + 1 for term, df in doc_freq.items()}
+
+        # Centroide = promedio de los vectores normalizados de cada texto del curso
+        self.centroids = {}
+        for course_name, term_lists in course_terms.items():
+            centroid = Counter()
+            for terms in term_lists:
+                for term, weight in self._vectorize_terms(terms).items():
+                    centroid[term] += weight
+            self.centroids[course_name] = _normalize(dict(centroid))
+
+    @classmethod
+    def from_courses_dir(cls, courses_dir: str = 'courses') -> 'CourseRouter':
+        """
+        Construye (o reutiliza) el enrutador a partir de las carpetas de cursos
+
+        Se reconstruye solo si cambia algún rubrica_estructurada.json o condiciones.json
+        """
+        courses_path = Path(courses_dir)
+        files = sorted(courses_path.glob('*/rubrica_estructurada.json')) + \
+            sorted(courses_path.glob('*/condiciones.json'))
+        signature = tuple((str(f), f.stat().st_mtime) for f in files)
+
+        cached = cls._cache.get(str(courses_path))
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        course_documents = {}
+        for rubric_path in sorted(courses_path.glob('*/rubrica_estructurada.json')):
+            with open(rubric_path, 'r', encoding='utf-8') as f:
+                rubric_data = json.load(f)
+
+            texts = [rubric_data.get('nombre_curso', ''), rubric_data.get('fase', '')]
+            texts.extend(_collect_strings(rubric_data.get('criterios_evaluacion', [])))
+            texts.append(rubric_data.get('resultado_aprendizaje', ''))
+
+            condiciones_path = rubric_path.parent / 'condiciones.json'
+            if condiciones_path.exists():
+                with open(condiciones_path, 'r', encoding='utf-8') as f:
+                    texts.extend(_collect_strings(json.load(f)))
+
+            course_documents[rubric_data['nombre_curso']] = texts
+
+        router = cls(course_documents)
+        cls._cache[str(courses_path)] = (signature, router)
+        print(f"  [ROUTER] Centroides construidos para {len(course_documents)} cursos")
+        return router
+
+    def _vectorize_terms(self, terms: List[str]) -> Dict[str, float]:
+        """Vector TF-IDF normalizado (términos fuera del vocabulario se ignoran)"""
+        counts = Counter(t for t in terms if t in self.idf)
+        vector = {term: (1 + math.log(tf)) * self.idf[term] for term, tf in counts.items()}
+        return _normalize(vector)
+
+    def route(self, document_content: str, top_terms: int = 8) -> Dict:
+        """
+        Clasifica el documento contra todos los cursos
+
+        Args:
+            document_content: Texto extraído del documento
+            top_terms: Número de términos compartidos a reportar para el mejor curso
+
+        Returns:
+            Dict con:
+            - best_course: str (curso más similar)
+            - margin: float (diferencia de similitud con el segundo curso)
+            - scores: dict (similitud coseno por curso)
+            - matched_terms: list (términos que más aportan al mejor curso)
+        """
+        doc_vector = self._vectorize_terms(tokenize(document_content))
+        scores = {name: _cosine(doc_vector, centroid) for name, centroid in self.centroids.items()}
+        ranking = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+        if not ranking:
+            return {'best_course': None, 'margin': 0.0, 'scores': {}, 'matched_terms': []}
+
+        best_course, best_score = ranking[0]
+        second_score = ranking[1][1] if len(ranking) > 1 else 0.0
+
+        centroid = self.centroids[best_course]
+        contributions = sorted(
+            ((term, w * centroid.get(term, 0.0)) for term, w in doc_vector.items()),
+            key=lambda item: item[1], reverse=True
+        )
+
+        return {
+            'best_course': best_course,
+            'margin': round(best_score - second_score, 4),
+            'scores': {name: round(score, 4) for name, score in ranking},
+            'matched_terms': [term for term, contribution in contributions[:top_terms] if contribution > 0]
+        }
+
+
+if __name__ == "__main__":
+    # Test del enrutador
+    print("=== Test Course Router ===\n")
+
+    router = CourseRouter.from_courses_dir('courses')
+
+    test_doc = """
+    Ejercicio 2: DBSCAN
+    Seleccioné tres variables numéricas. epsilon = 0.5, min_samples = 5.
+    Se identificaron 3 clusters y 12 puntos de ruido (outliers).
+    """
+
+    result = router.route(test_doc)
+    print(f"Mejor curso: {result['best_course']} (margen: {result['margin']})")
+    print(f"Scores: {result['scores']}")
+    print(f"Términos: {result['matched_terms']}")
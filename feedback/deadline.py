@@ -0,0 +1,73 @@
+"""
+Presupuesto de Tiempo de Evaluación
+Un único plazo que se propaga a cada etapa (OCR, validaciones y llamadas a GPT)
+para acotar el tiempo de espera de una evaluación interactiva
+"""
+import time
+from typing import Dict, Optional
+
+
+class DeadlineExceeded(Exception):
+    """Se agotó el presupuesto de tiempo de la evaluación"""
+
+
+class Deadline:
+    """Plazo absoluto (reloj monotónico) compartido por todas las etapas"""
+
+    def __init__(self, seconds: Optional[float] = None, expires_at: Optional[float] = None):
+        """
+        Args:
+            seconds: Segundos disponibles desde ahora (None = sin límite)
+            expires_at: Instante absoluto de expiración (uso interno de stage())
+        """
+        if expires_at is not None:
+            self.expires_at = expires_at
+        elif seconds is not None:
+            self.expires_at = time.monotonic() + seconds
+        else:
+            self.expires_at = None
+
+    def remaining(self) -> Optional[float]:
+        """Segundos restantes (None = sin límite)"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self, stage: str = ''):
+        """Lanza DeadlineExceeded si el plazo ya venció"""
+        if self.expired():
+            raise DeadlineExceeded(f"Tiempo de evaluación agotado{' en ' + stage if stage else ''}")
+
+    def stage(self, seconds: float) -> 'Deadline':
+        """Sub-plazo de una etapa: lo que ocurra primero entre su presupuesto y el plazo global"""
+        stage_expires = time.monotonic() + seconds
+        if self.expires_at is not None:
+            stage_expires = min(stage_expires, self.expires_at)
+        return Deadline(expires_at=stage_expires)
+
+    def request_options(self, cap: float = 60.0, minimum: float = 1.0) -> Dict:
+        """
+        Opciones para una llamada a la API de OpenAI con el tiempo restante como timeout
+
+        Args:
+            cap: Timeout máximo por llamada
+            minimum: Timeout mínimo (para no lanzar llamadas imposibles de completar)
+
+        Returns:
+            Dict con 'timeout' (vacío si no hay límite)
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return {}
+        return {'timeout': max(minimum, min(cap, remaining))}
+
+
+def request_options(deadline: Optional[Deadline], stage: str = '') -> Dict:
+    """Verifica el plazo (si existe) y retorna las opciones de timeout para la llamada"""
+    if deadline is None:
+        return {}
+    deadline.check(stage)
+    return deadline.request_options()
@@ -1,26 +1,252 @@
 """
 Verificador Detallado de Tareas
 Compara PUNTO POR PUNTO lo que debe hacer el estudiante vs lo que presentó
+
+1. Coincidencia local aproximada: cada tarea de condiciones.json se busca en los
+   bloques de su ejercicio (términos con raíz común); las tareas claramente
+   cumplidas o claramente ausentes se resuelven sin GPT
+2. Las tareas sin resolver de TODOS los criterios van en una sola llamada, cada una
+   con sus fragmentos candidatos (no los primeros caracteres del documento)
 """
-from openai import OpenAI
+from feedback.llm_client import create_chat_client
 import json
 import os
+import re
 from typing import Dict, List
 from dotenv import load_dotenv
 
+from feedback.course_router import tokenize
+from feedback.deadline import Deadline, request_options
+from feedback.evidence_extractor import text_blocks
+from feedback.schemas import TASK_STATUS, parse_response, response_format, task_checks_schema
+from processors.exercise_segmenter import split_exercise_spans
+
 load_dotenv()
 
+SCENARIO_PREFIX = re.compile(r'^\[[^\]]*\]\s*')
+
+
+def _stems(text: str) -> set:
+    """Raíces aproximadas (5 primeras letras) para tolerar conjugaciones: seleccionar ~ seleccioné"""
+    return {term[:5] for term in tokenize(text)}
+
+
 class DetailedTaskChecker:
     """Verifica que el estudiante haya cumplido CADA tarea específica"""
 
     def __init__(self):
         """Inicializa el verificador con OpenAI"""
         self.openai_api_key = os.getenv('OPENAI_API_KEY')
-        self.client = OpenAI(api_key=self.openai_api_key)
+        self.client = create_chat_client(self.openai_api_key)  # Hedging + circuit breaker
         self.model = "gpt-4o-mini"
 
+        # Umbrales de la coincidencia local (proporción de términos de la tarea en un bloque)
+        self.resolve_threshold = 0.75  # Cumplida sin GPT
+        self.missing_threshold = 0.2   # No cumplida sin GPT
+        self.snippets_per_task = 2
+        self.snippet_chars = 600
+
+    @staticmethod
+    def get_tasks(criterion_num: int, condiciones_data: Dict) -> Dict:
+        """
+        Tareas detalladas y entregables de un criterio en condiciones.json
+
+        Returns:
+            Dict con 'tasks' (list) y 'deliverables' (list)
+        """
+        detailed_tasks = []
+        deliverables = []
+
+        for ejercicio in (condiciones_data or {}).get('ejercicios', []):
+            if ejercicio.get('numero') == criterion_num:
+                # Tareas del ejercicio
+                detailed_tasks.extend(ejercicio.get('tareas', []))
+
+                # Si tiene escenarios (como K-Means)
+                for escenario in ejercicio.get('escenarios', []):
+                    detailed_tasks.extend([
+                        f"[Escenario {escenario['escenario']}] {tarea}"
+                        for tarea in escenario.get('tareas', [])
+                    ])
+
+                # Entregables esperados
+                deliverables = ejercicio.get('entregables', [])
+                break
+
+        return {'tasks': detailed_tasks, 'deliverables': deliverables}
+
+    def match_task_locally(self, task: str, blocks: List[str]) -> Dict:
+        """
+        Busca la tarea en los bloques del documento
+
+        Returns:
+            Dict con 'coverage' (mejor proporción de términos de la tarea en un bloque)
+            y 'snippets' (bloques candidatos, del más al menos parecido)
+        """
+        task_stems = _stems(SCENARIO_PREFIX.sub('', task))
+        if not task_stems:
+            return {'coverage': 0.0, 'snippets': []}
+
+        scored = []
+        for block in blocks:
+            overlap = len(task_stems & _stems(block)) / len(task_stems)
+            if overlap > 0:
+                scored.append((overlap, block))
+        scored.sort(key=lambda item: item[0], reverse=True)
+
+        return {
+            'coverage': round(scored[0][0], 2) if scored else 0.0,
+            'snippets': [block[:self.snippet_chars] for _, block in scored[:self.snippets_per_task]]
+        }
+
+    def check_tasks(self, criteria: List[Dict], document_content: str, condiciones_data: Dict = None,
+                    deadline: Deadline = None) -> Dict[int, Dict]:
+        """
+        Verifica las tareas de varios criterios: primero localmente y luego, en UNA llamada,
+        las tareas que la coincidencia local no pudo resolver
+
+        Args:
+            criteria: Criterios de la rúbrica
+            document_content: Contenido del documento del estudiante
+            condiciones_data: Dict con las tareas detalladas
+            deadline: Plazo de la evaluación (opcional); si se agota, las tareas
+                sin resolver se clasifican con la coincidencia local
+
+        Returns:
+            Dict {numero_criterio: resultado} (ver check_tasks_for_criterion);
+            los criterios sin tareas detalladas no se incluyen
+        """
+        spans = split_exercise_spans(document_content)
+        details = {}
+        unresolved = {}
+
+        for criterion in criteria:
+            criterion_num = criterion.get('numero', 0)
+            tasks = self.get_tasks(criterion_num, condiciones_data)['tasks']
+            if not tasks:
+                continue
+
+            # Bloques del tramo del ejercicio (todo el documento si no tiene encabezados)
+            blocks = text_blocks(spans.get(str(criterion_num)) or document_content)
+            details[criterion_num] = []
+
+            for i, task in enumerate(tasks, 1):
+                match = self.match_task_locally(task, blocks)
+                detail = {
+                    'task_number': i,
+                    'task_description': task,
+                    'coverage': match['coverage'],
+                    'evidence': match['snippets'][0][:200] if match['snippets'] else '',
+                    'method': 'local'
+                }
+                if match['coverage'] >= self.resolve_threshold:
+                    detail['status'] = 'cumplida'
+                elif match['coverage'] < self.missing_threshold:
+                    detail['status'] = 'no_cumplida'
+                else:
+                    unresolved[f"T{len(unresolved) + 1}"] = (criterion, detail, match['snippets'])
+                details[criterion_num].append(detail)
+
+        total_tasks = sum(len(task_details) for task_details in details.values())
+        print(f"  [TAREAS] {total_tasks - len(unresolved)}/{total_tasks} tareas resueltas localmente")
+
+        if unresolved:
+            self._check_with_gpt(unresolved, deadline)
+
+        return {
+            criterion_num: self._summarize(task_details)
+            for criterion_num, task_details in details.items()
+        }
+
+    def _check_with_gpt(self, unresolved: Dict, deadline: Deadline = None):
+        """Clasifica en una sola llamada las tareas sin resolver (actualiza cada detalle en su lugar)"""
+        statuses = {}
+
+        if deadline is None or not deadline.expired():
+            blocks = []
+            for task_id, (criterion, detail, snippets) in unresolved.items():
+                evidence = '\n...\n'.join(snippets) or '(sin fragmentos relacionados)'
+                blocks.append(
+                    f"[{task_id}] Criterio {criterion.get('numero')} ({criterion.get('nombre', '')}): {detail['task_description']}\n"
+                    f"FRAGMENTOS CANDIDATOS:\n{evidence}"
+                )
+
+            prompt = f"""
+Verifica si el estudiante cumplió cada tarea usando SOLO los fragmentos candidatos de su documento.
+
+CRITERIOS:
+- C (cumplida): la tarea está completa con evidencia clara (ej. si pide "calcular Silhouette Score" debe mostrar el valor)
+- P (parcial): se menciona la tarea pero sin completarla (ej. menciona variables sin justificar la selección)
+- N (no cumplida): los fragmentos no muestran evidencia de la tarea
+- evid: cita breve del fragmento que lo demuestra (vacío si N)
+- Devuelve exactamente un resultado por id
+
+{(chr(10) * 2).join(blocks)}
+"""
+
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": "Eres un evaluador académico extremadamente detallado que verifica PUNTO POR PUNTO el cumplimiento de tareas específicas."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.2,
+                    max_tokens=100 + 80 * len(unresolved),
+                    response_format=response_format('verificacion_tareas', task_checks_schema(unresolved.keys())),
+                    **request_options(deadline, "verificación de tareas")
+                )
+                statuses = {item['id']: item for item in parse_response(response)['tareas']}
+                print(f"  [TAREAS] {len(statuses)}/{len(unresolved)} tareas verificadas con GPT en una llamada")
+            except Exception as e:
+                print(f"[ERROR] Error verificando tareas: {e}")
+
+        for task_id, (_, detail, _) in unresolved.items():
+            item = statuses.get(task_id)
+            if item:
+                detail.update({'status': TASK_STATUS[item['est']], 'evidence': item['evid'], 'method': 'gpt'})
+            else:
+                # Sin respuesta del modelo: la coincidencia local parcial cuenta como parcial
+                detail['status'] = 'parcial' if detail['coverage'] >= 0.5 else 'no_cumplida'
+
+    def _summarize(self, task_checks: List[Dict]) -> Dict:
+        """Resultado por criterio a partir del estado de cada tarea"""
+        tasks_found = [check['task_description'] for check in task_checks if check['status'] == 'cumplida']
+        tasks_partial = [check['task_description'] for check in task_checks if check['status'] == 'parcial']
+        tasks_missing = [check['task_description'] for check in task_checks if check['status'] == 'no_cumplida']
+
+        total = len(task_checks)
+        completion_pct = round(100 * (len(tasks_found) + 0.5 * len(tasks_partial)) / total, 1) if total else 0
+        summary = {
+            'total_tasks': total,
+            'completed': len(tasks_found),
+            'partial': len(tasks_partial),
+            'not_completed': len(tasks_missing),
+            'completion_percentage': completion_pct
+        }
+
+        # Generar recomendación final
+        if completion_pct >= 90:
+            recommendation = f"Excelente trabajo. Cumplió {summary['completed']}/{total} tareas."
+        elif completion_pct >= 70:
+            recommendation = f"Buen trabajo. Cumplió {summary['completed']}/{total} tareas. Revisar tareas faltantes."
+        elif completion_pct >= 50:
+            recommendation = f"Trabajo incompleto. Solo cumplió {summary['completed']}/{total} tareas. Necesita completar las faltantes."
+        else:
+            recommendation = f"Trabajo muy incompleto. Cumplió {summary['completed']}/{total} tareas. Debe revisar los requisitos."
+
+        return {
+            'tasks_found': tasks_found,
+            'tasks_partial': tasks_partial,
+            'tasks_missing': tasks_missing,
+            'task_details': task_checks,
+            'completion_percentage': completion_pct,
+            'recommendation': recommendation,
+            'summary': summary
+        }
+
     def check_tasks_for_criterion(self, criterion_data: Dict, document_content: str,
-                                   condiciones_data: Dict = None) -> Dict:
+                                   condiciones_data: Dict = None, deadline: Deadline = None) -> Dict:
         """
         Verifica PUNTO POR PUNTO si el estudiante cumplió las tareas
 
@@ -28,6 +254,7 @@ class DetailedTaskChecker:
             criterion_data: Dict con info del criterio de la rúbrica
             document_content: Contenido del documento del estudiante
             condiciones_data: Dict con las tareas detalladas (opcional)
+            deadline: Plazo de la evaluación (opcional)
 
         Returns:
             Dict con:
@@ -37,174 +264,15 @@ class DetailedTaskChecker:
             - completion_percentage: float (% de tareas cumplidas)
             - recommendation: str
         """
-        try:
-            criterion_num = criterion_data.get('numero', 0)
-            criterion_name = criterion_data.get('nombre', '')
-
-            # Buscar las tareas detalladas en condiciones.json
-            detailed_tasks = []
-            deliverables = []
-
-            if condiciones_data and 'ejercicios' in condiciones_data:
-                # Buscar el ejercicio correspondiente
-                for ejercicio in condiciones_data['ejercicios']:
-                    if ejercicio.get('numero') == criterion_num:
-                        # Tareas del ejercicio
-                        if 'tareas' in ejercicio:
-                            detailed_tasks.extend(ejercicio['tareas'])
-
-                        # Si tiene escenarios (como K-Means)
-                        if 'escenarios' in ejercicio:
-                            for escenario in ejercicio['escenarios']:
-                                if 'tareas' in escenario:
-                                    detailed_tasks.extend([
-                                        f"[Escenario {escenario['escenario']}] {tarea}"
-                                        for tarea in escenario['tareas']
-                                    ])
-
-                        # Entregables esperados
-                        if 'entregables' in ejercicio:
-                            deliverables = ejercicio['entregables']
-
-                        break
-
-            if not detailed_tasks:
-                return {
-                    'tasks_found': [],
-                    'tasks_missing': [],
-                    'task_details': [],
-                    'completion_percentage': 0,
-                    'recommendation': 'No se encontraron tareas detalladas para este criterio'
-                }
-
-            # Crear prompt para verificación PUNTO POR PUNTO
-            tasks_text = "\n".join([f"{i+1}. {task}" for i, task in enumerate(detailed_tasks)])
-            deliverables_text = "\n".join([f"- {d}" for d in deliverables])
-
-            prompt = f"""
-Eres un evaluador académico MUY DETALLADO. Tu tarea es verificar PUNTO POR PUNTO si el estudiante cumplió CADA tarea específica.
-
-CRITERIO {criterion_num}: {criterion_name}
-
-TAREAS QUE EL ESTUDIANTE DEBE REALIZAR:
-{tasks_text}
-
-ENTREGABLES ESPERADOS:
-{deliverables_text}
-
-CONTENIDO DEL DOCUMENTO DEL ESTUDIANTE:
-{document_content[:5000]}
-
-INSTRUCCIONES DE VERIFICACIÓN:
-
-Para CADA tarea de la lista:
-1. Busca evidencia ESPECÍFICA en el documento
-2. Determina si la tarea fue CUMPLIDA, PARCIALMENTE CUMPLIDA o NO CUMPLIDA
-3. Extrae la evidencia textual que lo demuestra
-
-CRITERIOS DE VERIFICACIÓN:
-
-**CUMPLIDA**: El estudiante realizó la tarea completa con evidencia clara
-- Ejemplo: Si dice "Seleccionar dos variables" → debe mencionar cuáles variables seleccionó
-- Ejemplo: Si dice "Calcular Silhouette Score" → debe mostrar el valor obtenido
-- Ejemplo: Si dice "Graficar scatterplot" → debe mencionar que generó el gráfico
-
-**PARCIALMENTE CUMPLIDA**: El estudiante mencionó la tarea pero sin completar
-- Ejemplo: Menciona variables pero no justifica la selección
-- Ejemplo: Menciona métricas pero no muestra valores
-
-**NO CUMPLIDA**: No hay evidencia de que realizó la tarea
-- No se menciona en el documento
-- No hay código ni análisis relacionado
-
-FORMATO DE RESPUESTA (JSON):
-{{
-  "task_checks": [
-    {{
-      "task_number": 1,
-      "task_description": "<descripción de la tarea>",
-      "status": "cumplida/parcial/no_cumplida",
-      "evidence": "<evidencia textual del documento que lo demuestra>",
-      "notes": "<notas adicionales>"
-    }}
-  ],
-  "summary": {{
-    "total_tasks": <número total>,
-    "completed": <número cumplidas>,
-    "partial": <número parciales>,
-    "not_completed": <número no cumplidas>,
-    "completion_percentage": <porcentaje>
-  }},
-  "recommendation": "<recomendación general>"
-}}
-"""
-
-            # Llamar a GPT
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "Eres un evaluador académico extremadamente detallado que verifica PUNTO POR PUNTO el cumplimiento de tareas específicas."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.2,
-                max_tokens=1500,
-                response_format={"type": "json_object"}
-            )
-
-            # Parsear respuesta
-            result = json.loads(response.choices[0].message.content)
-
-            task_checks = result.get('task_checks', [])
-            summary = result.get('summary', {})
-
-            # Organizar resultados
-            tasks_found = []
-            tasks_missing = []
-            tasks_partial = []
-
-            for check in task_checks:
-                status = check.get('status', 'no_cumplida')
-                task_desc = check.get('task_description', '')
-
-                if status == 'cumplida':
-                    tasks_found.append(task_desc)
-                elif status == 'parcial':
-                    tasks_partial.append(task_desc)
-                else:
-                    tasks_missing.append(task_desc)
-
-            completion_pct = summary.get('completion_percentage', 0)
-
-            # Generar recomendación final
-            if completion_pct >= 90:
-                recommendation = f"Excelente trabajo. Cumplió {summary.get('completed', 0)}/{summary.get('total_tasks', 0)} tareas."
-            elif completion_pct >= 70:
-                recommendation = f"Buen trabajo. Cumplió {summary.get('completed', 0)}/{summary.get('total_tasks', 0)} tareas. Revisar tareas faltantes."
-            elif completion_pct >= 50:
-                recommendation = f"Trabajo incompleto. Solo cumplió {summary.get('completed', 0)}/{summary.get('total_tasks', 0)} tareas. Necesita completar las faltantes."
-            else:
-                recommendation = f"Trabajo muy incompleto. Cumplió {summary.get('completed', 0)}/{summary.get('total_tasks', 0)} tareas. Debe revisar los requisitos."
-
-            return {
-                'tasks_found': tasks_found,
-                'tasks_partial': tasks_partial,
-                'tasks_missing': tasks_missing,
-                'task_details': task_checks,
-                'completion_percentage': completion_pct,
-                'recommendation': recommendation,
-                'summary': summary
-            }
-
-        except Exception as e:
-            print(f"[ERROR] Error verificando tareas: {e}")
-            return {
-                'tasks_found': [],
-                'tasks_partial': [],
-                'tasks_missing': [],
-                'task_details': [],
-                'completion_percentage': 0,
-                'recommendation': f'Error en verificación: {str(e)}'
-            }
+        result = self.check_tasks([criterion_data], document_content, condiciones_data, deadline)
+        return result.get(criterion_data.get('numero', 0), {
+            'tasks_found': [],
+            'tasks_partial': [],
+            'tasks_missing': [],
+            'task_details': [],
+            'completion_percentage': 0,
+            'recommendation': 'No se encontraron tareas detalladas para este criterio'
+        })
 
 
 if __name__ == "__main__":
@@ -2,29 +2,153 @@
 Validador de Tipo de Documento
 Detecta si el documento es una guia/instrucciones o una entrega real del estudiante
 """
-from openai import OpenAI
-import json
+from feedback.llm_client import create_chat_client
 import os
-from typing import Dict
+import re
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 
+from feedback.deadline import Deadline, request_options
+from feedback.schemas import CONFIDENCE, DOCUMENT_TYPE, DOCUMENT_TYPES, parse_response, response_format
+
 load_dotenv()
 
+# Señales locales (mismas del prompt): (nombre, patron, peso por coincidencia, tope)
+GUIDE_SIGNALS = [
+    ('Frases dirigidas al estudiante ("El estudiante debe", "Usted debe")',
+     re.compile(r'\b(el estudiante debe|usted debe|se requiere que|esta actividad consiste en|el objetivo es que el estudiante)\b'), 2, 6),
+    ('Instrucciones imperativas ("Realice", "Desarrolle", "Calcule")',
+     re.compile(r'^[\s\-\*•\d\.\)]*(realice|desarrolle|implemente|calcule|seleccione|determine|grafique|aplique|elabore|entregue|explique)\b', re.MULTILINE), 1, 5),
+    ('Tablas de rubrica con puntajes',
+     re.compile(r'^\s*\|.*\b(puntaje|puntos|pts|nivel)\b.*\|', re.MULTILINE), 2, 4),
+    ('Rangos de puntaje por nivel (ej: "51-60 puntos")',
+     re.compile(r'\b\d+\s*-\s*\d+\s*(pts|puntos)\b'), 1, 4),
+    ('Niveles de desempeno (alto/medio/bajo)',
+     re.compile(r'(nivel|desempe[nñ]o)\s+(alto|medio|bajo)|^\s*\|?\s*(alto|medio|bajo)\s*\|', re.MULTILINE), 1, 3),
+    ('Secciones de rubrica o criterios de evaluacion',
+     re.compile(r'\b(r[uú]brica de evaluaci[oó]n|criterios de evaluaci[oó]n|puntaje m[aá]ximo)\b'), 2, 4),
+]
+
+STUDENT_SIGNALS = [
+    ('Codigo fuente con imports (import pandas, from sklearn ...)',
+     re.compile(r'^\s*(import\s+\w+|from\s+[\w\.]+\s+import\b)', re.MULTILINE), 2, 6),
+    ('Metricas con valores numericos (ej: "RMSE: 2.34")',
+     re.compile(r'\b(rmse|mae|mse|r2|r²|accuracy|precision|recall|f1[\-_ ]?score|silhouette(?:[\s_]score)?|inercia|inertia|exactitud)\b\s*[:=]\s*-?\d+(?:[\.,]\d+)?'), 2, 6),
+    ('Analisis en primera persona ("Seleccioné", "Apliqué", "Obtuve")',
+     re.compile(r'\b(seleccioné|apliqué|implementé|obtuve|determiné|observé|elegí|utilicé|calculé|realicé|generé|concluyo|podemos observar)\b'), 1, 5),
+    ('Evidencias de ejecucion de codigo (.fit(), read_csv(), outputs)',
+     re.compile(r'(\.fit\(|\.predict\(|read_csv\(|^output:|--- c[oó]digo \d+ ---)', re.MULTILINE), 1, 4),
+]
+
 class DocumentTypeValidator:
     """Valida que el documento sea una entrega real, no una guia de actividad"""
 
     def __init__(self):
         """Inicializa el validador con OpenAI"""
         self.openai_api_key = os.getenv('OPENAI_API_KEY')
-        self.client = OpenAI(api_key=self.openai_api_key)
+        self.client = create_chat_client(self.openai_api_key)  # Hedging + circuit breaker
         self.model = "gpt-4o-mini"
 
-    def validate_is_student_work(self, document_content: str) -> Dict:
+        # Pre-clasificador local: decide sin GPT cuando las señales son claras
+        self.local_min_score = 6      # Puntaje minimo del lado ganador
+        self.local_dominance = 3      # El lado ganador debe triplicar al otro
+        self.local_max_chars = 20000  # Texto analizado por el clasificador local
+
+    def _score_local_signals(self, document_content: str) -> Dict:
+        """
+        Puntua localmente las señales de guia y de entrega (sin llamadas a red)
+
+        Args:
+            document_content: Contenido del documento a evaluar
+
+        Returns:
+            Dict con puntajes y evidencias de cada tipo
+        """
+        text = document_content[:self.local_max_chars].lower()
+
+        def score(signals) -> tuple:
+            total = 0
+            evidence = []
+            for name, pattern, weight, cap in signals:
+                hits = len(pattern.findall(text))
+                if hits:
+                    total += min(hits * weight, cap)
+                    evidence.append(f"{name} (x{hits})")
+            return total, evidence
+
+        guide_score, evidence_guide = score(GUIDE_SIGNALS)
+        student_score, evidence_student = score(STUDENT_SIGNALS)
+
+        return {
+            'guide_score': guide_score,
+            'student_score': student_score,
+            'evidence_guide': evidence_guide,
+            'evidence_student_work': evidence_student
+        }
+
+    def _classify_locally(self, document_content: str) -> Optional[Dict]:
+        """
+        Clasifica el documento con las señales locales si el resultado es claro
+
+        Returns:
+            Dict con el mismo formato de validate_is_student_work, o None si es ambiguo
+        """
+        signals = self._score_local_signals(document_content)
+        guide_score = signals['guide_score']
+        student_score = signals['student_score']
+
+        if student_score >= self.local_min_score and student_score >= self.local_dominance * guide_score:
+            document_type = 'entrega_estudiante'
+        elif guide_score >= self.local_min_score and guide_score >= self.local_dominance * student_score:
+            document_type = 'guia_actividad'
+        else:
+            print(f"  [LOCAL] Clasificacion ambigua (guia: {guide_score}, estudiante: {student_score}) -> consultar GPT")
+            return None
+
+        print(f"  [LOCAL] Documento clasificado como '{document_type}' sin GPT (guia: {guide_score}, estudiante: {student_score})")
+
+        return self._build_result(
+            document_type=document_type,
+            confidence='alta',
+            evidence_guide=signals['evidence_guide'],
+            evidence_student=signals['evidence_student_work'],
+            explanation=f"Clasificacion local por señales del documento (guia: {guide_score} pts, entrega: {student_score} pts).",
+            method='local'
+        )
+
+    def _build_result(self, document_type: str, confidence: str, evidence_guide: List[str],
+                      evidence_student: List[str], explanation: str, method: str) -> Dict:
+        """Construye el resultado de validacion con su recomendacion"""
+        # Determinar si es trabajo del estudiante
+        is_student_work = (document_type == 'entrega_estudiante')
+
+        # Generar recomendacion
+        if is_student_work:
+            recommendation = "[OK] Este documento parece ser una entrega real del estudiante. Puede procederse con la evaluacion."
+        else:
+            if document_type == 'guia_actividad':
+                recommendation = "[ADVERTENCIA] Este documento parece ser una GUIA/INSTRUCCIONES de actividad, NO una entrega del estudiante. No debe ser calificado."
+            else:
+                recommendation = "[ADVERTENCIA] No se pudo determinar con certeza el tipo de documento. Verifique que sea una entrega real del estudiante."
+
+        return {
+            'is_student_work': is_student_work,
+            'confidence': confidence,
+            'document_type': document_type,
+            'evidence_guide': evidence_guide,
+            'evidence_student_work': evidence_student,
+            'explanation': explanation,
+            'recommendation': recommendation,
+            'method': method
+        }
+
+    def validate_is_student_work(self, document_content: str, deadline: Deadline = None) -> Dict:
         """
         Valida que el documento sea trabajo del estudiante, NO una guia
 
         Args:
             document_content: Contenido del documento a evaluar
+            deadline: Plazo de la evaluación (opcional); si se agota, el resultado es permisivo
 
         Returns:
             Dict con:
@@ -33,8 +157,14 @@ class DocumentTypeValidator:
             - document_type: str (guia_actividad, entrega_estudiante, indeterminado)
             - evidence: list (evidencias que indican el tipo)
             - recommendation: str (mensaje para el usuario)
+            - method: str (local o gpt)
         """
         try:
+            # PASO 1: Pre-clasificador local (GPT solo si el resultado es ambiguo)
+            local_result = self._classify_locally(document_content)
+            if local_result:
+                return local_result
+
             # Preparar prompt para deteccion
             prompt = f"""
 Eres un detector academico experto. Tu tarea es determinar si un documento es:
@@ -72,18 +202,9 @@ ANALISIS REQUERIDO:
 3. Determina la confianza de tu clasificacion
 
 INSTRUCCIONES:
-- Si el documento contiene PRINCIPALMENTE instrucciones → document_type: "guia_actividad"
-- Si el documento contiene PRINCIPALMENTE trabajo desarrollado → document_type: "entrega_estudiante"
-- Si no estas seguro → document_type: "indeterminado"
-
-FORMATO DE RESPUESTA (JSON):
-{{
-  "document_type": "guia_actividad/entrega_estudiante/indeterminado",
-  "confidence": "alta/media/baja",
-  "evidence_guide": ["<evidencia 1 de que es guia>", "<evidencia 2>"],
-  "evidence_student_work": ["<evidencia 1 de que es trabajo>", "<evidencia 2>"],
-  "explanation": "<explicacion breve de la clasificacion>"
-}}
+- Si el documento contiene PRINCIPALMENTE instrucciones → tipo: G
+- Si el documento contiene PRINCIPALMENTE trabajo desarrollado → tipo: E
+- Si no estas seguro → tipo: I
 """
 
             # Llamar a GPT
@@ -95,39 +216,27 @@ FORMATO DE RESPUESTA (JSON):
                 ],
                 temperature=0.2,  # Mas deterministico
                 max_tokens=500,
-                response_format={"type": "json_object"}
+                response_format=response_format('tipo_documento', DOCUMENT_TYPE),
+                **request_options(deadline, "validación de tipo")
             )
 
             # Parsear respuesta
-            result = json.loads(response.choices[0].message.content)
-
-            document_type = result.get('document_type', 'indeterminado')
-            confidence = result.get('confidence', 'baja')
-            evidence_guide = result.get('evidence_guide', [])
-            evidence_student = result.get('evidence_student_work', [])
-            explanation = result.get('explanation', '')
-
-            # Determinar si es trabajo del estudiante
-            is_student_work = (document_type == 'entrega_estudiante')
-
-            # Generar recomendacion
-            if is_student_work:
-                recommendation = "[OK] Este documento parece ser una entrega real del estudiante. Puede procederse con la evaluacion."
-            else:
-                if document_type == 'guia_actividad':
-                    recommendation = "[ADVERTENCIA] Este documento parece ser una GUIA/INSTRUCCIONES de actividad, NO una entrega del estudiante. No debe ser calificado."
-                else:
-                    recommendation = "[ADVERTENCIA] No se pudo determinar con certeza el tipo de documento. Verifique que sea una entrega real del estudiante."
-
-            return {
-                'is_student_work': is_student_work,
-                'confidence': confidence,
-                'document_type': document_type,
-                'evidence_guide': evidence_guide,
-                'evidence_student_work': evidence_student,
-                'explanation': explanation,
-                'recommendation': recommendation
-            }
+            result = parse_response(response)
+
+            document_type = DOCUMENT_TYPES[result['tipo']]
+            confidence = CONFIDENCE[result['conf']]
+            evidence_guide = result['ev_guia']
+            evidence_student = result['ev_entrega']
+            explanation = result['expl']
+
+            return self._build_result(
+                document_type=document_type,
+                confidence=confidence,
+                evidence_guide=evidence_guide,
+                evidence_student=evidence_student,
+                explanation=explanation,
+                method='gpt'
+            )
 
         except Exception as e:
             print(f"[WARNING] Error validando tipo de documento: {e}")
@@ -139,7 +248,8 @@ FORMATO DE RESPUESTA (JSON):
                 'evidence_guide': [],
                 'evidence_student_work': [],
                 'explanation': f'Error en validacion: {str(e)}',
-                'recommendation': '[WARNING] No se pudo validar el tipo de documento. Proceda con precaucion.'
+                'recommendation': '[WARNING] No se pudo validar el tipo de documento. Proceda con precaucion.',
+                'method': 'error'
             }
 
 
@@ -264,6 +374,7 @@ if __name__ == "__main__":
     print(f"  - is_student_work: {result1['is_student_work']}")
     print(f"  - document_type: {result1['document_type']}")
     print(f"  - confidence: {result1['confidence']}")
+    print(f"  - method: {result1['method']}")
     print(f"  - recommendation: {result1['recommendation']}")
     print(f"\n  Evidencias de que es GUIA:")
     for ev in result1['evidence_guide'][:3]:
@@ -282,6 +393,7 @@ if __name__ == "__main__":
     print(f"  - is_student_work: {result2['is_student_work']}")
     print(f"  - document_type: {result2['document_type']}")
     print(f"  - confidence: {result2['confidence']}")
+    print(f"  - method: {result2['method']}")
     print(f"  - recommendation: {result2['recommendation']}")
     print(f"\n  Evidencias de que es GUIA:")
     for ev in result2['evidence_guide'][:3]:
@@ -0,0 +1,314 @@
+"""
+Extractor del Mapa de Evidencia
+Lee el documento completo UNA sola vez y produce un mapa estructurado y compacto
+(datasets, modelos con parámetros, métricas con valores, gráficos y ejercicios).
+Cada criterio usa el mapa más fragmentos relevantes del documento en lugar del texto completo.
+Los documentos largos se procesan en modo map-reduce: segmentos en paralelo que se fusionan en un solo mapa.
+"""
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from feedback.course_router import tokenize
+from feedback.deadline import Deadline, request_options
+from feedback.schemas import EVIDENCE_MAP, parse_response, response_format
+from processors.exercise_segmenter import HEADING_PATTERN, split_exercise_spans
+from storage.evaluation_cache import content_hash
+
+# Patrones del extractor local (respaldo si falla la llamada a GPT)
+DATASET_PATTERN = re.compile(r'(?:read_(?:csv|excel|json|parquet)|load_dataset|fetch_\w+|load_\w+)\s*\(\s*[\'"]?([^\'"\),]+)', re.IGNORECASE)
+DATASET_FILE_PATTERN = re.compile(r'\b([\w\-]+\.(?:csv|xlsx|xls|json|parquet|arff|data))\b', re.IGNORECASE)
+MODEL_PATTERN = re.compile(
+    r'\b((?:[A-Z]\w*)?(?:Regressor|Regression|Classifier|Clustering|Means|DBSCAN|SVC|SVR|NB|PCA|Tree|Forest))\s*\(([^)]{0,120})\)'
+)
+METRIC_PATTERN = re.compile(
+    r'\b(accuracy|exactitud|precision|precisi[oó]n|recall|f1(?:[_\- ]score)?|rmse|mse|mae|r2|r²|r\^2|silhouette(?:[_ ]score)?|inertia|inercia|auc)\b[^\n\d\-]{0,25}(-?\d+(?:[.,]\d+)?%?)',
+    re.IGNORECASE
+)
+PLOT_PATTERN = re.compile(
+    r'\b(dendrogra\w*|m[eé]todo del codo|elbow|heatmap|mapa de calor|histogra\w*|boxplot|scatter\w*|dispersi[oó]n|pairplot|curva roc|matriz de confusi[oó]n|confusion matrix)\b',
+    re.IGNORECASE
+)
+
+
+def _exercise_at(document_content: str, position: int) -> int:
+    """Número del último encabezado de ejercicio antes de la posición (None si no hay)"""
+    number = None
+    for match in HEADING_PATTERN.finditer(document_content, 0, position):
+        if 1 <= int(match.group(1)) <= 10:
+            number = int(match.group(1))
+    return number
+
+
+def text_blocks(document_content: str, max_chars: int = 1000) -> List[str]:
+    """Divide el documento en bloques cortos (párrafos; o grupos de líneas si el OCR no separa párrafos)"""
+    blocks, current = [], []
+    size = 0
+    for line in document_content.splitlines():
+        if not line.strip() or size + len(line) > max_chars:
+            if current:
+                blocks.append('\n'.join(current))
+            current, size = [], 0
+        if line.strip():
+            current.append(line)
+            size += len(line) + 1
+    if current:
+        blocks.append('\n'.join(current))
+    return blocks
+
+
+def split_segments(document_content: str, segment_chars: int) -> List[Dict]:
+    """
+    Divide el documento en segmentos de hasta segment_chars caracteres (cortando entre líneas)
+    sin descartar contenido
+
+    Returns:
+        Lista de {'text', 'start'} con la posición de inicio de cada segmento
+    """
+    segments = []
+    start = 0
+    current = ''
+    position = 0
+
+    for line in document_content.splitlines(keepends=True):
+        # Líneas más largas que el segmento (OCR sin saltos): se cortan por caracteres
+        pieces = [line[i:i + segment_chars] for i in range(0, len(line), segment_chars)] or ['']
+        for piece in pieces:
+            if current and len(current) + len(piece) > segment_chars:
+                segments.append({'text': current, 'start': start})
+                start, current = position, ''
+            current += piece
+            position += len(piece)
+
+    if current.strip() or not segments:
+        segments.append({'text': current, 'start': start})
+    return segments
+
+
+def merge_evidence_maps(evidence_maps: List[Dict]) -> Dict:
+    """Fusiona (reduce) los mapas de varios segmentos eliminando duplicados y conservando el orden"""
+    merged = {'ejercicios': [], 'datasets': [], 'modelos': [], 'metricas': [], 'graficos': []}
+    exercise_numbers = set()
+    seen = set()
+
+    for evidence_map in evidence_maps:
+        for exercise in evidence_map.get('ejercicios', []):
+            if exercise['ej'] not in exercise_numbers:
+                exercise_numbers.add(exercise['ej'])
+                merged['ejercicios'].append(exercise)
+
+        for field in ('datasets', 'modelos', 'metricas', 'graficos'):
+            for item in evidence_map.get(field, []):
+                signature = (field,) + tuple(sorted((k, str(v).lower()) for k, v in item.items()))
+                if signature not in seen:
+                    seen.add(signature)
+                    merged[field].append(item)
+
+    merged['ejercicios'].sort(key=lambda exercise: exercise['ej'])
+    return merged
+
+
+def select_excerpts(document_content: str, criterion_number: int, query_text: str, budget: int = 8000) -> str:
+    """
+    Fragmentos del documento relevantes para un criterio
+
+    Prioriza el tramo del ejercicio con el mismo número del criterio y completa el presupuesto
+    con los bloques que comparten más términos con el criterio y sus tareas (en orden original)
+
+    Args:
+        document_content: Texto extraído del documento
+        criterion_number: Número del criterio
+        query_text: Nombre del criterio, tareas y entregables esperados
+        budget: Máximo de caracteres de fragmentos
+
+    Returns:
+        Fragmentos separados por "[...]"
+    """
+    exercise_text = split_exercise_spans(document_content).get(str(criterion_number), '')
+    excerpts = [exercise_text[:budget]] if exercise_text.strip() else []
+    used = len(excerpts[0]) if excerpts else 0
+
+    query_terms = set(tokenize(query_text))
+    blocks = text_blocks(document_content)
+    ranked = sorted(
+        ((len(set(tokenize(block)) & query_terms), i) for i, block in enumerate(blocks)),
+        reverse=True
+    )
+
+    chosen = []
+    for overlap, i in ranked:
+        if overlap == 0 or used >= budget:
+            break
+        block = blocks[i]
+        if block in exercise_text or used + len(block) > budget:
+            continue
+        chosen.append(i)
+        used += len(block)
+
+    excerpts.extend(blocks[i] for i in sorted(chosen))
+    return '\n[...]\n'.join(excerpts)
+
+
+def render_evidence_map(evidence_map: Dict) -> str:
+    """Versión compacta en texto del mapa de evidencia para los prompts"""
+    def where(item):
+        return f" [Ej. {item['ej']}]" if item.get('ej') else ''
+
+    lines = []
+    if evidence_map.get('ejercicios'):
+        lines.append("- Ejercicios: " + '; '.join(f"{e['ej']}. {e['titulo']}" for e in evidence_map['ejercicios']))
+    if evidence_map.get('datasets'):
+        lines.append("- Datasets: " + '; '.join(d['nombre'] + where(d) for d in evidence_map['datasets']))
+    if evidence_map.get('modelos'):
+        lines.append("- Modelos: " + '; '.join(
+            f"{m['nombre']}({m['params']})" + where(m) for m in evidence_map['modelos']))
+    if evidence_map.get('metricas'):
+        lines.append("- Métricas: " + '; '.join(f"{m['nombre']}={m['valor']}" + where(m) for m in evidence_map['metricas']))
+    if evidence_map.get('graficos'):
+        lines.append("- Gráficos: " + '; '.join(g['tipo'] + where(g) for g in evidence_map['graficos']))
+
+    return '\n'.join(lines) if lines else "- (No se identificó evidencia estructurada)"
+
+
+class EvidenceExtractor:
+    """Construye (y guarda en memoria por contenido) el mapa de evidencia de un documento"""
+
+    def __init__(self, client, model: str, segment_chars: int = 40000, max_workers: int = 8,
+                 max_cached: int = 64):
+        """
+        Args:
+            client: Cliente de chat (feedback.llm_client)
+            model: Modelo de OpenAI
+            segment_chars: Presupuesto de caracteres por llamada; documentos más largos
+                se dividen en segmentos que se extraen en paralelo (map-reduce)
+            max_workers: Segmentos extraídos en paralelo
+            max_cached: Mapas guardados en memoria (LRU); el extractor vive todo el proceso
+                (generador compartido), así que el cache se acota y el resto queda en EvaluationCache
+        """
+        self.client = client
+        self.model = model
+        self.segment_chars = segment_chars
+        self.max_workers = max_workers
+        self.max_cached = max_cached
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def extract(self, document_content: str, deadline: Deadline = None) -> Dict:
+        """
+        Mapa de evidencia del documento (una llamada a GPT por contenido distinto)
+
+        Args:
+            document_content: Texto extraído del documento
+            deadline: Plazo de la evaluación (opcional)
+
+        Returns:
+            Dict con ejercicios, datasets, modelos, metricas, graficos, 'segments'
+            y 'method' (gpt / mixto si algún segmento usó el respaldo local / local)
+        """
+        key = content_hash(document_content)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        segments = split_segments(document_content, self.segment_chars)
+
+        # MAP: cada segmento se extrae en paralelo (la latencia no crece con el largo del documento)
+        if len(segments) == 1:
+            results = [self._extract_segment(document_content, segments[0], deadline)]
+        else:
+            print(f"  [EVIDENCIA] Documento largo ({len(document_content)} caracteres): {len(segments)} segmentos en paralelo")
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(segments))) as executor:
+                results = list(executor.map(
+                    lambda segment: self._extract_segment(document_content, segment, deadline), segments
+                ))
+
+        # REDUCE: un solo mapa para todos los criterios
+        evidence_map = merge_evidence_maps([result for result, _ in results])
+        methods = {method for _, method in results}
+        evidence_map['method'] = methods.pop() if len(methods) == 1 else 'mixto'
+        evidence_map['segments'] = len(segments)
+
+        print(f"  [EVIDENCIA] Mapa ({evidence_map['method']}): {len(evidence_map['modelos'])} modelos, "
+              f"{len(evidence_map['metricas'])} métricas, {len(evidence_map['graficos'])} gráficos")
+
+        # Los mapas con respaldo local no se guardan: la siguiente evaluación vuelve a intentar con GPT
+        if evidence_map['method'] == 'gpt':
+            with self._lock:
+                self._cache[key] = evidence_map
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.max_cached:
+                    self._cache.popitem(last=False)
+        return evidence_map
+
+    def _extract_segment(self, document_content: str, segment: Dict, deadline: Deadline = None) -> tuple:
+        """Extrae un segmento con GPT; si falla, con patrones locales (solo ese segmento)"""
+        # Ejercicio en curso al inicio del segmento (el encabezado puede estar en el segmento anterior)
+        current_exercise = _exercise_at(document_content, segment['start'])
+        try:
+            return self._extract_with_gpt(segment['text'], current_exercise, deadline), 'gpt'
+        except Exception as e:
+            print(f"  [EVIDENCIA] Error extrayendo con GPT, usando extractor local: {e}")
+            return self._extract_locally(segment['text'], current_exercise), 'local'
+
+    def _extract_with_gpt(self, segment_text: str, current_exercise: int = None,
+                          deadline: Deadline = None) -> Dict:
+        continuation = (
+            f"\nEl fragmento comienza dentro del Ejercicio {current_exercise}: asocia a ese ejercicio lo que aparezca antes del siguiente encabezado."
+            if current_exercise else ''
+        )
+        prompt = f"""
+Lee el siguiente trabajo estudiantil y extrae SOLO la evidencia que aparece explícitamente
+(no inventes ni completes valores). Asocia cada elemento al número de ejercicio donde aparece.{continuation}
+
+DOCUMENTO:
+{segment_text}
+"""
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": "Eres un asistente que extrae evidencia técnica de trabajos académicos con precisión."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.0,
+            max_tokens=1500,
+            response_format=response_format('mapa_evidencia', EVIDENCE_MAP),
+            **request_options(deadline, "mapa de evidencia")
+        )
+        return parse_response(response)
+
+    def _extract_locally(self, document_content: str, current_exercise: int = None) -> Dict:
+        """Extracción por patrones (sin GPT); current_exercise = ejercicio en curso al inicio del texto"""
+        exercises = {}
+        for match in HEADING_PATTERN.finditer(document_content):
+            number = int(match.group(1))
+            if 1 <= number <= 10 and number not in exercises:
+                line_end = document_content.find('\n', match.end())
+                title = document_content[match.end():line_end if line_end != -1 else None].strip(' :.-')
+                exercises[number] = title[:80]
+
+        def collect(pattern, build):
+            items, seen = [], set()
+            for match in pattern.finditer(document_content):
+                item = build(match)
+                item['ej'] = _exercise_at(document_content, match.start()) or current_exercise
+                signature = tuple(item.values())
+                if signature not in seen:
+                    seen.add(signature)
+                    items.append(item)
+            return items
+
+        datasets = collect(DATASET_PATTERN, lambda m: {'nombre': m.group(1).strip()})
+        known = {d['nombre'] for d in datasets}
+        datasets += [d for d in collect(DATASET_FILE_PATTERN, lambda m: {'nombre': m.group(1)})
+                     if not any(d['nombre'] in name for name in known)]
+
+        return {
+            'ejercicios': [{'ej': number, 'titulo': title} for number, title in sorted(exercises.items())],
+            'datasets': datasets,
+            'modelos': collect(MODEL_PATTERN, lambda m: {'nombre': m.group(1), 'params': ' '.join(m.group(2).split())}),
+            'metricas': collect(METRIC_PATTERN, lambda m: {'nombre': m.group(1), 'valor': m.group(2)}),
+            'graficos': collect(PLOT_PATTERN, lambda m: {'tipo': m.group(1).lower()})
+        }
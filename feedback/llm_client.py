@@ -0,0 +1,233 @@
+"""
+Cliente Resiliente de Chat (latencia de cola)
+Envuelve chat.completions.create de OpenAI con:
+- Solicitudes de respaldo (hedging): si la llamada no responde en el p95 observado,
+  se envía un duplicado y se usa la primera respuesta
+- Circuit breaker por modelo: durante caídas del proveedor falla de inmediato
+  en lugar de acumular timeouts
+- Métricas a nivel de proceso (tasa de hedging, estado del breaker, p95)
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from types import SimpleNamespace
+from typing import Dict
+
+import openai
+
+# Errores que indican problemas del proveedor (cuentan para el breaker);
+# errores de la solicitud (400, autenticación) no abren el circuito
+PROVIDER_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class CircuitOpenError(Exception):
+    """El circuito del modelo está abierto: la llamada se rechaza sin contactar al proveedor"""
+
+
+class ModelStats:
+    """Latencias recientes, contadores y estado del circuit breaker de un modelo"""
+
+    def __init__(self, window: int = 200):
+        self.latencies = deque(maxlen=window)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failures = 0
+        self.short_circuited = 0
+        self.consecutive_failures = 0
+        self.state = 'closed'  # closed / open / half_open
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+
+    def p95(self):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+# Estado compartido por todos los clientes del proceso (validadores, generador, verificador)
+_stats = {}
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv('LLM_MAX_CONCURRENCY', '16')))
+
+
+def _model_stats(model: str) -> ModelStats:
+    with _lock:
+        if model not in _stats:
+            _stats[model] = ModelStats()
+        return _stats[model]
+
+
+def get_metrics() -> Dict:
+    """
+    Métricas de todas las llamadas de chat del proceso
+
+    Returns:
+        Dict {modelo: {calls, hedged, hedge_rate, hedge_wins, failures,
+                       short_circuited, p95_seconds, breaker_state}}
+    """
+    with _lock:
+        return {
+            model: {
+                'calls': stats.calls,
+                'hedged': stats.hedged,
+                'hedge_rate': round(stats.hedged / stats.calls, 3) if stats.calls else 0.0,
+                'hedge_wins': stats.hedge_wins,
+                'failures': stats.failures,
+                'short_circuited': stats.short_circuited,
+                'p95_seconds': round(stats.p95(), 2) if stats.latencies else None,
+                'breaker_state': stats.state
+            }
+            for model, stats in _stats.items()
+        }
+
+
+def reset_metrics():
+    """Reinicia métricas y breakers (útil en pruebas)"""
+    with _lock:
+        _stats.clear()
+
+
+class ResilientChatClient:
+    """
+    Reemplazo directo del cliente OpenAI para chat: expone client.chat.completions.create(...)
+    con hedging y circuit breaker por modelo
+    """
+
+    def __init__(self, client, min_samples: int = 20, max_hedge_ratio: float = 0.15,
+                 failure_threshold: int = 5, cooldown_seconds: float = 30.0):
+        """
+        Args:
+            client: Cliente OpenAI subyacente
+            min_samples: Latencias observadas antes de empezar a hacer hedging
+            max_hedge_ratio: Fracción máxima de llamadas con duplicado (acota el costo extra)
+            failure_threshold: Fallas consecutivas del proveedor que abren el circuito
+            cooldown_seconds: Tiempo abierto antes de permitir una llamada de prueba
+        """
+        self._client = client
+        self.min_samples = min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _acquire(self, stats: ModelStats, model: str):
+        """Verifica el breaker antes de llamar (closed deja pasar; open rechaza; half_open deja una prueba)"""
+        with _lock:
+            if stats.state == 'open':
+                if time.monotonic() - stats.opened_at < self.cooldown_seconds:
+                    stats.short_circuited += 1
+                    raise CircuitOpenError(f"Circuito abierto para {model}: el proveedor está fallando, reintente en unos segundos")
+                stats.state = 'half_open'
+                stats.trial_in_flight = False
+
+            if stats.state == 'half_open':
+                if stats.trial_in_flight:
+                    stats.short_circuited += 1
+                    raise CircuitOpenError(f"Circuito de {model} en prueba: llamada rechazada")
+                stats.trial_in_flight = True
+
+            stats.calls += 1
+
+    def _record(self, stats: ModelStats, model: str, latency: float = None, error: Exception = None):
+        with _lock:
+            stats.trial_in_flight = False
+
+            if error is None:
+                stats.latencies.append(latency)
+                stats.consecutive_failures = 0
+                if stats.state != 'closed':
+                    print(f"  [LLM] Circuito de {model} cerrado nuevamente")
+                stats.state = 'closed'
+                return
+
+            stats.failures += 1
+            if not isinstance(error, PROVIDER_ERRORS):
+                return
+
+            stats.consecutive_failures += 1
+            if stats.state == 'half_open' or stats.consecutive_failures >= self.failure_threshold:
+                if stats.state != 'open':
+                    print(f"  [LLM] Circuito de {model} abierto tras {stats.consecutive_failures} fallas: {error}")
+                stats.state = 'open'
+                stats.opened_at = time.monotonic()
+
+    def _hedge_delay(self, stats: ModelStats, timeout):
+        """Segundos a esperar antes del duplicado (None = sin hedging)"""
+        with _lock:
+            if len(stats.latencies) < self.min_samples or stats.state != 'closed':
+                return None
+            if stats.calls and stats.hedged / stats.calls >= self.max_hedge_ratio:
+                return None
+            delay = stats.p95()
+
+        # Sin sentido duplicar si el timeout de la llamada vence antes
+        if timeout is not None and delay >= timeout:
+            return None
+        return delay
+
+    def create(self, **kwargs):
+        """Equivalente a client.chat.completions.create(**kwargs)"""
+        model = kwargs.get('model', 'desconocido')
+        stats = _model_stats(model)
+        self._acquire(stats, model)
+
+        start = time.monotonic()
+        delay = self._hedge_delay(stats, kwargs.get('timeout'))
+
+        try:
+            if delay is None:
+                response = self._client.chat.completions.create(**kwargs)
+            else:
+                response = self._hedged_create(stats, model, delay, kwargs)
+        except Exception as e:
+            self._record(stats, model, error=e)
+            raise
+
+        self._record(stats, model, latency=time.monotonic() - start)
+        return response
+
+    def _hedged_create(self, stats: ModelStats, model: str, delay: float, kwargs: Dict):
+        """Lanza la llamada y, si no responde en `delay` segundos, un duplicado; gana la primera exitosa"""
+        primary = _executor.submit(self._client.chat.completions.create, **kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        # El duplicado consume solo el tiempo que le queda a la llamada original
+        hedge_kwargs = dict(kwargs)
+        if 'timeout' in kwargs:
+            hedge_kwargs['timeout'] = max(1.0, kwargs['timeout'] - delay)
+
+        with _lock:
+            stats.hedged += 1
+        print(f"  [LLM] {model} sin respuesta tras {delay:.1f}s (p95): enviando solicitud duplicada")
+        hedge = _executor.submit(self._client.chat.completions.create, **hedge_kwargs)
+
+        # La llamada perdedora no se puede cancelar: termina en segundo plano y se descarta
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with _lock:
+                            stats.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+
+        raise error
+
+
+def create_chat_client(api_key: str = None) -> ResilientChatClient:
+    """Cliente de chat resiliente para las clases de feedback/"""
+    return ResilientChatClient(openai.OpenAI(api_key=api_key))
@@ -0,0 +1,185 @@
+"""
+Evaluadores Locales Deterministas
+Califica criterios estructurales (participación en foro, formato de entrega) a partir
+del texto extraído y los metadatos del documento, sin llamar a GPT.
+
+Cada criterio de la rúbrica los activa de forma explícita con la llave "evaluador_local":
+
+    "evaluador_local": {
+        "tipo": "formato_entrega",
+        "formatos": ["ipynb"],
+        "patron_nombre": "^G\\d+_.+_Fase3\\.ipynb$",
+        "ejercicios": [1, 2, 3]
+    }
+
+Un evaluador recibe (contenido, metadatos, configuración) y devuelve una lista de
+verificaciones {'aspecto', 'cumple', 'peso'}; el puntaje es la proporción ponderada
+de verificaciones cumplidas.
+"""
+import re
+from typing import Callable, Dict, List, Optional
+
+from processors.exercise_segmenter import split_exercise_spans
+
+# Registro de evaluadores por tipo
+LOCAL_EVALUATORS: Dict[str, Callable] = {}
+
+
+def register(name: str):
+    """Decorador que registra un evaluador local bajo el tipo indicado"""
+    def decorator(func: Callable) -> Callable:
+        LOCAL_EVALUATORS[name] = func
+        return func
+    return decorator
+
+
+def _check(aspect: str, passed: bool, weight: float = 1.0) -> Dict:
+    return {'aspecto': aspect, 'cumple': bool(passed), 'peso': weight}
+
+
+def _matches(pattern: str, text: str) -> bool:
+    return re.search(pattern, text, re.IGNORECASE | re.DOTALL) is not None
+
+
+FORUM_PATTERN = r'\b(foro|forum)\b'
+PEER_FEEDBACK_PATTERN = (
+    r'(retroaliment\w*|feedback|coment\w*|aporte)\W+(?:\w+\W+){0,12}?(compañer[oa]s?|colega|par)\b'
+    r'|(compañer[oa]s?|colega)\W+(?:\w+\W+){0,12}?(retroaliment\w*|feedback|coment\w*)'
+)
+SCREENSHOT_PATTERN = r'\b(screenshot|captura|pantallazo|evidencia del feedback)\b'
+PUBLISH_PATTERN = r'\b(publi\w*|compart\w*|sub[ií]\w*|aport\w*)\b'
+
+
+@register('participacion_foro')
+def evaluate_forum_participation(document_content: str, metadata: Dict, config: Dict) -> List[Dict]:
+    """Participación en el foro: mención del foro, feedback a un compañero, captura y publicación"""
+    forum_pattern = config.get('patron_foro', FORUM_PATTERN)
+    mentions_forum = _matches(forum_pattern, document_content)
+
+    return [
+        _check("Evidencia de participación en el foro", mentions_forum, 3),
+        _check("Retroalimentación a un compañero", _matches(PEER_FEEDBACK_PATTERN, document_content), 3),
+        _check(
+            "Captura (screenshot) del feedback realizado",
+            # Solo imágenes adjuntas al markdown: los gráficos de los outputs no son capturas
+            _matches(SCREENSHOT_PATTERN, document_content) or metadata.get('attachments', 0) > 0,
+            2
+        ),
+        _check(
+            "Publicación de los ejercicios en el foro",
+            mentions_forum and _matches(PUBLISH_PATTERN, document_content),
+            2
+        ),
+    ]
+
+
+@register('formato_entrega')
+def evaluate_delivery_format(document_content: str, metadata: Dict, config: Dict) -> List[Dict]:
+    """Formato de entrega: extensión, nombre del archivo, ejercicios incluidos, extensión mínima y secciones"""
+    checks = [_check("Documento entregado con contenido legible", bool(document_content.strip()), 1)]
+    file_name = metadata.get('file_name') or ''
+    file_type = (metadata.get('file_type') or file_name.rsplit('.', 1)[-1]).lower().lstrip('.')
+
+    formats = [fmt.lower().lstrip('.') for fmt in config.get('formatos', [])]
+    if formats:
+        checks.append(_check(f"Formato de archivo permitido ({', '.join(formats)})", file_type in formats, 2))
+
+    name_pattern = config.get('patron_nombre')
+    if name_pattern:
+        example = config.get('ejemplo_nombre', name_pattern)
+        checks.append(_check(f"Nombre del archivo según la guía (ej. {example})", re.match(name_pattern, file_name) is not None, 2))
+
+    # Entrega de un solo ejercicio (el nombre del archivo indica el criterio): no se exigen todos
+    required_exercises = config.get('ejercicios', []) if metadata.get('target_criterion') is None else []
+    if required_exercises:
+        present = set(split_exercise_spans(document_content).keys())
+        missing = [n for n in required_exercises if str(n) not in present]
+        aspect = "Incluye todos los ejercicios solicitados"
+        if missing:
+            aspect += f" (faltan: {', '.join(f'Ejercicio {n}' for n in missing)})"
+        checks.append(_check(aspect, not missing, 3))
+
+    min_cells = config.get('celdas_min')
+    if min_cells and 'total_cells' in metadata:
+        checks.append(_check(f"Al menos {min_cells} celdas desarrolladas", metadata['total_cells'] >= min_cells, 1))
+
+    min_pages = config.get('paginas_min')
+    if min_pages and 'total_pages' in metadata:
+        checks.append(_check(f"Al menos {min_pages} páginas", metadata['total_pages'] >= min_pages, 1))
+
+    for section in config.get('secciones', []):
+        checks.append(_check(f"Incluye la sección '{section}'", _matches(re.escape(section), document_content), 1))
+
+    if file_type == 'ipynb' and 'markdown_cells' in metadata:
+        checks.append(_check("Notebook organizado con celdas de texto explicativo", metadata['markdown_cells'] > 0, 1))
+
+    return checks
+
+
+def level_for_score(criterion: Dict, score: float) -> str:
+    """Nivel de la rúbrica alcanzado por el puntaje (un puntaje entre dos rangos cuenta en el nivel inferior)"""
+    if score <= 0:
+        return 'no_presentado'
+    for level in sorted(criterion.get('niveles', []), key=lambda lv: lv['puntaje_minimo'], reverse=True):
+        if level['puntaje_minimo'] <= score:
+            return level['nivel']
+    return 'bajo'
+
+
+def evaluate_locally(criterion: Dict, document_content: str, metadata: Dict = None) -> Optional[Dict]:
+    """
+    Califica un criterio con su evaluador local, si la rúbrica lo activa
+
+    Args:
+        criterion: Criterio de la rúbrica (con la llave opcional 'evaluador_local')
+        document_content: Texto extraído del documento
+        metadata: Metadatos de la extracción (file_name, file_type, total_pages,
+            total_cells, markdown_cells, images, attachments, partial) y target_criterion si el
+            nombre del archivo indica un solo criterio/ejercicio
+
+    Returns:
+        Dict de feedback con 'method': 'local', o None si el criterio no tiene
+        evaluador local (se evalúa con GPT)
+    """
+    config = criterion.get('evaluador_local')
+    if not config:
+        return None
+
+    evaluator = LOCAL_EVALUATORS.get(config.get('tipo'))
+    if evaluator is None:
+        print(f"  [WARNING] Evaluador local desconocido '{config.get('tipo')}' -> se usará GPT")
+        return None
+
+    checks = evaluator(document_content, metadata or {}, config)
+    total_weight = sum(check['peso'] for check in checks)
+    if not total_weight:
+        return None
+
+    criterion_number = criterion['numero']
+    max_score = criterion['puntaje_maximo']
+    met = [check['aspecto'] for check in checks if check['cumple']]
+    missing = [check['aspecto'] for check in checks if not check['cumple']]
+
+    ratio = sum(check['peso'] for check in checks if check['cumple']) / total_weight
+    score = round(ratio * max_score, 1)
+    level_achieved = level_for_score(criterion, score)
+
+    print(f"  [LOCAL] Criterio {criterion_number}: {score}/{max_score} ({len(met)}/{len(checks)} verificaciones) sin GPT")
+
+    return {
+        'success': True,
+        'criterion_number': criterion_number,
+        'criterion_name': criterion['nombre'],
+        'max_score': max_score,
+        'score': score,
+        'level_achieved': level_achieved,
+        'feedback': (
+            f"Criterio calificado automáticamente a partir de la estructura de la entrega: "
+            f"se cumplen {len(met)} de {len(checks)} verificaciones."
+            + (f" Pendiente: {'; '.join(missing)}." if missing else "")
+        ),
+        'aspects_met': met,
+        'improvements': [f"Revisar: {aspect}" for aspect in missing],
+        'local_checks': checks,
+        'method': 'local'
+    }
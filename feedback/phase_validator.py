@@ -2,30 +2,92 @@
 Validador de Fase para Evitar Evaluaciones Incorrectas
 Verifica que el documento corresponda a la fase seleccionada
 """
-from openai import OpenAI
-import json
+from feedback.llm_client import create_chat_client
 import os
-from typing import Dict
+from typing import Dict, Optional
 from dotenv import load_dotenv
 
+from feedback.course_router import CourseRouter
+from feedback.deadline import Deadline, request_options
+from feedback.schemas import CONFIDENCE, PHASE, parse_response, response_format
+
 load_dotenv()
 
 class PhaseValidator:
     """Valida que un documento corresponda a la fase correcta antes de evaluar"""
 
+    # Márgenes del enrutador local (de clase: también los usan las pruebas sin cliente de OpenAI)
+    accept_margin = 0.10   # Margen mínimo para aceptar el curso seleccionado
+    reject_margin = 0.20   # Margen mínimo para señalar otro curso sin GPT
+
     def __init__(self):
         """Inicializa el validador con OpenAI"""
         self.openai_api_key = os.getenv('OPENAI_API_KEY')
-        self.client = OpenAI(api_key=self.openai_api_key)
+        self.client = create_chat_client(self.openai_api_key)  # Hedging + circuit breaker
         self.model = "gpt-4o-mini"
 
-    def validate_document_phase(self, document_content: str, rubric_data: Dict) -> Dict:
+        # Enrutamiento local por centroides TF-IDF (GPT solo con margen bajo)
+        self.courses_dir = 'courses'
+
+    def _validate_locally(self, document_content: str, rubric_data: Dict) -> Optional[Dict]:
+        """
+        Valida la fase con el enrutador local de cursos
+
+        Returns:
+            Dict con el mismo formato de validate_document_phase, o None si el margen es bajo
+        """
+        course_name = rubric_data.get('nombre_curso', 'Unknown')
+        phase = rubric_data.get('fase', '') or course_name
+
+        try:
+            router = CourseRouter.from_courses_dir(self.courses_dir)
+        except Exception as e:
+            print(f"  [WARNING] Enrutador local no disponible: {e}")
+            return None
+
+        if course_name not in router.centroids:
+            return None
+
+        routing = router.route(document_content)
+        best_course = routing['best_course']
+        margin = routing['margin']
+
+        if best_course == course_name and margin >= self.accept_margin:
+            is_valid = True
+            phase_mismatch = None
+            confidence = 'alta'
+            recommendation = f"[OK] El documento corresponde a {phase}. Puede procederse con la evaluacion."
+        elif best_course != course_name and margin >= self.reject_margin:
+            is_valid = False
+            phase_mismatch = best_course
+            confidence = 'alta' if margin >= 1.5 * self.reject_margin else 'media'
+            recommendation = f"[ADVERTENCIA] Este documento parece corresponder a '{best_course}', no a '{phase}'. Por favor, selecciona la fase correcta antes de evaluar."
+        else:
+            print(f"  [LOCAL] Margen bajo ({margin}) entre cursos -> consultar GPT")
+            return None
+
+        print(f"  [LOCAL] Fase validada sin GPT: mejor curso '{best_course}' (margen: {margin})")
+
+        return {
+            'is_valid': is_valid,
+            'confidence': confidence,
+            'expected_topics': self._extract_expected_topics(rubric_data),
+            'found_topics': routing['matched_terms'],
+            'phase_mismatch': phase_mismatch,
+            'explanation': f"Clasificacion local por similitud de vocabulario con cada curso: {routing['scores']}",
+            'recommendation': recommendation,
+            'routing': routing,
+            'method': 'local'
+        }
+
+    def validate_document_phase(self, document_content: str, rubric_data: Dict, deadline: Deadline = None) -> Dict:
         """
         Valida que el documento corresponda a la fase indicada en la rúbrica
 
         Args:
             document_content: Contenido del documento a evaluar
             rubric_data: Datos de la rúbrica (contiene nombre_curso, fase, criterios)
+            deadline: Plazo de la evaluación (opcional); si se agota, el resultado es permisivo
 
         Returns:
             Dict con:
@@ -34,8 +96,14 @@ class PhaseValidator:
             - expected_topics: list (temas esperados)
             - found_topics: list (temas encontrados)
             - recommendation: str (mensaje para el usuario)
+            - method: str (local o gpt)
         """
         try:
+            # PASO 1: Enrutamiento local (GPT solo si el margen entre cursos es bajo)
+            local_result = self._validate_locally(document_content, rubric_data)
+            if local_result:
+                return local_result
+
             course_name = rubric_data.get('nombre_curso', 'Unknown')
             phase = rubric_data.get('fase', '')
 
@@ -61,19 +129,9 @@ ANÁLISIS REQUERIDO:
 3. Determina si hay correspondencia clara
 
 INSTRUCCIONES:
-- Si el documento trata PRINCIPALMENTE los temas de la fase → is_valid: true
-- Si el documento trata temas de OTRA fase → is_valid: false
-- Si no estás seguro → confianza: "baja"
-
-FORMATO DE RESPUESTA (JSON):
-{{
-  "is_valid": true/false,
-  "confidence": "alta/media/baja",
-  "expected_topics_found": ["<tema esperado 1>", "<tema esperado 2>"],
-  "actual_topics_found": ["<tema real 1>", "<tema real 2>"],
-  "phase_mismatch": "<nombre de la fase si es diferente, o null>",
-  "explanation": "<explicación breve de por qué sí o no corresponde>"
-}}
+- Si el documento trata PRINCIPALMENTE los temas de la fase → valido: true
+- Si el documento trata temas de OTRA fase → valido: false (indica otra_fase si la reconoces)
+- Si no estás seguro → conf: B
 """
 
             # Llamar a GPT
@@ -85,16 +143,17 @@ FORMATO DE RESPUESTA (JSON):
                 ],
                 temperature=0.2,  # Más determinístico
                 max_tokens=400,
-                response_format={"type": "json_object"}
+                response_format=response_format('validacion_fase', PHASE),
+                **request_options(deadline, "validación de fase")
             )
 
             # Parsear respuesta
-            result = json.loads(response.choices[0].message.content)
+            result = parse_response(response)
 
-            is_valid = result.get('is_valid', False)
-            confidence = result.get('confidence', 'baja')
-            phase_mismatch = result.get('phase_mismatch')
-            explanation = result.get('explanation', '')
+            is_valid = result['valido']
+            confidence = CONFIDENCE[result['conf']]
+            phase_mismatch = result['otra_fase']
+            explanation = result['expl']
 
             # Generar recomendación
             if is_valid:
@@ -109,10 +168,11 @@ FORMATO DE RESPUESTA (JSON):
                 'is_valid': is_valid,
                 'confidence': confidence,
                 'expected_topics': expected_topics,
-                'found_topics': result.get('actual_topics_found', []),
+                'found_topics': result['temas'],
                 'phase_mismatch': phase_mismatch,
                 'explanation': explanation,
-                'recommendation': recommendation
+                'recommendation': recommendation,
+                'method': 'gpt'
             }
 
         except Exception as e:
@@ -125,7 +185,8 @@ FORMATO DE RESPUESTA (JSON):
                 'found_topics': [],
                 'phase_mismatch': None,
                 'explanation': f'Error en validacion: {str(e)}',
-                'recommendation': '[WARNING] No se pudo validar la fase. Proceda con precaucion.'
+                'recommendation': '[WARNING] No se pudo validar la fase. Proceda con precaucion.',
+                'method': 'error'
             }
 
     def _extract_expected_topics(self, rubric_data: Dict) -> list:
@@ -0,0 +1,178 @@
+"""
+Esquemas Estrictos de Salida (Structured Outputs)
+Esquemas JSON con llaves compactas y enums cortos para cada etapa que llama a GPT.
+Con response_format json_schema + strict el modelo siempre devuelve todas las llaves,
+por lo que los prompts ya no describen el formato y no se usan valores por defecto.
+"""
+import json
+from typing import Dict
+
+# Códigos compactos de los enums (la salida usa 1 carácter; se decodifican al parsear)
+LEVELS = {'A': 'alto', 'M': 'medio', 'B': 'bajo'}
+CONFIDENCE = {'A': 'alta', 'M': 'media', 'B': 'baja'}
+DOCUMENT_TYPES = {'G': 'guia_actividad', 'E': 'entrega_estudiante', 'I': 'indeterminado'}
+
+
+def _object(properties: Dict) -> Dict:
+    """Objeto estricto: todas las llaves requeridas y sin llaves adicionales"""
+    return {
+        'type': 'object',
+        'properties': properties,
+        'required': list(properties.keys()),
+        'additionalProperties': False
+    }
+
+
+def _enum(codes: Dict, description: str) -> Dict:
+    legend = ', '.join(f"{code}={value}" for code, value in codes.items())
+    return {'type': 'string', 'enum': list(codes.keys()), 'description': f"{description} ({legend})"}
+
+
+def _text_list(description: str) -> Dict:
+    return {'type': 'array', 'items': {'type': 'string'}, 'description': description}
+
+
+# Calificación rápida de un criterio
+CRITERION_GRADE = _object({
+    'niv': _enum(LEVELS, 'Nivel alcanzado'),
+    'pts': {'type': 'number', 'description': 'Puntaje asignado'},
+    'raz': _text_list('2 a 4 razones breves (máx. 15 palabras) que justifican la calificación')
+})
+
+# Retroalimentación completa de un criterio (calificación + feedback)
+CRITERION_FEEDBACK = _object({
+    'niv': _enum(LEVELS, 'Nivel alcanzado'),
+    'pts': {'type': 'number', 'description': 'Puntaje asignado'},
+    'fb': {'type': 'string', 'description': 'Feedback detallado, motivador y específico (2-4 párrafos)'},
+    'ok': _text_list('Aspectos específicos cumplidos'),
+    'mej': _text_list('Sugerencias de mejora constructivas')
+})
+
+# Feedback detallado de un criterio ya calificado (sin cambiar el puntaje)
+CRITERION_DETAIL = _object({
+    'fb': {'type': 'string', 'description': 'Feedback detallado, motivador y específico (2-4 párrafos), coherente con la calificación asignada'},
+    'ok': _text_list('Aspectos específicos cumplidos'),
+    'mej': _text_list('Sugerencias de mejora constructivas')
+})
+
+# Verificación de presencia de un criterio (la razón va primero para que el modelo justifique antes de decidir)
+PRESENCE = _object({
+    'raz': {'type': 'string', 'description': 'Explicación breve'},
+    'pres': {'type': 'boolean', 'description': 'true si hay evidencia del criterio'},
+    'conf': _enum(CONFIDENCE, 'Confianza')
+})
+
+# Retroalimentación general del trabajo
+OVERALL = _object({
+    'res': {'type': 'string', 'description': 'Resumen del desempeño general (máx. 2 párrafos cortos)'},
+    'fort': _text_list('2-3 fortalezas principales'),
+    'mej': _text_list('2-3 áreas de mejora prioritarias'),
+    'concl': {'type': 'string', 'description': 'Conclusión motivadora'}
+})
+
+# Validador de tipo de documento (guía vs entrega)
+DOCUMENT_TYPE = _object({
+    'ev_guia': _text_list('Evidencias de que es guía/instrucciones'),
+    'ev_entrega': _text_list('Evidencias de que es trabajo del estudiante'),
+    'expl': {'type': 'string', 'description': 'Explicación breve de la clasificación'},
+    'tipo': _enum(DOCUMENT_TYPES, 'Tipo de documento'),
+    'conf': _enum(CONFIDENCE, 'Confianza')
+})
+
+# Validador de fase
+PHASE = _object({
+    'temas': _text_list('Temas principales que trata el documento'),
+    'expl': {'type': 'string', 'description': 'Explicación breve de por qué sí o no corresponde'},
+    'valido': {'type': 'boolean', 'description': 'true si el documento corresponde a la fase esperada'},
+    'otra_fase': {'type': ['string', 'null'], 'description': 'Fase a la que parece corresponder si es otra; null si no aplica'},
+    'conf': _enum(CONFIDENCE, 'Confianza')
+})
+
+
+def response_format(name: str, schema: Dict) -> Dict:
+    """response_format para chat.completions.create con el esquema en modo estricto"""
+    return {
+        'type': 'json_schema',
+        'json_schema': {'name': name, 'strict': True, 'schema': schema}
+    }
+
+
+def parse_response(response) -> Dict:
+    """
+    Lee la respuesta estructurada del modelo
+
+    Raises:
+        ValueError: si el modelo rechazó la solicitud o la respuesta quedó truncada
+    """
+    choice = response.choices[0]
+    refusal = getattr(choice.message, 'refusal', None)
+    if refusal:
+        raise ValueError(f"El modelo rechazó la solicitud: {refusal}")
+    if choice.finish_reason == 'length':
+        raise ValueError("Respuesta truncada por max_tokens")
+    return json.loads(choice.message.content)
+
+
+def clamp_score(score: float, max_score: float) -> float:
+    """El esquema estricto no acota números: se limita el puntaje al rango del criterio"""
+    return round(min(max(float(score), 0.0), float(max_score)), 1)
+
+
+# Mapa de evidencia del documento (una sola lectura compartida por todos los criterios)
+_EXERCISE_REF = {'type': ['integer', 'null'], 'description': 'Número de ejercicio donde aparece; null si no se puede asociar'}
+
+EVIDENCE_MAP = _object({
+    'ejercicios': {'type': 'array', 'description': 'Encabezados de ejercicio presentes', 'items': _object({
+        'ej': {'type': 'integer', 'description': 'Número de ejercicio'},
+        'titulo': {'type': 'string', 'description': 'Título o tema del ejercicio'}
+    })},
+    'datasets': {'type': 'array', 'description': 'Datasets cargados', 'items': _object({
+        'nombre': {'type': 'string', 'description': 'Archivo o nombre del dataset'},
+        'ej': _EXERCISE_REF
+    })},
+    'modelos': {'type': 'array', 'description': 'Modelos ajustados', 'items': _object({
+        'nombre': {'type': 'string', 'description': 'Clase o algoritmo (ej. KMeans, DBSCAN)'},
+        'params': {'type': 'string', 'description': 'Parámetros usados (ej. "eps=0.5, min_samples=5"); vacío si no se indican'},
+        'ej': _EXERCISE_REF
+    })},
+    'metricas': {'type': 'array', 'description': 'Métricas reportadas con su valor', 'items': _object({
+        'nombre': {'type': 'string', 'description': 'Métrica (ej. RMSE, silhouette)'},
+        'valor': {'type': 'string', 'description': 'Valor reportado tal como aparece'},
+        'ej': _EXERCISE_REF
+    })},
+    'graficos': {'type': 'array', 'description': 'Gráficos producidos', 'items': _object({
+        'tipo': {'type': 'string', 'description': 'Tipo de gráfico (ej. dendrograma, método del codo)'},
+        'ej': _EXERCISE_REF
+    })}
+})
+
+
+def criterion_batch_schema(ids) -> Dict:
+    """
+    Calificación rápida de un criterio para varias entregas en una sola llamada:
+    un resultado por id (los ids son un enum para que el modelo no invente ni mezcle entregas)
+    """
+    return _object({
+        'resultados': {'type': 'array', 'items': _object({
+            'id': {'type': 'string', 'enum': list(ids), 'description': 'Id de la entrega'},
+            'pres': {'type': 'boolean', 'description': 'false si la entrega no tiene evidencia del criterio'},
+            'niv': _enum(LEVELS, 'Nivel alcanzado'),
+            'pts': {'type': 'number', 'description': 'Puntaje asignado (0 si pres es false)'},
+            'raz': _text_list('2 a 4 razones breves (máx. 15 palabras) basadas solo en esta entrega')
+        })}
+    })
+
+
+# Verificación de tareas de condiciones.json (todas las tareas sin resolver localmente, en una llamada)
+TASK_STATUS = {'C': 'cumplida', 'P': 'parcial', 'N': 'no_cumplida'}
+
+
+def task_checks_schema(ids) -> Dict:
+    """Estado de cada tarea por id (enum para que el modelo no invente ni omita tareas)"""
+    return _object({
+        'tareas': {'type': 'array', 'items': _object({
+            'id': {'type': 'string', 'enum': list(ids), 'description': 'Id de la tarea'},
+            'est': _enum(TASK_STATUS, 'Estado de la tarea'),
+            'evid': {'type': 'string', 'description': 'Evidencia textual breve del documento; vacío si no hay'}
+        })}
+    })
@@ -0,0 +1,99 @@
+"""
+Segmentador de Ejercicios
+Divide el texto extraído en tramos por ejercicio ("Ejercicio 1", "Ejercicio 2", ...)
+para comparar versiones de una entrega tramo por tramo
+"""
+import hashlib
+import re
+from typing import Dict
+
+# Encabezados de ejercicio: al inicio de línea (admite markdown "#", viñetas y "---")
+HEADING_PATTERN = re.compile(
+    r'^[\s#\*\-]*(?:ejercicio|exercise|actividad|activity|punto|tarea|task)[\s\n\r]*[:#\-]?\s*(\d+)\b',
+    re.IGNORECASE | re.MULTILINE
+)
+
+GENERAL_SPAN = 'general'
+
+# Marcadores que agregan los procesadores ("--- Código 3 ---", "--- Página 2 (OCR) ---"):
+# se ignoran al comparar para que insertar una celda o página no altere los demás tramos
+MARKER_PATTERN = re.compile(r'^--- (?:c[oó]digo|markdown|p[aá]gina) \d+(?: \(ocr\))? ---$', re.IGNORECASE | re.MULTILINE)
+
+
+def split_exercise_spans(document_content: str) -> Dict[str, str]:
+    """
+    Divide el documento en tramos por ejercicio
+
+    Args:
+        document_content: Texto extraído del documento
+
+    Returns:
+        Dict {numero_ejercicio (str): texto} más 'general' con el texto fuera de ejercicios
+    """
+    spans = {GENERAL_SPAN: ''}
+    headings = [m for m in HEADING_PATTERN.finditer(document_content) if 1 <= int(m.group(1)) <= 10]
+
+    if not headings:
+        spans[GENERAL_SPAN] = document_content
+        return spans
+
+    spans[GENERAL_SPAN] = document_content[:headings[0].start()]
+
+    for i, match in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(document_content)
+        key = str(int(match.group(1)))
+        spans[key] = spans.get(key, '') + document_content[match.start():end]
+
+    return spans
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza el texto para comparar (sin marcadores, minúsculas y espacios colapsados)"""
+    return ' '.join(MARKER_PATTERN.sub('', text).lower().split())
+
+
+def span_hashes(document_content: str) -> Dict[str, str]:
+    """Huella SHA-256 del texto normalizado de cada tramo"""
+    return {
+        key: hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+        for key, text in split_exercise_spans(document_content).items()
+    }
+
+
+def criterion_span_key(criterion_number: int, spans: Dict[str, str]) -> str:
+    """
+    Tramo relevante para un criterio: el ejercicio con su mismo número,
+    o el tramo general si el documento no tiene ese ejercicio
+    """
+    key = str(criterion_number)
+    return key if key in spans else GENERAL_SPAN
+
+
+def unchanged_criteria(criterion_numbers, old_content: str, new_content: str,
+                       allow_general: bool = True) -> list:
+    """
+    Criterios cuyo tramo relevante es idéntico entre dos versiones del documento
+
+    Args:
+        criterion_numbers: Números de criterio a revisar
+        old_content: Texto de la versión anterior (ya evaluada)
+        new_content: Texto de la nueva versión
+        allow_general: Si False, los criterios sin ejercicio propio (tramo 'general') no
+            cuentan como sin cambios
+
+    Returns:
+        Lista de números de criterio que no cambiaron
+    """
+    old_hashes = span_hashes(old_content)
+    new_hashes = span_hashes(new_content)
+
+    unchanged = []
+    for number in criterion_numbers:
+        old_key = criterion_span_key(number, old_hashes)
+        new_key = criterion_span_key(number, new_hashes)
+        if not allow_general and old_key == GENERAL_SPAN:
+            continue
+        if old_key == new_key and old_hashes[old_key] == new_hashes[new_key]:
+            unchanged.append(number)
+
+    return unchanged
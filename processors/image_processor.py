@@ -17,13 +17,15 @@ class ImageProcessor:
         # En Windows, descomentar y ajustar la ruta:
         # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
-    def extract_text(self, image_path: str, lang='spa+eng') -> Dict[str, any]:
+    def extract_text(self, image_path: str, lang='spa+eng', deadline=None) -> Dict[str, any]:
         """
         Extrae texto de una imagen usando OCR
 
         Args:
             image_path: Ruta a la imagen
             lang: Idiomas para OCR ('spa' español, 'eng' inglés)
+            deadline: Plazo de la evaluación (feedback.deadline.Deadline, opcional);
+                si se agota el OCR se interrumpe y el resultado queda parcial (sin texto)
 
         Returns:
             Dict con texto extraído y metadatos
@@ -36,8 +38,19 @@ class ImageProcessor:
             if image.mode != 'RGB':
                 image = image.convert('RGB')
 
-            # Extraer texto con OCR
-            text = pytesseract.image_to_string(image, lang=lang)
+            # Extraer texto con OCR (acotado por el tiempo restante)
+            remaining = deadline.remaining() if deadline is not None else None
+            partial = False
+            if remaining is not None and remaining <= 0:
+                print(f"  [OCR] Tiempo agotado antes del OCR de la imagen")
+                text, partial = '', True
+            else:
+                try:
+                    text = pytesseract.image_to_string(image, lang=lang, timeout=remaining or 0)
+                except RuntimeError as e:
+                    # pytesseract lanza RuntimeError cuando se alcanza el timeout
+                    print(f"  [OCR] Imagen interrumpida: {e}")
+                    text, partial = '', True
 
             # Obtener información adicional
             width, height = image.size
@@ -46,6 +59,7 @@ class ImageProcessor:
             return {
                 'success': True,
                 'text': text.strip(),
+                'partial': partial,
                 'metadata': {
                     'width': width,
                     'height': height,
@@ -106,13 +120,14 @@ class ImageProcessor:
             print(f"Error mejorando imagen: {e}")
             return image_path
 
-    def process(self, image_path: str, enhance: bool = True) -> Dict:
+    def process(self, image_path: str, enhance: bool = True, deadline=None) -> Dict:
         """
         Procesa completamente una imagen extrayendo texto
 
         Args:
             image_path: Ruta a la imagen
             enhance: Si True, mejora la imagen antes del OCR
+            deadline: Plazo para el OCR (opcional)
 
         Returns:
             Dict con contenido procesado
@@ -120,7 +135,7 @@ class ImageProcessor:
         # Mejorar imagen si se solicita
         if enhance:
             enhanced_path = self.enhance_image_for_ocr(image_path)
-            extraction_result = self.extract_text(enhanced_path)
+            extraction_result = self.extract_text(enhanced_path, deadline=deadline)
 
             # Limpiar imagen temporal
             if enhanced_path != image_path and os.path.exists(enhanced_path):
@@ -129,7 +144,7 @@ class ImageProcessor:
                 except:
                     pass
         else:
-            extraction_result = self.extract_text(image_path)
+            extraction_result = self.extract_text(image_path, deadline=deadline)
 
         if not extraction_result['success']:
             return extraction_result
@@ -144,6 +159,7 @@ class ImageProcessor:
             'full_text': text,
             'has_code': has_code,
             'has_diagrams': has_diagrams,
+            'partial': extraction_result['partial'],
             'metadata': extraction_result['metadata']
         }
 
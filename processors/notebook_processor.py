@@ -5,8 +5,12 @@ Extrae código, markdown y outputs
 import nbformat
 from nbconvert import MarkdownExporter
 import json
+import re
 from typing import Dict, List
 
+# Imágenes incrustadas en el markdown como data URI (![...](data:image/...) o <img src="data:image/...">)
+EMBEDDED_IMAGE_PATTERN = re.compile(r'''(?:\]\(|src=["'])data:image/''', re.IGNORECASE)
+
 class NotebookProcessor:
     """Procesa notebooks de Jupyter y extrae contenido estructurado"""
 
@@ -32,6 +36,8 @@ class NotebookProcessor:
             code_cells = []
             markdown_cells = []
             full_text = ""
+            images = 0       # Gráficos en los outputs de código (matplotlib, seaborn...)
+            attachments = 0  # Imágenes adjuntas o incrustadas en markdown (ej. capturas de pantalla)
 
             # Procesar cada celda
             for i, cell in enumerate(nb.cells):
@@ -54,6 +60,8 @@ class NotebookProcessor:
                                 # Extraer texto de data (puede contener resultados)
                                 if 'text/plain' in output.data:
                                     outputs.append(output.data['text/plain'])
+                                if any(mime.startswith('image/') for mime in output.data):
+                                    images += 1
 
                     cell_info['outputs'] = outputs
                     full_text += f"\n--- Código {i + 1} ---\n{cell.source}\n"
@@ -64,6 +72,8 @@ class NotebookProcessor:
                 elif cell.cell_type == 'markdown':
                     # Extraer markdown
                     markdown_cells.append(cell.source)
+                    attachments += len(cell.get('attachments', {}) or {})
+                    attachments += len(EMBEDDED_IMAGE_PATTERN.findall(cell.source))
                     cell_info['rendered'] = cell.source
                     full_text += f"\n--- Markdown {i + 1} ---\n{cell.source}\n"
 
@@ -76,6 +86,8 @@ class NotebookProcessor:
                 'markdown_cells': markdown_cells,
                 'full_text': full_text,
                 'total_cells': len(nb.cells),
+                'images': images,
+                'attachments': attachments,
                 'metadata': nb.metadata if hasattr(nb, 'metadata') else {}
             }
 
@@ -193,6 +205,7 @@ class NotebookProcessor:
             'code_cells': extraction_result['code_cells'],
             'markdown_cells': extraction_result['markdown_cells'],
             'total_cells': extraction_result['total_cells'],
+            'images': extraction_result['images'],
             'code_quality': code_quality,
             'visualizations': visualizations,
             'metadata': extraction_result['metadata']
@@ -28,12 +28,14 @@ class PDFProcessor:
                     pytesseract.pytesseract.tesseract_cmd = path
                     break
 
-    def extract_text_with_ocr(self, pdf_path: str) -> Dict[str, any]:
+    def extract_text_with_ocr(self, pdf_path: str, deadline=None) -> Dict[str, any]:
         """
         Extrae texto de PDF usando OCR (para PDFs con imágenes)
 
         Args:
             pdf_path: Ruta al archivo PDF
+            deadline: Plazo de la evaluación (feedback.deadline.Deadline, opcional);
+                al agotarse se detiene entre páginas y el resultado queda parcial
 
         Returns:
             Dict con texto extraído mediante OCR
@@ -64,10 +66,24 @@ class PDFProcessor:
             pages_content = []
             full_text = ""
 
+            partial = False
+
             print(f"  [OCR] Procesando {len(images)} páginas con OCR...")
             for i, image in enumerate(images):
+                remaining = deadline.remaining() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    print(f"  [OCR] Tiempo agotado: {i}/{len(images)} páginas procesadas")
+                    partial = True
+                    break
+
                 # Extraer texto con OCR (español e inglés)
-                page_text = pytesseract.image_to_string(image, lang='spa+eng')
+                try:
+                    page_text = pytesseract.image_to_string(image, lang='spa+eng', timeout=remaining or 0)
+                except RuntimeError as e:
+                    # pytesseract lanza RuntimeError cuando se alcanza el timeout
+                    print(f"  [OCR] Página {i + 1} interrumpida: {e}")
+                    partial = True
+                    break
 
                 if page_text and len(page_text.strip()) > 10:
                     pages_content.append({
@@ -84,6 +100,7 @@ class PDFProcessor:
                 'full_text': full_text,
                 'pages': pages_content,
                 'total_pages': len(images),
+                'partial': partial,
                 'metadata': {'extraction_method': 'OCR'}
             }
 
@@ -236,13 +253,14 @@ class PDFProcessor:
 
         return code_blocks
 
-    def process(self, pdf_path: str) -> Dict:
+    def process(self, pdf_path: str, deadline=None) -> Dict:
         """
         Procesa completamente un PDF extrayendo texto, secciones y código
         Si el PDF tiene poco texto, intenta OCR automáticamente
 
         Args:
             pdf_path: Ruta al archivo PDF
+            deadline: Plazo para el OCR (opcional)
 
         Returns:
             Dict con todo el contenido procesado
@@ -251,7 +269,7 @@ class PDFProcessor:
 
         # MODO DEBUG: SIEMPRE usar OCR primero para PDFs con imágenes
         print(f"[PDF] 🔍 MODO DEBUG: Intentando OCR primero...")
-        ocr_result = self.extract_text_with_ocr(pdf_path)
+        ocr_result = self.extract_text_with_ocr(pdf_path, deadline)
 
         if ocr_result['success']:
             ocr_text_length = len(ocr_result.get('full_text', ''))
@@ -278,6 +296,7 @@ class PDFProcessor:
             'code_blocks': code_blocks,
             'pages': extraction_result.get('pages', []),
             'total_pages': extraction_result.get('total_pages', 0),
+            'partial': extraction_result.get('partial', False),
             'metadata': extraction_result.get('metadata', {})
         }
 
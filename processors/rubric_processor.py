@@ -5,10 +5,7 @@ Extrae criterios de evaluación automáticamente
 import re
 from typing import Dict, List
 
-try:
-    from .pdf_processor import PDFProcessor
-except ImportError:
-    from pdf_processor import PDFProcessor
+from processors.pdf_processor import PDFProcessor
 
 class RubricProcessor:
     """Procesa rúbricas en formato PDF y extrae criterios estructurados"""
@@ -0,0 +1,108 @@
+"""
+Cache Persistente de Embeddings
+Guarda en disco el embedding de cada texto por (modelo, dimensiones, sha256 del texto):
+recargar rúbricas sin cambios o re-evaluar el mismo documento no vuelve a llamar a la API.
+Los vectores se guardan como arreglos .npy compactos (float16 por defecto) y el
+directorio se acota por tamaño desalojando los menos usados (LRU por fecha de acceso).
+"""
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """Cache en disco de embeddings con desalojo LRU acotado por tamaño"""
+
+    def __init__(self, cache_dir: str = None, max_mb: float = None, dtype: str = 'float16'):
+        """
+        Args:
+            cache_dir: Directorio del cache (por defecto data/embeddings)
+            max_mb: Tamaño máximo en MB (por defecto EMBEDDING_CACHE_MAX_MB o 256)
+            dtype: Tipo de los vectores guardados ('float16' o 'float32')
+        """
+        self.cache_dir = Path(cache_dir or os.getenv('EMBEDDING_CACHE_DIR', 'data/embeddings'))
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(float(max_mb or os.getenv('EMBEDDING_CACHE_MAX_MB', '256')) * 1024 * 1024)
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.Lock()
+        self._size = sum(path.stat().st_size for path in self.cache_dir.glob('*/*.npy'))
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, dimensions: int, text: str) -> str:
+        """Llave del embedding: modelo + dimensiones + huella del texto"""
+        text_digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        return hashlib.sha256(f"{model}|{dimensions}|{text_digest}".encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.npy"
+
+    def get(self, model: str, dimensions: int, text: str) -> Optional[List[float]]:
+        """Embedding guardado del texto, o None si no está en el cache"""
+        path = self._path(self.key(model, dimensions, text))
+        try:
+            vector = np.load(path)
+            os.utime(path)  # Marca de uso reciente para el desalojo LRU
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            print(f"  [EMBED-CACHE] Registro ilegible ({path.name}): {e}")
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return vector.astype(np.float32).tolist()
+
+    def get_many(self, model: str, dimensions: int, texts: List[str]) -> List[Optional[List[float]]]:
+        """Embeddings guardados de varios textos (None en los que faltan)"""
+        return [self.get(model, dimensions, text) for text in texts]
+
+    def put(self, model: str, dimensions: int, text: str, embedding: List[float]):
+        """Guarda el embedding del texto (escritura atómica) y desaloja si se excede el tamaño"""
+        path = self._path(self.key(model, dimensions, text))
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.asarray(embedding, dtype=self.dtype))
+        previous = path.stat().st_size if path.exists() else 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._size += path.stat().st_size - previous
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Borra los embeddings usados hace más tiempo hasta quedar en el 90% del máximo"""
+        files = sorted(self.cache_dir.glob('*/*.npy'), key=lambda path: path.stat().st_mtime)
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+
+        for path in files:
+            if self._size <= target:
+                break
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            self._size -= size
+            removed += 1
+
+        print(f"  [EMBED-CACHE] {removed} embeddings desalojados (tamaño: {self._size / 1024 / 1024:.1f} MB)")
+
+    def stats(self):
+        """Aciertos, fallos y tamaño actual del cache"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size_mb': round(self._size / 1024 / 1024, 2),
+            'max_mb': round(self.max_bytes / 1024 / 1024, 2)
+        }
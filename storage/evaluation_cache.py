@@ -0,0 +1,169 @@
+"""
+Cache de Evaluaciones Completas
+Memoriza el resultado del pipeline (texto extraído, validaciones y evaluación)
+por huella del archivo subido, versión de la rúbrica y configuración del modelo
+"""
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+
+def file_hash(file_bytes: bytes) -> str:
+    """Huella SHA-256 del contenido del archivo subido"""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def content_hash(data) -> str:
+    """Huella SHA-256 de una estructura JSON en forma canónica"""
+    canonical = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def rubric_version(rubric_data: Dict, condiciones: Dict = None) -> str:
+    """Versión de la rúbrica: cambia si se edita la rúbrica o sus condiciones"""
+    return content_hash({'rubrica': rubric_data, 'condiciones': condiciones or {}})
+
+
+class EvaluationCache:
+    """Almacena en disco el resultado de cada etapa del pipeline por huella de la entrega"""
+
+    def __init__(self, cache_dir: str = None):
+        """
+        Inicializa el directorio del cache
+
+        Args:
+            cache_dir: Directorio donde se guardan los registros (por defecto data/evaluaciones)
+        """
+        self.cache_dir = Path(cache_dir or os.getenv('EVALUATION_CACHE_DIR', 'data/evaluaciones'))
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        # Índice {file_hash|curso: [llaves]} para encontrar evaluaciones del mismo archivo
+        # hechas con otra versión de la rúbrica
+        self.versions_path = self.cache_dir / '_versiones.json'
+
+    @staticmethod
+    def context_fingerprint(rubric_data: Dict, model_config: Dict, condiciones: Dict = None) -> str:
+        """Huella del contexto de evaluación: versión de la rúbrica + configuración del modelo"""
+        return content_hash({
+            'rubric': rubric_version(rubric_data, condiciones),
+            'model': model_config
+        })
+
+    def fingerprint(self, file_bytes: bytes, rubric_data: Dict, model_config: Dict,
+                    condiciones: Dict = None, file_name: str = None) -> str:
+        """
+        Calcula la llave del cache para una entrega
+
+        Args:
+            file_bytes: Contenido del archivo subido
+            rubric_data: Rúbrica del curso seleccionado
+            model_config: Configuración del modelo (ver GPTFeedbackGenerator.model_config)
+            condiciones: Condiciones detalladas del curso (opcional)
+            file_name: Nombre del archivo (opcional); se incluye porque el nombre influye en
+                la evaluación (criterio indicado en el nombre, formato de entrega)
+
+        Returns:
+            Huella hexadecimal
+        """
+        key_data = {
+            'file': file_hash(file_bytes),
+            'context': self.context_fingerprint(rubric_data, model_config, condiciones)
+        }
+        if file_name is not None:
+            key_data['file_name'] = file_name
+        return content_hash(key_data)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Obtiene el registro de una entrega
+
+        Returns:
+            Dict con las etapas guardadas ('content', 'type_validation',
+            'phase_validation', 'evaluation_result') o None si no existe
+        """
+        path = self._path(key)
+        if not path.exists():
+            return None
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"  [CACHE] Registro ilegible ({path.name}): {e}")
+            return None
+
+    def put(self, key: str, **stages) -> Dict:
+        """
+        Guarda (o completa) el registro de una entrega
+
+        Args:
+            key: Huella calculada con fingerprint()
+            **stages: Etapas a guardar (content, type_validation, evaluation_result, ...)
+
+        Returns:
+            Registro actualizado
+        """
+        record = self.get(key) or {'key': key, 'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        record.update(stages)
+        record['updated_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        # Escritura atómica: nunca dejar un registro a medio escribir
+        path = self._path(key)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        return record
+
+    def _load_versions(self) -> Dict:
+        if not self.versions_path.exists():
+            return {}
+        try:
+            with open(self.versions_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def link_version(self, file_digest: str, course: str, key: str):
+        """Registra que la llave corresponde a una evaluación del archivo para el curso"""
+        versions = self._load_versions()
+        keys = versions.setdefault(f"{file_digest}|{course}", [])
+        if key in keys:
+            keys.remove(key)
+        keys.append(key)
+
+        tmp_path = self.versions_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(versions, f)
+        os.replace(tmp_path, self.versions_path)
+
+    def previous_evaluation(self, file_digest: str, course: str, exclude_key: str = None) -> Optional[Dict]:
+        """
+        Obtiene la evaluación más reciente del mismo archivo y curso (con otra llave,
+        es decir, con otra versión de la rúbrica o del modelo)
+
+        Returns:
+            Registro con 'evaluation_result' o None
+        """
+        keys = self._load_versions().get(f"{file_digest}|{course}", [])
+        for key in reversed(keys):
+            if key == exclude_key:
+                continue
+            record = self.get(key)
+            if record and record.get('evaluation_result'):
+                return record
+        return None
+
+    def invalidate(self, key: str):
+        """Elimina el registro de una entrega (re-evaluación forzada)"""
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,149 @@
+"""
+Índice de Similitud de Entregas (MinHash + LSH)
+Detecta entregas casi idénticas (plantillas compartidas, trabajo en grupo, posible plagio)
+sobre el texto normalizado de todas las entregas evaluadas
+"""
+import hashlib
+import json
+import os
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from processors.exercise_segmenter import normalize_text
+
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+class SimilarityIndex:
+    """Índice MinHash/LSH persistente de entregas evaluadas"""
+
+    def __init__(self, index_path: str = None, num_perm: int = 128, bands: int = 32,
+                 shingle_size: int = 5, seed: int = 42):
+        """
+        Inicializa (o carga) el índice
+
+        Args:
+            index_path: Archivo JSON del índice (por defecto data/similitud/indice.json)
+            num_perm: Número de permutaciones MinHash
+            bands: Bandas LSH (num_perm / bands filas por banda)
+            shingle_size: Palabras por shingle
+            seed: Semilla de las permutaciones (debe ser fija para comparar firmas)
+        """
+        self.index_path = Path(index_path or os.getenv('SIMILARITY_INDEX_PATH', 'data/similitud/indice.json'))
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+        self.entries = {}
+        self.buckets = defaultdict(set)
+        self._load()
+
+    def _load(self):
+        if not self.index_path.exists():
+            return
+
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except Exception as e:
+            print(f"  [SIMILITUD] Índice ilegible, se reconstruirá: {e}")
+            self.entries = {}
+
+        for key, entry in self.entries.items():
+            for bucket in self._bands(entry['signature'], entry['course']):
+                self.buckets[bucket].add(key)
+
+    def _save(self):
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.index_path)
+
+    def signature(self, text: str) -> List[int]:
+        """Firma MinHash del texto normalizado (shingles de palabras)"""
+        words = normalize_text(text).split()
+        if len(words) < self.shingle_size:
+            shingles = {' '.join(words)}
+        else:
+            shingles = {' '.join(words[i:i + self.shingle_size])
+                        for i in range(len(words) - self.shingle_size + 1)}
+
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little') for s in shingles],
+            dtype=np.uint64
+        )
+
+        # h_i(x) = (a_i * x + b_i) mod p, vectorizado para todas las permutaciones
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % MERSENNE_PRIME
+        return permuted.min(axis=1).astype(np.int64).tolist()
+
+    def _bands(self, signature: List[int], course: str) -> List[str]:
+        return [
+            f"{course}|{band}|" + ','.join(str(v) for v in signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    @staticmethod
+    def estimate_similarity(sig_a: List[int], sig_b: List[int]) -> float:
+        """Similitud de Jaccard estimada entre dos firmas"""
+        matches = sum(1 for a, b in zip(sig_a, sig_b) if a == b)
+        return matches / len(sig_a) if sig_a else 0.0
+
+    def find_similar(self, text: str, course: str, threshold: float = 0.8,
+                     exclude_key: str = None) -> List[Dict]:
+        """
+        Busca entregas casi idénticas del mismo curso
+
+        Args:
+            text: Texto extraído de la nueva entrega
+            course: Nombre del curso
+            threshold: Similitud mínima de Jaccard estimada
+            exclude_key: Llave a excluir (la misma entrega)
+
+        Returns:
+            Lista de entradas similares ordenadas por similitud (con 'key' y 'similarity')
+        """
+        signature = self.signature(text)
+
+        candidates = set()
+        for bucket in self._bands(signature, course):
+            candidates.update(self.buckets.get(bucket, ()))
+        candidates.discard(exclude_key)
+
+        similar = []
+        for key in candidates:
+            entry = self.entries[key]
+            similarity = self.estimate_similarity(signature, entry['signature'])
+            if similarity >= threshold:
+                similar.append({
+                    'key': key,
+                    'similarity': round(similarity, 3),
+                    **{k: v for k, v in entry.items() if k != 'signature'}
+                })
+
+        return sorted(similar, key=lambda item: item['similarity'], reverse=True)
+
+    def add(self, key: str, text: str, course: str, **metadata):
+        """
+        Agrega (o reemplaza) una entrega evaluada en el índice
+
+        Args:
+            key: Llave de la entrega (huella del cache de evaluaciones)
+            text: Texto extraído
+            course: Nombre del curso
+            **metadata: Datos adicionales (file_name, context, evaluated_at, ...)
+        """
+        signature = self.signature(text)
+        self.entries[key] = {'course': course, 'signature': signature, **metadata}
+        for bucket in self._bands(signature, course):
+            self.buckets[bucket].add(key)
+        self._save()
@@ -0,0 +1,60 @@
+"""
+Historial de Entregas por Estudiante
+Enlaza cada reentrega con la versión anterior del mismo estudiante en el mismo curso
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class SubmissionHistory:
+    """Registra las versiones evaluadas de cada estudiante por curso"""
+
+    def __init__(self, history_path: str = None):
+        """
+        Inicializa el historial
+
+        Args:
+            history_path: Archivo JSON del historial (por defecto data/historial/entregas.json)
+        """
+        self.history_path = Path(history_path or os.getenv('SUBMISSION_HISTORY_PATH', 'data/historial/entregas.json'))
+
+    @staticmethod
+    def _student_key(student: str, course: str) -> str:
+        return f"{course}|{' '.join(student.lower().split())}"
+
+    def _load(self) -> Dict:
+        if not self.history_path.exists():
+            return {}
+        try:
+            with open(self.history_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"  [HISTORIAL] Historial ilegible: {e}")
+            return {}
+
+    def latest(self, student: str, course: str) -> Optional[Dict]:
+        """
+        Obtiene la última versión evaluada del estudiante en el curso
+
+        Returns:
+            Dict con 'key' (llave del cache de evaluaciones), 'file_name' y 'evaluated_at', o None
+        """
+        versions = self._load().get(self._student_key(student, course), [])
+        return versions[-1] if versions else None
+
+    def record(self, student: str, course: str, key: str, file_name: str, evaluated_at: str):
+        """Registra una nueva versión evaluada del estudiante"""
+        history = self._load()
+        versions = history.setdefault(self._student_key(student, course), [])
+
+        versions = [v for v in versions if v['key'] != key]
+        versions.append({'key': key, 'file_name': file_name, 'evaluated_at': evaluated_at})
+        history[self._student_key(student, course)] = versions
+
+        self.history_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.history_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(history, f, ensure_ascii=False)
+        os.replace(tmp_path, self.history_path)
@@ -0,0 +1,101 @@
+"""
+Tests del Descarte de Criterios Ausentes por la Búsqueda Vectorial
+Un criterio descartado recibe 0 puntos (no_presentado) sin consultar a GPT: se prueba con
+la rúbrica y condiciones reales de Fase 3, el almacén local y embeddings falsos (sin API)
+"""
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Agregar path del proyecto
+sys.path.insert(0, str(Path(__file__).parent))
+
+from test_local_vector_store import COURSES_DIR, DIMENSIONS, FakeEmbeddings
+from vector_store.local_vector_store import LocalVectorStore
+
+FASE3_DIR = COURSES_DIR / 'machine_learning_fase3'
+
+# Entrega con el trabajo de DBSCAN (criterio 2) sin encabezados "Ejercicio N"; más larga que
+# lexical_only_max_chars para que la búsqueda calcule la similitud vectorial
+DBSCAN_DOCUMENT = """
+Seleccioné tres variables numéricas relevantes: ingreso anual, puntaje de gasto y edad.
+Para determinar el valor de épsilon apropiado para el algoritmo DBSCAN usé la gráfica de
+distancias al k-ésimo vecino y elegí eps = 0.5. El valor de min_samples apropiado es 5,
+el doble de las dimensiones más uno.
+
+dbscan = DBSCAN(eps=0.5, min_samples=5).fit(X_scaled)
+
+El modelo identifica 3 clústeres adecuados y 12 puntos de ruido (etiqueta -1), que
+corresponden a clientes atípicos con ingresos muy altos. Los puntos de ruido no se
+asignan a ningún grupo y se analizan por separado antes de describir los resultados.
+"""
+
+
+@pytest.fixture
+def fase3():
+    with open(FASE3_DIR / 'rubrica_estructurada.json', 'r', encoding='utf-8') as f:
+        rubric_data = json.load(f)
+    with open(FASE3_DIR / 'condiciones.json', 'r', encoding='utf-8') as f:
+        condiciones = json.load(f)
+    return rubric_data, condiciones
+
+
+@pytest.fixture
+def generator(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'sk-test')
+    from feedback.gpt_feedback import GPTFeedbackGenerator
+    return GPTFeedbackGenerator()
+
+
+@pytest.fixture
+def relevant_sections(tmp_path, monkeypatch, fase3):
+    """Resultados reales de search_relevant_criteria sobre la rúbrica de Fase 3"""
+    monkeypatch.setenv('EMBEDDING_CACHE_DIR', str(tmp_path / 'embeddings'))
+    rubric_data, _ = fase3
+    store = LocalVectorStore(str(tmp_path / 'store'), embedding_client=SimpleNamespace(embeddings=FakeEmbeddings()),
+                             dimensions=DIMENSIONS)
+    store.load_all_rubrics(str(COURSES_DIR))
+    sections = store.search_relevant_criteria(DBSCAN_DOCUMENT, rubric_data['nombre_curso'],
+                                              top_k=len(rubric_data['criterios_evaluacion']))
+    assert {section['criterion_number'] for section in sections} == {1, 2, 3, 4, 5}
+    return sections
+
+
+def with_vector_scores(sections, scores):
+    return [{**section, 'vector_score': scores.get(section['criterion_number'], section['vector_score'])}
+            for section in sections]
+
+
+def test_criterion_with_task_evidence_is_never_pruned(generator, fase3, relevant_sections):
+    rubric_data, condiciones = fase3
+    criteria = rubric_data['criterios_evaluacion']
+    generator.absent_relevance_threshold = 0.2
+
+    # Similitud mínima para DBSCAN (2) y Agglomerative (3); K-Means (1) supera el umbral
+    sections = with_vector_scores(relevant_sections, {1: 0.6, 2: 0.0, 3: 0.0})
+    absent = generator._absent_by_retrieval(
+        criteria, sections, DBSCAN_DOCUMENT, generator._detect_exercises_in_document(DBSCAN_DOCUMENT), condiciones
+    )
+
+    assert 2 not in absent  # Sus tareas (épsilon, min_samples, ruido) están en el documento
+    assert 3 in absent      # Sin similitud ni tareas con evidencia: se descarta sin GPT
+    assert not {4, 5} & set(absent)  # Los criterios con evaluador local nunca se descartan
+
+
+def test_nothing_is_pruned_when_no_criterion_clears_the_threshold(generator, fase3, relevant_sections):
+    rubric_data, condiciones = fase3
+    generator.absent_relevance_threshold = max(section['vector_score'] for section in relevant_sections) + 0.01
+
+    absent = generator._absent_by_retrieval(
+        rubric_data['criterios_evaluacion'], relevant_sections, DBSCAN_DOCUMENT, [], condiciones
+    )
+    assert absent == {}
+
+    # Resultados solo léxicos (sin similitud vectorial) tampoco descartan nada
+    generator.absent_relevance_threshold = 0.2
+    lexical_only = with_vector_scores(relevant_sections, {n: None for n in range(1, 6)})
+    assert generator._absent_by_retrieval(rubric_data['criterios_evaluacion'], lexical_only, DBSCAN_DOCUMENT, [],
+                                          condiciones) == {}
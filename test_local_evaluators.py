@@ -0,0 +1,78 @@
+"""
+Tests de los Evaluadores Locales
+Criterios estructurales (foro, formato de entrega) calificados sin GPT
+"""
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Agregar path del proyecto
+sys.path.insert(0, str(Path(__file__).parent))
+
+from feedback.local_evaluators import evaluate_forum_participation
+
+SCREENSHOT_ASPECT = "Captura (screenshot) del feedback realizado"
+PNG_PIXEL = 'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=='
+
+NOTEBOOK_TEXT = """
+--- Markdown 1 ---
+# Ejercicio 1: K-Means
+--- Código 2 ---
+plt.scatter(df['ingreso'], df['gasto'], c=labels)
+Output: <Figure size 640x480 with 1 Axes>
+"""
+
+
+def screenshot_check(document_content, metadata):
+    checks = evaluate_forum_participation(document_content, metadata, {})
+    return next(check for check in checks if check['aspecto'] == SCREENSHOT_ASPECT)
+
+
+def test_plot_output_is_not_a_screenshot():
+    # Notebook de clustering con gráficos y sin mención del foro ni de capturas
+    metadata = {'file_type': 'ipynb', 'images': 3, 'attachments': 0}
+    assert not screenshot_check(NOTEBOOK_TEXT, metadata)['cumple']
+
+
+def test_markdown_attachment_or_text_counts_as_screenshot():
+    assert screenshot_check(NOTEBOOK_TEXT, {'images': 3, 'attachments': 1})['cumple']
+    assert screenshot_check(NOTEBOOK_TEXT + "\nAdjunto la captura del foro", {'images': 0})['cumple']
+
+
+def test_notebook_processor_counts_plots_and_attachments_separately(tmp_path):
+    pytest.importorskip('nbformat')
+    pytest.importorskip('nbconvert')
+    from processors.notebook_processor import NotebookProcessor
+
+    def notebook(markdown_cell):
+        return {
+            'nbformat': 4, 'nbformat_minor': 5, 'metadata': {},
+            'cells': [
+                markdown_cell,
+                {'cell_type': 'code', 'id': 'c2', 'metadata': {}, 'execution_count': 1,
+                 'source': "plt.scatter(df['ingreso'], df['gasto'], c=labels)",
+                 'outputs': [{'output_type': 'display_data', 'metadata': {},
+                              'data': {'image/png': PNG_PIXEL, 'text/plain': '<Figure size 640x480 with 1 Axes>'}}]},
+            ]
+        }
+
+    plot_only = tmp_path / 'plot_only.ipynb'
+    plot_only.write_text(json.dumps(notebook(
+        {'cell_type': 'markdown', 'id': 'm1', 'metadata': {}, 'source': '# Ejercicio 1: K-Means'}
+    )), encoding='utf-8')
+    with_attachment = tmp_path / 'with_attachment.ipynb'
+    with_attachment.write_text(json.dumps(notebook(
+        {'cell_type': 'markdown', 'id': 'm1', 'metadata': {}, 'source': '![feedback](attachment:feedback.png)',
+         'attachments': {'feedback.png': {'image/png': PNG_PIXEL}}}
+    )), encoding='utf-8')
+
+    processor = NotebookProcessor()
+    result = processor.extract_content(str(plot_only))
+    assert (result['images'], result['attachments']) == (1, 0)
+    assert not screenshot_check(result['full_text'], result)['cumple']
+
+    result = processor.extract_content(str(with_attachment))
+    assert (result['images'], result['attachments']) == (1, 1)
+    assert screenshot_check(result['full_text'], result)['cumple']
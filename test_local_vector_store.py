@@ -0,0 +1,190 @@
+"""
+Tests del Almacén Vectorial Local y del Cache de Embeddings
+Usan un cliente de embeddings falso (sin API): cada texto se convierte en una suma de
+vectores aleatorios fijos por palabra, así textos parecidos dan vectores parecidos
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+# Agregar path del proyecto
+sys.path.insert(0, str(Path(__file__).parent))
+
+from feedback.course_router import tokenize
+from storage.embedding_cache import EmbeddingCache
+from vector_store.local_vector_store import LocalVectorStore
+
+COURSES_DIR = Path(__file__).parent / 'courses'
+DIMENSIONS = 256
+
+
+class FakeEmbeddings:
+    """Imita client.embeddings.create y cuenta los textos enviados"""
+
+    def __init__(self):
+        self.texts_sent = 0
+
+    @staticmethod
+    def _word_vector(word: str) -> np.ndarray:
+        seed = int(hashlib.md5(word.encode('utf-8')).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).standard_normal(3072)
+
+    def create(self, model, input, dimensions=None):
+        texts = [input] if isinstance(input, str) else input
+        self.texts_sent += len(texts)
+        data = []
+        for i, text in enumerate(texts):
+            vector = sum((self._word_vector(word) for word in tokenize(text)), np.zeros(3072))
+            data.append(SimpleNamespace(index=i, embedding=vector[:dimensions or 3072].tolist()))
+        return SimpleNamespace(data=data)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv('EMBEDDING_CACHE_DIR', str(tmp_path / 'embeddings'))
+    return SimpleNamespace(embeddings=FakeEmbeddings())
+
+
+@pytest.fixture
+def courses_dir(tmp_path):
+    """Copia de las rúbricas (JSON y condiciones) para poder quitar cursos"""
+    target = tmp_path / 'courses'
+    for course in COURSES_DIR.iterdir():
+        if (course / 'rubrica_estructurada.json').exists():
+            (target / course.name).mkdir(parents=True)
+            for name in ('rubrica_estructurada.json', 'condiciones.json'):
+                if (course / name).exists():
+                    shutil.copy(course / name, target / course.name / name)
+    return target
+
+
+def make_store(tmp_path, client, **kwargs):
+    return LocalVectorStore(str(tmp_path / 'store'), embedding_client=client, dimensions=DIMENSIONS, **kwargs)
+
+
+def test_reload_without_changes_is_noop(tmp_path, client, courses_dir):
+    store = make_store(tmp_path, client)
+    first = store.load_all_rubrics(str(courses_dir))
+    assert first['indexed'] > 0 and not first['failed']
+
+    texts_sent = client.embeddings.texts_sent
+    vectors_mtime = store.vectors_path.stat().st_mtime_ns
+
+    # Otro proceso (nuevo almacén sobre el mismo directorio) tampoco reindexa
+    for reloaded in (store, make_store(tmp_path, client)):
+        second = reloaded.load_all_rubrics(str(courses_dir))
+        assert (second['indexed'], second['deleted'], second['unchanged']) == (0, 0, first['indexed'])
+
+    assert client.embeddings.texts_sent == texts_sent
+    assert store.vectors_path.stat().st_mtime_ns == vectors_mtime
+
+
+def test_removed_course_is_deleted(tmp_path, client, courses_dir):
+    store = make_store(tmp_path, client)
+    store.load_all_rubrics(str(courses_dir))
+    before = store.get_index_stats()['courses']
+
+    with open(courses_dir / 'machine_learning_fase3' / 'rubrica_estructurada.json', 'r', encoding='utf-8') as f:
+        removed_course = json.load(f)['nombre_curso']
+    shutil.rmtree(courses_dir / 'machine_learning_fase3')
+
+    result = store.load_all_rubrics(str(courses_dir))
+    after = store.get_index_stats()['courses']
+
+    assert result['deleted'] == before[removed_course]
+    assert result['indexed'] == 0
+    assert removed_course not in after
+    assert after == {course: count for course, count in before.items() if course != removed_course}
+    assert store.search_relevant_criteria('K-Means DBSCAN clustering', removed_course) == []
+
+
+def test_vectors_and_metadata_stay_aligned(tmp_path, client):
+    store = make_store(tmp_path, client)
+    rng = np.random.default_rng(0)
+
+    def vector(i):
+        return {'id': f'v{i}', 'values': rng.standard_normal(DIMENSIONS).tolist(),
+                'metadata': {'course': 'Curso', 'criterion_number': i}}
+
+    store._upsert([vector(i) for i in range(10)])
+    store._delete(['v2', 'v7'])
+    store._upsert([vector(3), vector(10)])  # Reemplazo de un id existente + uno nuevo
+
+    matrix = np.load(store.vectors_path, mmap_mode='r')
+    with open(store.metadata_path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+
+    assert matrix.shape == (len(entries), DIMENSIONS)
+    assert [entry['id'] for entry in entries] == ['v0', 'v1', 'v3', 'v4', 'v5', 'v6', 'v8', 'v9', 'v10']
+    assert np.allclose(np.linalg.norm(matrix, axis=1), 1.0, atol=1e-5)
+    assert not list(store.store_dir.glob('*.tmp*'))
+
+    # Cada fila responde a su propio vector con similitud 1
+    for row, entry in enumerate(entries):
+        best_metadata, score = store._query(matrix[row].tolist(), 1, 'Curso')[0]
+        assert best_metadata == entry['metadata'] and score == pytest.approx(1.0, abs=1e-5)
+
+    # Metadatos que no corresponden a la matriz: el índice se abre vacío en lugar de desalinearse
+    with open(store.metadata_path, 'w', encoding='utf-8') as f:
+        json.dump(entries[:-1], f)
+    reopened = make_store(tmp_path, client)
+    assert reopened.vectors is None and reopened.entries == []
+
+
+def test_int8_rescoring_matches_float32_order(tmp_path, client):
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((300, DIMENSIONS)).astype(np.float32)
+    exact = make_store(tmp_path, client, quantization='none')
+    exact._upsert([{'id': str(i), 'values': vector.tolist(), 'metadata': {'course': 'Curso', 'criterion_number': i}}
+                   for i, vector in enumerate(vectors)])
+
+    quantized = make_store(tmp_path, client, quantization='int8', rescore=True)
+    quantized.query_block_rows = 64  # Varios bloques int8 -> float32
+    assert quantized.codes.dtype == np.int8 and quantized.codes.shape == vectors.shape
+
+    queries = (vectors[:20] + 0.3 * rng.standard_normal((20, DIMENSIONS))).astype(np.float32)
+    for expected, got in zip(exact._query_many(queries, 5, 'Curso'), quantized._query_many(queries, 5, 'Curso')):
+        assert [metadata['criterion_number'] for metadata, _ in got] == \
+               [metadata['criterion_number'] for metadata, _ in expected]
+        # Los puntajes reordenados son los exactos en float32
+        assert [score for _, score in got] == pytest.approx([score for _, score in expected], abs=1e-5)
+
+    stats = quantized.get_index_stats()
+    assert stats['search_bytes'] < exact.get_index_stats()['search_bytes']
+
+
+def test_embedding_cache_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / 'cache'), max_mb=0.01)  # ~10 KB: 9 vectores de 512 float16
+    texts = [f'texto {i}' for i in range(10)]
+
+    for i, text in enumerate(texts[:9]):
+        cache.put('modelo', 512, text, np.full(512, i, dtype=np.float32).tolist())
+        os.utime(cache._path(cache.key('modelo', 512, text)), (1000 + i, 1000 + i))  # Orden de uso determinista
+    assert all(cache.get('modelo', 512, text) is not None for text in texts[1:9])
+    for i, text in enumerate(texts[1:9], 1):
+        os.utime(cache._path(cache.key('modelo', 512, text)), (1000 + i, 1000 + i))
+
+    # Leer el primero lo marca como usado recientemente; el décimo excede el máximo
+    assert cache.get('modelo', 512, texts[0]) == [0.0] * 512
+    cache.put('modelo', 512, texts[9], np.full(512, 9, dtype=np.float32).tolist())
+
+    stored_bytes = sum(path.stat().st_size for path in cache.cache_dir.glob('*/*.npy'))
+    assert stored_bytes <= cache.max_bytes * 0.9
+    assert cache.stats()['size_mb'] == round(stored_bytes / 1024 / 1024, 2)
+
+    # Se desalojan los de uso más antiguo (1 y 2), no el releído ni el recién guardado
+    assert cache.get('modelo', 512, texts[1]) is None
+    assert cache.get('modelo', 512, texts[2]) is None
+    assert cache.get('modelo', 512, texts[0]) == [0.0] * 512
+    assert cache.get('modelo', 512, texts[9]) == [9.0] * 512
+    assert cache.get('modelo', 512, texts[3]) == [3.0] * 512
+    # Otra dimensión u otro modelo son llaves distintas
+    assert cache.get('modelo', 256, texts[9]) is None
+    assert cache.get('otro', 512, texts[9]) is None
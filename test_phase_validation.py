@@ -4,6 +4,7 @@ Verifica que el PhaseValidator detecta correctamente documentos de fases incorre
 """
 import json
 from feedback.phase_validator import PhaseValidator
+from feedback.course_router import CourseRouter
 
 # Cargar rúbrica de Fase 3 (Clustering)
 with open('courses/machine_learning_fase3/rubrica_estructurada.json', 'r', encoding='utf-8') as f:
@@ -177,5 +178,29 @@ def test_validation():
     else:
         print("\n[WARNING] ALGUNOS TESTS FALLARON - Revisar configuracion del validador")
 
+def test_local_routing():
+    """Prueba el enrutamiento local de curso (sin llamadas a GPT)"""
+    router = CourseRouter.from_courses_dir('courses')
+
+    print("=" * 80)
+    print("TEST 3: Enrutamiento local por centroides TF-IDF")
+    print("=" * 80)
+
+    result_fase2 = router.route(documento_fase2)
+    result_fase3 = router.route(documento_fase3)
+
+    print(f"\n  Documento Fase 2 -> {result_fase2['best_course']} (margen: {result_fase2['margin']})")
+    print(f"  Documento Fase 3 -> {result_fase3['best_course']} (margen: {result_fase3['margin']})")
+
+    # El margen debe bastar para que PhaseValidator acepte el curso sin consultar GPT
+    accept_margin = PhaseValidator.accept_margin
+    assert result_fase2['best_course'] == 'Machine Learning - Fase 2'
+    assert result_fase3['best_course'] == rubric_fase3['nombre_curso']
+    assert result_fase2['margin'] >= accept_margin
+    assert result_fase3['margin'] >= accept_margin
+
+    print(f"\n[OK] TEST 3 (Enrutamiento local): [PASS]")
+
 if __name__ == "__main__":
+    test_local_routing()
     test_validation()
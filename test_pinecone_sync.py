@@ -0,0 +1,112 @@
+"""
+Tests de la Sincronización con Pinecone
+El manifiesto de lo indexado se lee del propio índice (content_hash en los metadatos):
+sin data/ (redespliegue) o con el índice recreado la sincronización sigue siendo correcta.
+Usan un índice en memoria en lugar del servicio de Pinecone
+"""
+import shutil
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Agregar path del proyecto
+sys.path.insert(0, str(Path(__file__).parent))
+
+pytest.importorskip('pinecone')
+
+from test_local_vector_store import COURSES_DIR, DIMENSIONS, FakeEmbeddings
+from vector_store import pinecone_manager
+
+
+class FakeIndex:
+    """Subconjunto de pinecone.Index usado por PineconeManager (un solo namespace)"""
+
+    def __init__(self):
+        self.vectors = {}
+        self.upserted = 0
+
+    def list(self, namespace):
+        ids = sorted(self.vectors)
+        for start in range(0, len(ids), 7):  # Paginado como el SDK
+            yield ids[start:start + 7]
+
+    def fetch(self, ids, namespace):
+        return SimpleNamespace(vectors={
+            vector_id: SimpleNamespace(metadata=self.vectors[vector_id]['metadata'])
+            for vector_id in ids if vector_id in self.vectors
+        })
+
+    def upsert(self, vectors, namespace):
+        self.upserted += len(vectors)
+        for vector in vectors:
+            self.vectors[vector['id']] = vector
+
+    def delete(self, ids, namespace):
+        for vector_id in ids:
+            self.vectors.pop(vector_id, None)
+
+
+class FakePinecone:
+    index = None
+
+    def __init__(self, api_key=None):
+        pass
+
+    def list_indexes(self):
+        return [SimpleNamespace(name='rubricamachine', dimension=DIMENSIONS)]
+
+    def Index(self, name):
+        return FakePinecone.index
+
+
+@pytest.fixture
+def manager_factory(tmp_path, monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'sk-test')
+    monkeypatch.setenv('EMBEDDING_DIMENSIONS', str(DIMENSIONS))
+    monkeypatch.setenv('EMBEDDING_CACHE_DIR', str(tmp_path / 'embeddings'))
+    monkeypatch.setenv('VECTOR_MANIFEST_DIR', str(tmp_path / 'manifest'))
+    monkeypatch.setattr(pinecone_manager, 'Pinecone', FakePinecone)
+    FakePinecone.index = FakeIndex()
+    embeddings = FakeEmbeddings()
+
+    def make():
+        manager = pinecone_manager.PineconeManager()
+        manager.openai_client = SimpleNamespace(embeddings=embeddings)
+        return manager
+    return make, embeddings
+
+
+def test_sync_reads_the_index_when_local_manifest_is_lost(tmp_path, manager_factory):
+    make, embeddings = manager_factory
+    courses_dir = tmp_path / 'courses'
+    shutil.copytree(COURSES_DIR, courses_dir)
+
+    first = make().load_all_rubrics(str(courses_dir))
+    assert first['indexed'] > 0
+
+    # Redespliegue: sin data/ ni cache de embeddings; nada cambió en las rúbricas
+    shutil.rmtree(tmp_path / 'manifest')
+    shutil.rmtree(tmp_path / 'embeddings')
+    texts_sent = embeddings.texts_sent
+    second = make().load_all_rubrics(str(courses_dir))
+    assert (second['indexed'], second['deleted']) == (0, 0)
+    assert embeddings.texts_sent == texts_sent
+
+    # Un curso quitado se borra del índice aunque el manifiesto local no lo conozca
+    shutil.rmtree(tmp_path / 'manifest', ignore_errors=True)
+    shutil.rmtree(courses_dir / 'machine_learning_fase3')
+    third = make().load_all_rubrics(str(courses_dir))
+    assert third['deleted'] == 5
+    assert not any(v['metadata']['course'] == 'Machine Learning - Fase 3' for v in FakePinecone.index.vectors.values())
+
+
+def test_sync_reindexes_a_recreated_index_despite_local_manifest(tmp_path, manager_factory):
+    make, _ = manager_factory
+    first = make().load_all_rubrics()
+
+    FakePinecone.index.vectors.clear()  # Índice recreado; el manifiesto local sigue en disco
+    second = make().load_all_rubrics()
+    assert second['indexed'] == first['indexed']
+    assert len(FakePinecone.index.vectors) == first['indexed']
@@ -1 +1,22 @@
-# Inicializa el paquete vector_store
\ No newline at end of file
+# Inicializa el paquete vector_store
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def create_vector_store():
+    """
+    Almacén de rúbricas según VECTOR_STORE ('pinecone' o 'local');
+    sin la variable se usa Pinecone si hay PINECONE_API_KEY y, si no, el almacén local
+    """
+    backend = os.getenv('VECTOR_STORE') or ('pinecone' if os.getenv('PINECONE_API_KEY') else 'local')
+
+    # Importación diferida: el almacén local no requiere el paquete de Pinecone
+    if backend == 'local':
+        from vector_store.local_vector_store import LocalVectorStore
+        return LocalVectorStore()
+
+    from vector_store.pinecone_manager import PineconeManager
+    return PineconeManager()
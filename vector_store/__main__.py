@@ -0,0 +1,27 @@
+"""
+Reindexación de rúbricas (para ejecutar en cada despliegue)
+
+    python -m vector_store [--pdf] [--courses-dir courses]
+
+Descubre todos los cursos, los prepara en paralelo y sincroniza el índice configurado
+(VECTOR_STORE): solo se embeben y suben los criterios nuevos o modificados, por lo que
+sin cambios en las rúbricas no se llama a ninguna API.
+"""
+import argparse
+import sys
+
+from vector_store import create_vector_store
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Sincroniza las rúbricas de courses/ con el índice vectorial")
+    parser.add_argument('--courses-dir', default='courses', help="Directorio con las carpetas de cursos")
+    parser.add_argument('--pdf', action='store_true', help="Extraer las rúbricas desde los PDFs en vez de los JSON")
+    args = parser.parse_args()
+
+    result = create_vector_store().load_all_rubrics(args.courses_dir, use_pdf=args.pdf)
+    return 1 if result['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+Índice Léxico BM25 de Criterios
+Índice en memoria sobre el texto de cada criterio (o sección) de un curso junto con sus
+tareas de condiciones.json. Complementa la búsqueda vectorial con los términos técnicos
+que los embeddings diluyen (DBSCAN, eps, min_samples, silhouette...).
+"""
+import math
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+from feedback.course_router import tokenize
+
+
+class LexicalIndex:
+    """BM25 (Okapi) sobre los documentos {'key', 'text', 'metadata'} de un curso"""
+
+    def __init__(self, documents: List[Dict], k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            documents: Un documento por criterio o sección ({'key', 'text', 'metadata'})
+            k1: Saturación de la frecuencia de término
+            b: Normalización por longitud del documento
+        """
+        self.documents = documents
+        self.k1 = k1
+
+        # Listas invertidas: término -> [(documento, frecuencia)]
+        self.postings = defaultdict(list)
+        lengths = []
+        for i, document in enumerate(documents):
+            counts = Counter(tokenize(document['text']))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings[term].append((i, tf))
+
+        total = len(documents)
+        average_length = (sum(lengths) / total) if total else 0
+        self.idf = {
+            term: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+        self.length_norms = [k1 * (1 - b + b * length / average_length) if average_length else k1 for length in lengths]
+
+    def score(self, text: str) -> List[float]:
+        """Puntaje BM25 de cada documento para el texto (cada término de la consulta cuenta una vez)"""
+        scores = [0.0] * len(self.documents)
+        for term in set(tokenize(text)):
+            for i, tf in self.postings.get(term, ()):
+                scores[i] += self.idf[term] * tf * (self.k1 + 1) / (tf + self.length_norms[i])
+        return scores
+
+    def search(self, text: str, min_score: float = 0.0) -> Dict:
+        """
+        Puntajes normalizados por el mejor documento
+
+        Args:
+            text: Texto de la consulta
+            min_score: Puntaje BM25 mínimo de referencia para normalizar: si el mejor documento
+                no lo alcanza, se divide por este valor (una sola palabra compartida no vale 1.0)
+
+        Returns:
+            {llave: {'metadata', 'score', 'raw'}} con score en [0, 1] (0 = sin términos en común)
+            y raw el puntaje BM25 sin normalizar
+        """
+        scores = self.score(text)
+        reference = max(max(scores, default=0.0), min_score)
+        return {
+            document['key']: {'metadata': document['metadata'], 'score': (score / reference) if reference else 0.0, 'raw': score}
+            for document, score in zip(self.documents, scores)
+        }
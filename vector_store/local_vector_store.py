@@ -0,0 +1,227 @@
+"""
+Almacén Vectorial Local (memoria mapeada)
+Reemplazo directo de PineconeManager para el corpus de rúbricas (decenas de vectores):
+la matriz de vectores normalizados vive en un .npy abierto con memmap y los metadatos
+en un archivo JSON paralelo. Las consultas son un producto matricial filtrado por curso,
+sin red ni servicio externo.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+
+from vector_store.rubric_store import RubricVectorStore
+
+
+class LocalVectorStore(RubricVectorStore):
+    """Índice de rúbricas en disco con búsqueda coseno vectorizada"""
+
+    def __init__(self, store_dir: str = None, embedding_client=None, dimensions: int = None,
+                 quantization: str = None, rescore: bool = True):
+        """
+        Args:
+            store_dir: Directorio del índice (por defecto data/vector_store)
+            embedding_client: Cliente de embeddings (opcional, ver RubricVectorStore)
+            dimensions: Dimensión de los embeddings (opcional, ver RubricVectorStore)
+            quantization: 'none' o 'int8' (por defecto LOCAL_VECTOR_QUANTIZATION o 'none').
+                Con 'int8' la búsqueda recorre una copia cuantizada en memoria (4x más pequeña)
+                y solo lee del .npy en float32 las filas candidatas
+            rescore: Reordenar los candidatos int8 con los vectores en float32
+        """
+        super().__init__(embedding_client, dimensions)
+        self.store_dir = Path(store_dir or os.getenv('LOCAL_VECTOR_STORE_DIR', 'data/vector_store'))
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+
+        self.quantization = (quantization or os.getenv('LOCAL_VECTOR_QUANTIZATION', 'none')).lower()
+        self.rescore = rescore
+        self.rescore_factor = 4  # Candidatos int8 por resultado pedido antes de reordenar
+        self.query_block_rows = 256  # Filas int8 convertidas a float32 a la vez durante la búsqueda
+        self.codes = None   # Matriz int8 (una fila por vector)
+        self.scales = None  # Escala float32 de cada fila: vector ≈ codes * scale
+
+        # Un par de archivos por namespace: vectores (.npy) + metadatos (.json)
+        self.vectors_path = self.store_dir / f"{self.namespace}.npy"
+        self.metadata_path = self.store_dir / f"{self.namespace}.json"
+
+        self.entries = self._load_entries()
+        self.vectors = self._open_vectors()
+
+    def _load_entries(self) -> List[Dict]:
+        """Metadatos por fila de la matriz: [{'id', 'metadata'}]"""
+        if not self.metadata_path.exists():
+            return []
+        try:
+            with open(self.metadata_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"  [LOCAL-VS] Metadatos ilegibles, el índice se reconstruirá: {e}")
+            return []
+
+    def _open_vectors(self):
+        """Matriz de vectores en modo solo lectura (None si el índice está vacío o no coincide)"""
+        if not self.entries or not self.vectors_path.exists():
+            return None
+
+        vectors = np.load(self.vectors_path, mmap_mode='r')
+        if vectors.shape != (len(self.entries), self.embedding_dimension):
+            print(f"  [LOCAL-VS] Matriz {vectors.shape} no coincide con {len(self.entries)} metadatos: índice vacío")
+            self.entries = []
+            return None
+
+        if self.quantization == 'int8':
+            self._quantize(vectors)
+        return vectors
+
+    def _quantize(self, vectors, block_rows: int = 4096):
+        """Cuantización escalar simétrica por fila a int8 (recorre el memmap por bloques)"""
+        self.codes = np.empty(vectors.shape, dtype=np.int8)
+        self.scales = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), block_rows):
+            block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+            scales = np.abs(block).max(axis=1) / 127
+            scales[scales == 0] = 1.0
+            self.codes[start:start + len(block)] = np.round(block / scales[:, None]).astype(np.int8)
+            self.scales[start:start + len(block)] = scales
+
+    def _upsert(self, vectors: List[Dict]):
+        """Inserta o reemplaza vectores por id y reescribe la matriz y los metadatos de forma atómica"""
+        rows = {entry['id']: i for i, entry in enumerate(self.entries)}
+        entries = list(self.entries)
+        new_vectors = []
+
+        for vector in vectors:
+            if vector['id'] in rows:
+                entries[rows[vector['id']]] = {'id': vector['id'], 'metadata': vector['metadata']}
+            else:
+                rows[vector['id']] = len(entries)
+                entries.append({'id': vector['id'], 'metadata': vector['metadata']})
+            new_vectors.append((rows[vector['id']], vector['values']))
+
+        self._write(entries, list(range(len(self.entries))), new_vectors)
+
+    def _delete(self, ids: List[str]):
+        """Elimina vectores por id reescribiendo la matriz sin sus filas"""
+        ids = set(ids)
+        keep = [i for i, entry in enumerate(self.entries) if entry['id'] not in ids]
+        self._write([self.entries[i] for i in keep], keep, [])
+
+    def _write(self, entries: List[Dict], kept_rows: List[int], new_vectors: List[Tuple[int, List[float]]]):
+        """
+        Escribe la matriz y los metadatos en archivos temporales y los reemplaza de forma atómica
+
+        Args:
+            entries: Metadatos de la nueva matriz (una entrada por fila)
+            kept_rows: Filas de la matriz actual que ocupan las primeras posiciones de la nueva
+            new_vectors: (fila, vector) a escribir después de copiar las filas conservadas
+        """
+        if not entries:
+            self.vectors = self.codes = self.scales = None
+            self.entries = []
+            for path in (self.vectors_path, self.metadata_path):
+                path.unlink(missing_ok=True)
+            return
+
+        tmp_vectors = self.vectors_path.with_suffix('.tmp.npy')
+        matrix = np.lib.format.open_memmap(
+            tmp_vectors, mode='w+', dtype=np.float32, shape=(len(entries), self.embedding_dimension)
+        )
+        if self.vectors is not None and kept_rows:
+            matrix[:len(kept_rows)] = self.vectors[kept_rows]
+
+        # Vectores normalizados: la similitud coseno es un producto punto
+        for row, values in new_vectors:
+            values = np.asarray(values, dtype=np.float32)
+            norm = np.linalg.norm(values)
+            matrix[row] = values / norm if norm else values
+        matrix.flush()
+        del matrix
+
+        tmp_metadata = self.metadata_path.with_suffix('.tmp')
+        with open(tmp_metadata, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False)
+
+        self.vectors = None  # Liberar el memmap anterior antes de reemplazar el archivo
+        os.replace(tmp_vectors, self.vectors_path)
+        os.replace(tmp_metadata, self.metadata_path)
+
+        self.entries = entries
+        self.vectors = self._open_vectors()
+
+    def _manifest_path(self) -> Path:
+        """El manifiesto vive junto a la matriz del índice"""
+        return self.store_dir / f"{self.namespace}.manifest.json"
+
+    def _indexed_ids(self) -> Set[str]:
+        return {entry['id'] for entry in self.entries}
+
+    def _query(self, vector: List[float], top_k: int, course_name: str) -> List[Tuple[Dict, float]]:
+        """Similitud coseno contra los vectores del curso"""
+        return self._query_many([vector], top_k, course_name)[0]
+
+    def _query_many(self, vectors: List[List[float]], top_k: int, course_name: str) -> List[List[Tuple[Dict, float]]]:
+        """Similitud coseno de varios vectores de consulta en un solo producto matricial"""
+        rows = np.array([i for i, entry in enumerate(self.entries) if entry['metadata'].get('course') == course_name])
+        if self.vectors is None or not len(rows):
+            return [[] for _ in vectors]
+
+        queries = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = np.divide(queries, norms, out=np.zeros_like(queries), where=norms > 0)
+
+        if self.codes is not None:
+            # Puntajes aproximados con la copia int8, por bloques de filas: solo un bloque a la vez
+            # se convierte a float32 (el producto usa BLAS) y el escalado por fila se aplica al final
+            scores = np.empty((len(queries), len(rows)), dtype=np.float32)
+            for start in range(0, len(rows), self.query_block_rows):
+                block = rows[start:start + self.query_block_rows]
+                scores[:, start:start + len(block)] = (queries @ self.codes[block].T.astype(np.float32)) * self.scales[block]
+        else:
+            scores = queries @ self.vectors[rows].T  # (consultas, vectores del curso)
+
+        results = []
+        for query, query_scores, norm in zip(queries, scores, norms[:, 0]):
+            if not norm:
+                results.append([])
+                continue
+
+            if self.codes is not None and self.rescore:
+                # Reordenar los mejores candidatos con los vectores exactos (solo esas filas se leen del disco)
+                candidates = np.argsort(-query_scores)[:top_k * self.rescore_factor]
+                query_scores = np.full(len(rows), -np.inf, dtype=np.float32)
+                query_scores[candidates] = self.vectors[rows[candidates]] @ query
+
+            best = np.argsort(-query_scores)[:top_k]
+            results.append([(self.entries[rows[i]]['metadata'], float(query_scores[i])) for i in best])
+        return results
+
+    def _search_bytes(self) -> int:
+        if self.codes is not None:
+            block_bytes = min(self.query_block_rows, len(self.codes)) * self.embedding_dimension * 4
+            return self.codes.nbytes + self.scales.nbytes + block_bytes
+        return self.vectors.nbytes if self.vectors is not None else 0
+
+    def retrieval_config(self) -> Dict:
+        """Configuración de búsqueda más la cuantización (int8 sin reordenar cambia el ranking)"""
+        return {**super().retrieval_config(), 'quantization': self.quantization,
+                'rescore': self.rescore and self.quantization == 'int8', 'rescore_factor': self.rescore_factor}
+
+    def get_index_stats(self) -> Dict:
+        """Obtiene estadísticas del índice"""
+        courses = {}
+        for entry in self.entries:
+            course = entry['metadata'].get('course', '')
+            courses[course] = courses.get(course, 0) + 1
+
+        return {
+            'total_vectors': len(self.entries),
+            'namespaces': {self.namespace: {'vector_count': len(self.entries)}},
+            'courses': courses,
+            'backend': 'local',
+            'dimension': self.embedding_dimension,
+            'quantization': self.quantization,
+            # Bytes en memoria para cada búsqueda: la matriz float32 completa, o la copia int8 + escalas
+            # más el bloque convertido a float32 (como mucho query_block_rows filas)
+            'search_bytes': self._search_bytes()
+        }
@@ -3,36 +3,51 @@ Gestor de Pinecone Vector Store
 Maneja embeddings y búsqueda semántica de rúbricas
 """
 from pinecone import Pinecone, ServerlessSpec
-from openai import OpenAI
 import json
 import os
-from typing import List, Dict
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
-# Cargar variables de entorno
-load_dotenv()
+from vector_store.rubric_store import RubricVectorStore
 
-class PineconeManager:
+
+class PineconeManager(RubricVectorStore):
     """Gestiona la indexación y búsqueda en Pinecone"""
 
     def __init__(self):
         """Inicializa conexión con Pinecone y OpenAI"""
+        super().__init__()
         self.pinecone_api_key = os.getenv('PINECONE_API_KEY')
-        self.openai_api_key = os.getenv('OPENAI_API_KEY')
         self.index_name = os.getenv('INDEX_NAME', 'rubricamachine')
-        self.namespace = os.getenv('NAMESPACE', 'solomachine')
 
-        # Inicializar clientes
+        # Inicializar cliente
         self.pc = Pinecone(api_key=self.pinecone_api_key)
-        self.openai_client = OpenAI(api_key=self.openai_api_key)
 
-        # Dimensión de embeddings (text-embedding-3-large = 3072)
-        # IMPORTANTE: Tu índice 'rubricamachine' está configurado para 3072 dimensiones
-        self.embedding_dimension = 3072
-        self.embedding_model = "text-embedding-3-large"
+        # Upserts acotados por tamaño: límite de 2 MB y 1000 vectores por solicitud
+        # (~12 bytes por valor serializado: 50 vectores de 3072 dimensiones quedan bajo el límite)
+        self.max_upsert_bytes = int(2 * 1024 * 1024 * 0.9)
+        self.max_upsert_vectors = 1000
+        self.fetch_batch_size = 100  # Ids por fetch al leer el manifiesto desde el índice
+
+        # Conectar o crear índice en segundo plano: list_indexes/create_index no bloquean
+        # el arranque de la app; las operaciones que necesitan el índice esperan a que termine
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pinecone-init')
+        self._index_future = executor.submit(self._get_or_create_index)
+        executor.shutdown(wait=False)
+
+    @property
+    def index(self):
+        """Índice de Pinecone (espera la conexión en segundo plano; relanza su error si falló)"""
+        return self._index_future.result()
+
+    def is_ready(self) -> bool:
+        """True si la conexión con el índice terminó sin errores"""
+        return self._index_future.done() and self._index_future.exception() is None
 
-        # Conectar o crear índice
-        self.index = self._get_or_create_index()
+    def retrieval_config(self) -> Dict:
+        """Configuración de búsqueda más el índice de Pinecone consultado"""
+        return {**super().retrieval_config(), 'index_name': self.index_name}
 
     def _get_or_create_index(self):
         """Obtiene el índice existente o crea uno nuevo"""
@@ -55,6 +70,12 @@ class PineconeManager:
                 )
                 print(f"✓ Índice creado exitosamente")
             else:
+                existing = next(idx for idx in existing_indexes if idx.name == self.index_name)
+                if existing.dimension != self.embedding_dimension:
+                    raise ValueError(
+                        f"El índice '{self.index_name}' tiene {existing.dimension} dimensiones y "
+                        f"EMBEDDING_DIMENSIONS={self.embedding_dimension}; usa otro INDEX_NAME"
+                    )
                 print(f"✓ Índice '{self.index_name}' ya existe")
 
             return self.pc.Index(self.index_name)
@@ -63,255 +84,76 @@ class PineconeManager:
             print(f"✗ Error creando/accediendo al índice: {e}")
             raise
 
-    def create_embedding(self, text: str) -> List[float]:
-        """
-        Crea embedding de texto usando OpenAI
-
-        Args:
-            text: Texto a convertir en embedding
-
-        Returns:
-            Vector embedding
-        """
-        try:
-            response = self.openai_client.embeddings.create(
-                model=self.embedding_model,
-                input=text
-            )
-            return response.data[0].embedding
-
-        except Exception as e:
-            print(f"✗ Error creando embedding: {e}")
-            return [0.0] * self.embedding_dimension
-
-    def index_rubric(self, course_name: str, rubric_data: Dict):
-        """
-        Indexa una rúbrica completa en Pinecone
-        Soporta NUEVA estructura con criterios de evaluación
-
-        Args:
-            course_name: Nombre del curso
-            rubric_data: Datos de la rúbrica
-        """
-        try:
-            vectors_to_upsert = []
-
-            # NUEVA ESTRUCTURA: criterios_evaluacion (desde PDF)
-            if 'criterios_evaluacion' in rubric_data:
-                for i, criterio in enumerate(rubric_data['criterios_evaluacion']):
-                    # Crear texto descriptivo del criterio
-                    niveles_text = '\n'.join([
-                        f"  - {nivel['nivel'].upper()}: {nivel['descripcion'][:150]} ({nivel['puntaje_minimo']}-{nivel['puntaje_maximo']} pts)"
-                        for nivel in criterio.get('niveles', [])
-                    ])
-
-                    criterion_text = f"""
-Curso: {course_name}
-Criterio {criterio['numero']}: {criterio['nombre']}
-Puntaje máximo: {criterio['puntaje_maximo']} puntos
-
-Niveles de desempeño:
-{niveles_text}
-
-Descripción: {criterio.get('descripcion', '')}
-"""
-
-                    # Crear embedding
-                    embedding = self.create_embedding(criterion_text)
-
-                    # Preparar metadatos
-                    metadata = {
-                        'course': course_name,
-                        'criterion_number': criterio['numero'],
-                        'criterion_name': criterio['nombre'],
-                        'max_score': criterio['puntaje_maximo'],
-                        'levels': json.dumps(criterio['niveles'], ensure_ascii=False)
-                    }
-
-                    # ID único para este criterio
-                    vector_id = f"{course_name.lower().replace(' ', '_')}_criterio_{i}"
-
-                    vectors_to_upsert.append({
-                        'id': vector_id,
-                        'values': embedding,
-                        'metadata': metadata
-                    })
-
-                print(f"✓ Rúbrica de '{course_name}' indexada: {len(vectors_to_upsert)} criterios")
-
-            # ESTRUCTURA ANTIGUA: condiciones_entrega (compatibilidad)
-            elif 'condiciones_entrega' in rubric_data:
-                for i, seccion in enumerate(rubric_data['condiciones_entrega']):
-                    criterios_text = '\n'.join([f"- {c}" for c in seccion['criterios']])
-
-                    section_text = f"""
-Curso: {course_name}
-Sección: {seccion['seccion']}
-Peso: {seccion['peso']}%
-Criterios de evaluación:
-{criterios_text}
-"""
-
-                    embedding = self.create_embedding(section_text)
-
-                    metadata = {
-                        'course': course_name,
-                        'section': seccion['seccion'],
-                        'weight': seccion['peso'],
-                        'criteria_count': len(seccion['criterios']),
-                        'criteria': json.dumps(seccion['criterios'], ensure_ascii=False)
-                    }
-
-                    vector_id = f"{course_name.lower().replace(' ', '_')}_section_{i}"
-
-                    vectors_to_upsert.append({
-                        'id': vector_id,
-                        'values': embedding,
-                        'metadata': metadata
-                    })
-
-                print(f"✓ Rúbrica de '{course_name}' indexada: {len(vectors_to_upsert)} secciones")
-
-            # Insertar en Pinecone
-            if vectors_to_upsert:
-                self.index.upsert(
-                    vectors=vectors_to_upsert,
-                    namespace=self.namespace
-                )
-            else:
-                print(f"⚠ No se encontraron criterios en la rúbrica de '{course_name}'")
-
-        except Exception as e:
-            print(f"✗ Error indexando rúbrica: {e}")
-            raise
-
-    def search_relevant_criteria(self, document_text: str, course_name: str, top_k: int = 5) -> List[Dict]:
+    def _upsert_batches(self, vectors: List[Dict]) -> List[List[Dict]]:
+        """Agrupa los vectores en lotes bajo el tamaño máximo por solicitud"""
+        batches, current, current_bytes = [], [], 0
+        for vector in vectors:
+            size = 12 * len(vector['values']) + len(json.dumps(vector['metadata'], ensure_ascii=False)) + len(vector['id'])
+            if current and (current_bytes + size > self.max_upsert_bytes or len(current) >= self.max_upsert_vectors):
+                batches.append(current)
+                current, current_bytes = [], 0
+            current.append(vector)
+            current_bytes += size
+        if current:
+            batches.append(current)
+        return batches
+
+    def _upsert(self, vectors: List[Dict]):
+        """Inserta en Pinecone en lotes acotados por tamaño, enviados en paralelo"""
+        batches = self._upsert_batches(vectors)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_parallel_requests, len(batches)))) as executor:
+            # list() propaga el primer error de cualquier lote
+            list(executor.map(lambda batch: self.index.upsert(vectors=batch, namespace=self.namespace), batches))
+
+    def _delete(self, ids: List[str]):
+        """Elimina vectores por id en bloques"""
+        for start in range(0, len(ids), 1000):
+            self.index.delete(ids=ids[start:start + 1000], namespace=self.namespace)
+
+    def _manifest_path(self) -> Path:
+        """Un manifiesto por índice y namespace de Pinecone"""
+        return Path(os.getenv('VECTOR_MANIFEST_DIR', 'data/vector_store')) / f"{self.index_name}_{self.namespace}.manifest.json"
+
+    def _indexed_manifest(self) -> Optional[Dict[str, Dict]]:
         """
-        Busca criterios relevantes para un documento
-
-        Args:
-            document_text: Texto del documento del estudiante
-            course_name: Nombre del curso
-            top_k: Número de resultados a retornar
-
-        Returns:
-            Lista de criterios relevantes con scores
+        Lo indexado según Pinecone: ids del namespace (list) y el content_hash/curso de sus
+        metadatos (fetch). El archivo local no sobrevive a un redespliegue (data/ no se versiona)
+        ni se entera si el índice se recreó; el índice sí
         """
         try:
-            # Crear embedding del documento
-            query_embedding = self.create_embedding(document_text)
-
-            # Buscar en Pinecone
-            results = self.index.query(
-                vector=query_embedding,
-                top_k=top_k,
-                namespace=self.namespace,
-                filter={'course': course_name},
-                include_metadata=True
-            )
-
-            # Procesar resultados
-            relevant_criteria = []
-            for match in results['matches']:
-                relevant_criteria.append({
-                    'section': match['metadata']['section'],
-                    'weight': match['metadata']['weight'],
-                    'criteria': json.loads(match['metadata']['criteria']),
-                    'relevance_score': match['score']
-                })
-
-            return relevant_criteria
-
+            ids = [vector_id for page in self.index.list(namespace=self.namespace) for vector_id in page]
         except Exception as e:
-            print(f"✗ Error buscando criterios: {e}")
-            return []
-
-    def load_all_rubrics(self, courses_dir: str = 'courses', use_pdf: bool = False):
-        """
-        Carga todas las rúbricas desde el directorio de cursos
-        NUEVA OPCIÓN: Leer directamente desde PDFs si use_pdf=True
-
-        Args:
-            courses_dir: Directorio donde están las carpetas de cursos
-            use_pdf: Si True, busca archivos PDF de rúbricas en vez de JSON
-        """
-        try:
-            # Obtener directorio base del proyecto
-            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            courses_path = os.path.join(base_dir, courses_dir)
-
-            print(f"[LOAD] Cargando rúbricas desde: {courses_path}")
-            print(f"       Modo: {'PDFs automáticos' if use_pdf else 'JSON manual'}")
-
-            if use_pdf:
-                # NUEVO: Cargar desde PDFs automáticamente
-                import sys
-                # Agregar directorio padre al path
-                parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-                if parent_dir not in sys.path:
-                    sys.path.insert(0, parent_dir)
-
-                from processors.rubric_processor import RubricProcessor
-                rubric_processor = RubricProcessor()
-
-                course_configs = {
-                    'machine_learning': {
-                        'name': 'Machine Learning',
-                        'rubric_pdf': 'Rúbrica de evaluación - Fase 2 - Componente práctico - Prácticas simuladas.pdf'
-                    },
-                    'big_data_integration': {
-                        'name': 'Big Data Integration',
-                        'rubric_pdf': 'Evaluation Rubric - Stage 2 - Big Data Analytics and Machine Learning.pdf'
-                    }
-                }
-
-                for course_folder, config in course_configs.items():
-                    course_path = os.path.join(courses_path, course_folder)
-                    rubric_pdf_path = os.path.join(course_path, config['rubric_pdf'])
-
-                    if os.path.exists(rubric_pdf_path):
-                        print(f"  - Procesando PDF: {course_folder}")
-
-                        # Procesar PDF y extraer rúbrica
-                        rubric_data = rubric_processor.extract_rubric_from_pdf(
-                            rubric_pdf_path,
-                            config['name']
-                        )
-
-                        if rubric_data['success']:
-                            # Indexar en Pinecone
-                            self.index_rubric(config['name'], rubric_data)
-                        else:
-                            print(f"    ✗ Error procesando PDF: {rubric_data.get('error')}")
-                    else:
-                        print(f"    ⚠ No se encontró: {config['rubric_pdf']}")
-
-            else:
-                # CARGAR DESDE JSON ESTRUCTURADOS
-                course_configs = {
-                    'machine_learning': 'rubrica_estructurada.json',
-                    'big_data_integration': 'rubrica_estructurada.json'
-                }
-
-                for course_folder, json_file in course_configs.items():
-                    course_path = os.path.join(courses_path, course_folder)
-                    rubric_json_path = os.path.join(course_path, json_file)
-
-                    if os.path.exists(rubric_json_path):
-                        print(f"  - Procesando JSON: {course_folder}")
-
-                        # Leer rúbrica
-                        with open(rubric_json_path, 'r', encoding='utf-8') as f:
-                            rubric_data = json.load(f)
-
-                        # Indexar en Pinecone
-                        self.index_rubric(rubric_data['nombre_curso'], rubric_data)
-
-            print(f"✓ Todas las rúbricas cargadas en Pinecone")
-
-        except Exception as e:
-            print(f"✗ Error cargando rúbricas: {e}")
-            raise
+            # list() solo existe en índices serverless: con otros se usa el archivo local
+            print(f"  [SYNC] No se pudieron listar los ids del índice, se usa el manifiesto local: {e}")
+            return None
+
+        def fetch(batch):
+            return self.index.fetch(ids=batch, namespace=self.namespace).vectors
+
+        manifest = {}
+        batches = [ids[start:start + self.fetch_batch_size] for start in range(0, len(ids), self.fetch_batch_size)]
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_parallel_requests, len(batches)))) as executor:
+            for vectors in executor.map(fetch, batches):
+                for vector_id, vector in vectors.items():
+                    metadata = vector.metadata or {}
+                    manifest[vector_id] = {'hash': metadata.get('content_hash'), 'course': metadata.get('course')}
+        return manifest
+
+    def _query(self, vector: List[float], top_k: int, course_name: str) -> List[Tuple[Dict, float]]:
+        """Búsqueda en Pinecone filtrada por curso"""
+        results = self.index.query(
+            vector=vector,
+            top_k=top_k,
+            namespace=self.namespace,
+            filter={'course': course_name},
+            include_metadata=True
+        )
+        return [(match['metadata'], match['score']) for match in results['matches']]
+
+    def _query_many(self, vectors: List[List[float]], top_k: int, course_name: str) -> List[List[Tuple[Dict, float]]]:
+        """Consultas de los fragmentos del documento en paralelo"""
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            return list(executor.map(lambda vector: self._query(vector, top_k, course_name), vectors))
 
     def get_index_stats(self) -> Dict:
         """Obtiene estadísticas del índice"""
@@ -349,9 +191,7 @@ if __name__ == "__main__":
 
     print(f"   Resultados para: '{test_text[:50]}...'")
     for i, result in enumerate(results, 1):
-        print(f"\n   {i}. Sección: {result['section']}")
-        print(f"      Peso: {result['weight']}%")
+        print(f"\n   {i}. Criterio {result.get('criterion_number')}: {result.get('criterion_name', result.get('section'))}")
         print(f"      Relevancia: {result['relevance_score']:.2f}")
-        print(f"      Criterios: {len(result['criteria'])}")
 
     print("\n✓ Test completado")
@@ -0,0 +1,659 @@
+"""
+Almacén Vectorial de Rúbricas (base común)
+Embeddings en lote con cache en disco, preparación de criterios/secciones de cada
+rúbrica y búsqueda semántica. Los backends (Pinecone, local) implementan solo el
+almacenamiento: _upsert, _query y get_index_stats.
+"""
+from openai import OpenAI
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+import numpy as np
+
+from feedback.course_router import tokenize
+from feedback.detailed_task_checker import DetailedTaskChecker
+from feedback.evidence_extractor import split_segments
+from storage.embedding_cache import EmbeddingCache
+from vector_store.lexical_index import LexicalIndex
+
+# Cargar variables de entorno
+load_dotenv()
+
+
+class RubricVectorStore:
+    """Indexación y búsqueda semántica de rúbricas, independiente del backend"""
+
+    def __init__(self, embedding_client=None, dimensions: int = None):
+        """
+        Inicializa el cliente de embeddings
+
+        Args:
+            embedding_client: Cliente con la interfaz embeddings.create de OpenAI
+                (opcional; por defecto OpenAI con OPENAI_API_KEY)
+            dimensions: Dimensión de los embeddings (por defecto EMBEDDING_DIMENSIONS o 3072)
+        """
+        self.openai_api_key = os.getenv('OPENAI_API_KEY')
+        self.namespace = os.getenv('NAMESPACE', 'solomachine')
+        self.openai_client = embedding_client or OpenAI(api_key=self.openai_api_key)
+
+        # Dimensión de embeddings (text-embedding-3-large = 3072 nativas)
+        # Con menos dimensiones el modelo acorta el vector (parámetro 'dimensions' de la API)
+        # IMPORTANTE: Tu índice 'rubricamachine' está configurado para 3072 dimensiones;
+        # otra dimensión requiere otro índice de Pinecone (INDEX_NAME)
+        self.embedding_model = "text-embedding-3-large"
+        self.native_dimension = 3072
+        self.embedding_dimension = int(dimensions or os.getenv('EMBEDDING_DIMENSIONS', self.native_dimension))
+
+        # Lotes de embeddings (límite de la API: 2048 entradas y ~300k tokens por solicitud)
+        self.max_batch_inputs = 2048
+        self.max_batch_tokens = 250000
+        self.max_parallel_requests = 4  # Solicitudes simultáneas de embeddings / upserts
+
+        # Cache en disco de embeddings (rúbricas sin cambios y documentos re-subidos)
+        self.embedding_cache = EmbeddingCache()
+
+        # Búsqueda por fragmentos del documento
+        self.query_chunk_chars = 6000  # ~2k tokens por fragmento (límite del modelo: 8191)
+        self.query_candidates = 20     # Vectores recuperados por fragmento antes de agregar
+        self.chunks_per_match = 3      # Fragmentos devueltos por criterio
+
+        # Búsqueda híbrida: índice BM25 en memoria por curso (criterios + tareas de condiciones.json)
+        self.lexical_indexes: Dict[str, Optional[LexicalIndex]] = {}
+        self.lexical_weight = float(os.getenv('HYBRID_LEXICAL_WEIGHT', '0.3'))  # Peso de BM25 en la fusión
+        self.lexical_decisive_score = 0.5  # Puntaje BM25 relativo desde el que un criterio coincide claramente
+        self.lexical_weak_score = 0.25     # ... y hasta el que la coincidencia es claramente débil
+        # BM25 absoluto mínimo para que la señal léxica cuente (~2 términos exclusivos de un criterio);
+        # por debajo los puntajes relativos se escalan contra este valor y nunca son decisivos
+        self.lexical_min_raw_score = 3.0
+        self.lexical_only_max_chars = 500  # Consultas cortas (palabras clave) que BM25 puede responder solo
+
+    def is_ready(self) -> bool:
+        """True si el índice está listo para consultas (los backends remotos conectan en segundo plano)"""
+        return True
+
+    def retrieval_config(self) -> Dict:
+        """Configuración que determina los resultados de la búsqueda (para el cache de evaluaciones)"""
+        return {
+            'backend': type(self).__name__,
+            'namespace': self.namespace,
+            'embedding_model': self.embedding_model,
+            'embedding_dimension': self.embedding_dimension,
+            'query': [self.query_chunk_chars, self.query_candidates],
+            'lexical': {
+                'weight': self.lexical_weight,
+                'decisive': self.lexical_decisive_score,
+                'weak': self.lexical_weak_score,
+                'min_raw': self.lexical_min_raw_score,
+                'only_max_chars': self.lexical_only_max_chars
+            }
+        }
+
+    def _dimension_args(self) -> Dict:
+        """Parámetro 'dimensions' de la API solo si se pide un vector más corto que el nativo"""
+        if self.embedding_dimension != self.native_dimension:
+            return {'dimensions': self.embedding_dimension}
+        return {}
+
+    def create_embedding(self, text: str) -> List[float]:
+        """
+        Crea embedding de texto usando OpenAI
+
+        Args:
+            text: Texto a convertir en embedding
+
+        Returns:
+            Vector embedding
+        """
+        cached = self.embedding_cache.get(self.embedding_model, self.embedding_dimension, text)
+        if cached is not None:
+            return cached
+
+        try:
+            response = self.openai_client.embeddings.create(
+                model=self.embedding_model,
+                input=text,
+                **self._dimension_args()
+            )
+            embedding = response.data[0].embedding
+            self.embedding_cache.put(self.embedding_model, self.embedding_dimension, text, embedding)
+            return embedding
+
+        except Exception as e:
+            print(f"✗ Error creando embedding: {e}")
+            return [0.0] * self.embedding_dimension
+
+    def create_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Crea embeddings de varios textos en pocas solicitudes (el endpoint acepta listas)
+
+        Los textos ya guardados en el cache de embeddings no se envían; el resto se agrupa
+        en lotes acotados por tokens estimados y por número de entradas. El orden del
+        resultado corresponde al de los textos.
+
+        Args:
+            texts: Textos a convertir en embeddings
+
+        Returns:
+            Lista de vectores (uno por texto)
+        """
+        embeddings = self.embedding_cache.get_many(self.embedding_model, self.embedding_dimension, texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+
+        batches, current, current_tokens = [], [], 0
+        for i in missing:
+            text = texts[i]
+            tokens = len(text) // 3 + 1  # Estimación conservadora (~3 caracteres por token)
+            if current and (current_tokens + tokens > self.max_batch_tokens or len(current) >= self.max_batch_inputs):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+
+        def embed_batch(batch):
+            response = self.openai_client.embeddings.create(
+                model=self.embedding_model,
+                input=[texts[i] for i in batch],
+                **self._dimension_args()
+            )
+            # La API devuelve cada embedding con su índice en la lista de entrada
+            for item in response.data:
+                text_index = batch[item.index]
+                embeddings[text_index] = item.embedding
+                self.embedding_cache.put(self.embedding_model, self.embedding_dimension, texts[text_index], item.embedding)
+
+        # Varias solicitudes (reindexación completa de muchos cursos) se envían en paralelo
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_parallel_requests, len(batches)))) as executor:
+            list(executor.map(embed_batch, batches))
+
+        print(f"  [EMBED] {len(texts)} textos ({len(texts) - len(missing)} en cache) -> {len(batches)} solicitud(es) de embeddings")
+        return embeddings
+
+    @staticmethod
+    def _content_hash(text: str) -> str:
+        """Huella del texto indexado de un criterio (detecta cambios en la rúbrica)"""
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _rubric_items(self, course_name: str, rubric_data: Dict) -> List[Dict]:
+        """
+        Textos y metadatos a indexar de una rúbrica (un elemento por criterio o sección)
+
+        Returns:
+            Lista de {'id', 'text', 'metadata'}
+        """
+        items = []
+
+        # NUEVA ESTRUCTURA: criterios_evaluacion (desde PDF)
+        if 'criterios_evaluacion' in rubric_data:
+            for i, criterio in enumerate(rubric_data['criterios_evaluacion']):
+                # Crear texto descriptivo del criterio
+                niveles_text = '\n'.join([
+                    f"  - {nivel['nivel'].upper()}: {nivel['descripcion'][:150]} ({nivel['puntaje_minimo']}-{nivel['puntaje_maximo']} pts)"
+                    for nivel in criterio.get('niveles', [])
+                ])
+
+                criterion_text = f"""
+Curso: {course_name}
+Criterio {criterio['numero']}: {criterio['nombre']}
+Puntaje máximo: {criterio['puntaje_maximo']} puntos
+
+Niveles de desempeño:
+{niveles_text}
+
+Descripción: {criterio.get('descripcion', '')}
+"""
+
+                items.append({
+                    # ID único para este criterio
+                    'id': f"{course_name.lower().replace(' ', '_')}_criterio_{i}",
+                    'text': criterion_text,
+                    'metadata': {
+                        'course': course_name,
+                        'content_hash': self._content_hash(criterion_text),
+                        'criterion_number': criterio['numero'],
+                        'criterion_name': criterio['nombre'],
+                        'max_score': criterio['puntaje_maximo'],
+                        'levels': json.dumps(criterio['niveles'], ensure_ascii=False)
+                    }
+                })
+
+        # ESTRUCTURA ANTIGUA: condiciones_entrega (compatibilidad)
+        elif 'condiciones_entrega' in rubric_data:
+            for i, seccion in enumerate(rubric_data['condiciones_entrega']):
+                criterios_text = '\n'.join([f"- {c}" for c in seccion['criterios']])
+
+                section_text = f"""
+Curso: {course_name}
+Sección: {seccion['seccion']}
+Peso: {seccion['peso']}%
+Criterios de evaluación:
+{criterios_text}
+"""
+
+                items.append({
+                    'id': f"{course_name.lower().replace(' ', '_')}_section_{i}",
+                    'text': section_text,
+                    'metadata': {
+                        'course': course_name,
+                        'content_hash': self._content_hash(section_text),
+                        'section': seccion['seccion'],
+                        'weight': seccion['peso'],
+                        'criteria_count': len(seccion['criterios']),
+                        'criteria': json.dumps(seccion['criterios'], ensure_ascii=False)
+                    }
+                })
+
+        else:
+            print(f"⚠ No se encontraron criterios en la rúbrica de '{course_name}'")
+
+        return items
+
+    def _index_items(self, items: List[Dict]):
+        """Crea los embeddings de todos los elementos en lote y los inserta en el índice"""
+        if not items:
+            return
+
+        embeddings = self.create_embeddings([item['text'] for item in items])
+        self._upsert([
+            {'id': item['id'], 'values': embedding, 'metadata': item['metadata']}
+            for item, embedding in zip(items, embeddings)
+        ])
+
+    def _manifest_path(self) -> Path:
+        """Manifiesto local de lo indexado: {id: {'hash', 'course'}} por modelo y dimensiones"""
+        return Path(os.getenv('VECTOR_MANIFEST_DIR', 'data/vector_store')) / f"{self.namespace}.manifest.json"
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        """Elementos indexados según el manifiesto (vacío si no existe o cambió el modelo de embeddings)"""
+        path = self._manifest_path()
+        if not path.exists():
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except Exception as e:
+            print(f"  [SYNC] Manifiesto ilegible, se reindexará todo: {e}")
+            return {}
+
+        if manifest.get('model') != self.embedding_model or manifest.get('dimensions') != self.embedding_dimension:
+            print("  [SYNC] Cambió el modelo de embeddings -> se reindexará todo")
+            return {}
+        return manifest.get('items', {})
+
+    def _save_manifest(self, items: Dict[str, Dict]):
+        path = self._manifest_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'model': self.embedding_model, 'dimensions': self.embedding_dimension, 'items': items},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def _indexed_ids(self) -> Optional[Set[str]]:
+        """Ids presentes en el índice si el backend los conoce sin costo (None = confiar en el manifiesto)"""
+        return None
+
+    def _indexed_manifest(self) -> Optional[Dict[str, Dict]]:
+        """
+        Manifiesto leído del propio índice ({id: {'hash', 'course'}} desde los metadatos de cada
+        vector) para backends remotos cuyo archivo local puede perderse (None = usar el archivo)
+        """
+        return None
+
+    def _sync_items(self, items: List[Dict], courses: Set[str] = None) -> Dict:
+        """
+        Indexa solo los elementos nuevos o modificados y borra los que ya no existen
+
+        Args:
+            items: Elementos de las rúbricas ({'id', 'text', 'metadata'})
+            courses: Cursos a los que corresponden los elementos; solo se borran ids de
+                estos cursos (None = los elementos cubren todas las rúbricas)
+
+        Returns:
+            Dict con 'indexed', 'deleted' y 'unchanged'
+        """
+        manifest = self._indexed_manifest()
+        if manifest is None:
+            manifest = self._load_manifest()
+            indexed_ids = self._indexed_ids()
+            if indexed_ids is not None:
+                # El índice local pudo borrarse o reconstruirse: lo que falta se vuelve a indexar
+                manifest = {item_id: entry for item_id, entry in manifest.items() if item_id in indexed_ids}
+
+        current_ids = {item['id'] for item in items}
+        changed = [item for item in items
+                   if manifest.get(item['id'], {}).get('hash') != item['metadata']['content_hash']]
+        removed = [item_id for item_id, entry in manifest.items()
+                   if item_id not in current_ids and (courses is None or entry.get('course') in courses)]
+
+        if not changed and not removed:
+            return {'indexed': 0, 'deleted': 0, 'unchanged': len(items)}
+
+        self._index_items(changed)
+        if removed:
+            self._delete(removed)
+
+        for item_id in removed:
+            manifest.pop(item_id, None)
+        for item in changed:
+            manifest[item['id']] = {'hash': item['metadata']['content_hash'], 'course': item['metadata']['course']}
+        self._save_manifest(manifest)
+        return {'indexed': len(changed), 'deleted': len(removed), 'unchanged': len(items) - len(changed)}
+
+    def index_rubric(self, course_name: str, rubric_data: Dict):
+        """
+        Indexa una rúbrica completa en el índice vectorial
+        Soporta NUEVA estructura con criterios de evaluación
+        Solo se embeben los criterios nuevos o modificados desde la última indexación
+
+        Args:
+            course_name: Nombre del curso
+            rubric_data: Datos de la rúbrica
+        """
+        try:
+            sync = self._sync_items(self._rubric_items(course_name, rubric_data), courses={course_name})
+            print(f"✓ Rúbrica de '{course_name}': {sync['indexed']} indexados, {sync['deleted']} eliminados, {sync['unchanged']} sin cambios")
+
+        except Exception as e:
+            print(f"✗ Error indexando rúbrica: {e}")
+            raise
+
+    @staticmethod
+    def _match_key(metadata: Dict):
+        """Llave de un criterio (o sección) en los resultados de búsqueda"""
+        return metadata.get('criterion_number', metadata.get('section'))
+
+    def build_lexical_index(self, course_name: str, items: List[Dict], condiciones: Dict = None):
+        """
+        Construye el índice BM25 del curso con el texto de cada criterio más sus tareas y entregables
+
+        Args:
+            course_name: Nombre del curso
+            items: Elementos de la rúbrica (ver _rubric_items)
+            condiciones: Contenido de condiciones.json del curso (opcional)
+        """
+        documents = []
+        for item in items:
+            metadata = item['metadata']
+            text = item['text']
+            if condiciones and 'criterion_number' in metadata:
+                tasks = DetailedTaskChecker.get_tasks(metadata['criterion_number'], condiciones)
+                text = '\n'.join([text] + tasks['tasks'] + tasks['deliverables'])
+            documents.append({'key': self._match_key(metadata), 'text': text, 'metadata': metadata})
+
+        self.lexical_indexes[course_name] = LexicalIndex(documents)
+
+    def _lexical_index(self, course_name: str) -> Optional[LexicalIndex]:
+        """Índice BM25 del curso (se construye desde courses/ la primera vez que se consulta)"""
+        if course_name not in self.lexical_indexes:
+            self.lexical_indexes[course_name] = None
+            for course in self.discover_courses():
+                try:
+                    with open(course['rubric_path'], 'r', encoding='utf-8') as f:
+                        rubric_data = json.load(f)
+                except Exception as e:
+                    print(f"  [LEX] Rúbrica ilegible ({course['folder']}): {e}")
+                    continue
+                if rubric_data.get('nombre_curso') == course_name:
+                    self.build_lexical_index(course_name, self._rubric_items(course_name, rubric_data),
+                                             self._load_condiciones(course['path']))
+                    break
+        return self.lexical_indexes[course_name]
+
+    @staticmethod
+    def _load_condiciones(course_path) -> Optional[Dict]:
+        """condiciones.json de la carpeta del curso, si existe"""
+        condiciones_path = Path(course_path) / 'condiciones.json'
+        if not condiciones_path.exists():
+            return None
+        with open(condiciones_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _lexical_decisive(self, lexical: Dict) -> bool:
+        """
+        La señal léxica decide sola si separa los criterios en coincidencias claras y
+        coincidencias débiles o nulas (sin zona intermedia que requiera la búsqueda vectorial)
+        """
+        if max(entry['raw'] for entry in lexical.values()) < self.lexical_min_raw_score:
+            return False  # Sin señal léxica suficiente (incluye consultas sin ningún término en común)
+
+        scores = [entry['score'] for entry in lexical.values()]
+        return (any(score <= self.lexical_weak_score for score in scores)
+                and all(score <= self.lexical_weak_score or score >= self.lexical_decisive_score for score in scores))
+
+    def search_relevant_criteria(self, document_text: str, course_name: str, top_k: int = 5,
+                                 pooling: str = 'max', hybrid: bool = True) -> List[Dict]:
+        """
+        Busca criterios relevantes para un documento
+
+        El documento se divide en fragmentos que se embeben en una sola solicitud, así la
+        búsqueda funciona con documentos de cualquier tamaño (el modelo admite ~8k tokens
+        por entrada).
+
+        Args:
+            document_text: Texto del documento del estudiante
+            course_name: Nombre del curso
+            top_k: Número de resultados a retornar
+            pooling: 'max' (similitud máxima entre fragmentos) o 'mean' (promedio de los
+                vectores de los fragmentos, una sola consulta)
+            hybrid: Fusionar la similitud vectorial con BM25 sobre criterios y tareas. En consultas
+                cortas con señal léxica decisiva se responde sin embeber el texto
+
+        Returns:
+            Lista de criterios relevantes con scores; cada uno incluye 'chunks' con los
+            fragmentos más parecidos ({'start', 'end', 'score'}) para reutilizarlos en prompts,
+            'vector_score' y 'lexical_score' (None si no se calculó) y 'retrieval'
+            ('hybrid', 'vector' o 'lexical')
+        """
+        lexical_index = self._lexical_index(course_name) if hybrid else None
+        lexical = lexical_index.search(document_text, self.lexical_min_raw_score) if lexical_index else {}
+
+        if lexical and len(document_text) <= self.lexical_only_max_chars and self._lexical_decisive(lexical):
+            print(f"  [LEX] Señal léxica decisiva -> {sum(1 for e in lexical.values() if e['score'] > 0)} criterio(s) sin embeber el documento")
+            ranked = sorted(lexical.values(), key=lambda entry: entry['score'], reverse=True)[:top_k]
+            return [
+                {**self._format_match(entry['metadata'], entry['score']), 'vector_score': None,
+                 'lexical_score': round(entry['score'], 4), 'retrieval': 'lexical', 'chunks': []}
+                for entry in ranked
+            ]
+
+        if not self.is_ready():
+            # El índice aún se está conectando: se evalúa sin recuperación en lugar de esperar
+            print("  [VS] Índice vectorial aún no disponible -> evaluación sin búsqueda de criterios")
+            return []
+
+        try:
+            chunks = split_segments(document_text, self.query_chunk_chars)
+            chunk_embeddings = self.create_embeddings([chunk['text'] for chunk in chunks])
+
+            if pooling == 'mean':
+                query_embeddings = [np.mean(np.asarray(chunk_embeddings, dtype=np.float32), axis=0).tolist()]
+            else:
+                query_embeddings = chunk_embeddings
+
+            # Buscar en el índice (solo vectores del curso) con cada fragmento
+            per_chunk = self._query_many(query_embeddings, self.query_candidates, course_name)
+
+            best = {}
+            for chunk_index, matches in enumerate(per_chunk):
+                for metadata, score in matches:
+                    key = self._match_key(metadata)
+                    entry = best.setdefault(key, {'metadata': metadata, 'score': score, 'chunks': []})
+                    entry['score'] = max(entry['score'], score)
+                    if pooling != 'mean':
+                        chunk = chunks[chunk_index]
+                        entry['chunks'].append({
+                            'start': chunk['start'],
+                            'end': chunk['start'] + len(chunk['text']),
+                            'score': round(score, 4)
+                        })
+
+            # Fusión lineal: similitud coseno y BM25 relativo quedan en la misma escala [0, 1]
+            for key, entry in best.items():
+                entry['vector_score'] = entry['score']
+                entry['lexical_score'] = lexical[key]['score'] if key in lexical else None
+                if entry['lexical_score'] is not None:
+                    entry['score'] = (1 - self.lexical_weight) * entry['score'] + self.lexical_weight * entry['lexical_score']
+
+            ranked = sorted(best.values(), key=lambda entry: entry['score'], reverse=True)[:top_k]
+            return [
+                {
+                    **self._format_match(entry['metadata'], entry['score']),
+                    'vector_score': round(entry['vector_score'], 4),
+                    'lexical_score': round(entry['lexical_score'], 4) if entry['lexical_score'] is not None else None,
+                    'retrieval': 'hybrid' if lexical else 'vector',
+                    'chunks': sorted(entry['chunks'], key=lambda chunk: chunk['score'], reverse=True)[:self.chunks_per_match]
+                }
+                for entry in ranked
+            ]
+
+        except Exception as e:
+            print(f"✗ Error buscando criterios: {e}")
+            return []
+
+    def _query_many(self, vectors: List[List[float]], top_k: int, course_name: str) -> List[List[Tuple[Dict, float]]]:
+        """Una búsqueda por vector (los backends pueden resolverlas juntas)"""
+        return [self._query(vector, top_k, course_name) for vector in vectors]
+
+    @staticmethod
+    def _format_match(metadata: Dict, score: float) -> Dict:
+        """Resultado de búsqueda según la estructura de la rúbrica indexada"""
+        if 'section' in metadata:
+            return {
+                'section': metadata['section'],
+                'weight': metadata['weight'],
+                'criteria': json.loads(metadata['criteria']),
+                'relevance_score': score
+            }
+
+        return {
+            'criterion_number': metadata['criterion_number'],
+            'criterion_name': metadata['criterion_name'],
+            'max_score': metadata['max_score'],
+            'levels': json.loads(metadata['levels']),
+            'relevance_score': score
+        }
+
+    @staticmethod
+    def discover_courses(courses_dir: str = 'courses', use_pdf: bool = False) -> List[Dict]:
+        """
+        Carpetas de curso con rúbrica: rubrica_estructurada.json o, con use_pdf, un PDF cuyo
+        nombre contenga "rúbrica"/"rubric"
+
+        Returns:
+            Lista de {'folder', 'path', 'rubric_path'} ordenada por carpeta
+        """
+        base_dir = Path(__file__).resolve().parent.parent
+        courses_path = Path(courses_dir) if os.path.isabs(courses_dir) else base_dir / courses_dir
+        courses = []
+
+        for course_path in sorted(p for p in courses_path.iterdir() if p.is_dir()) if courses_path.exists() else []:
+            if use_pdf:
+                pdfs = [pdf for pdf in sorted(course_path.glob('*.pdf')) if 'rubric' in ' '.join(tokenize(pdf.stem))]
+                rubric_path = pdfs[0] if pdfs else None
+            else:
+                rubric_path = course_path / 'rubrica_estructurada.json'
+                rubric_path = rubric_path if rubric_path.exists() else None
+
+            if rubric_path is not None:
+                courses.append({'folder': course_path.name, 'path': course_path, 'rubric_path': rubric_path})
+        return courses
+
+    def _prepare_course(self, course: Dict, use_pdf: bool) -> Tuple[str, List[Dict]]:
+        """Lee la rúbrica de un curso (JSON o PDF), construye su índice BM25 y devuelve sus elementos"""
+        json_path = course['path'] / 'rubrica_estructurada.json'
+
+        if use_pdf:
+            from processors.rubric_processor import RubricProcessor
+
+            # El nombre del curso sale del JSON si existe (el mismo que usa la app)
+            if json_path.exists():
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    course_name = json.load(f)['nombre_curso']
+            else:
+                course_name = course['folder'].replace('_', ' ').title()
+
+            rubric_data = RubricProcessor().extract_rubric_from_pdf(str(course['rubric_path']), course_name)
+            if not rubric_data['success']:
+                raise ValueError(f"Error procesando PDF: {rubric_data.get('error')}")
+        else:
+            with open(course['rubric_path'], 'r', encoding='utf-8') as f:
+                rubric_data = json.load(f)
+            course_name = rubric_data['nombre_curso']
+
+        items = self._rubric_items(course_name, rubric_data)
+        self.build_lexical_index(course_name, items, self._load_condiciones(course['path']))
+        return course_name, items
+
+    def load_all_rubrics(self, courses_dir: str = 'courses', use_pdf: bool = False):
+        """
+        Carga todas las rúbricas desde el directorio de cursos
+        NUEVA OPCIÓN: Leer directamente desde PDFs si use_pdf=True
+
+        Los cursos se descubren en courses_dir y se preparan en paralelo; luego se sincroniza
+        el índice una sola vez (solo lo nuevo o modificado). Es idempotente: sin cambios en
+        las rúbricas no se llama a la API de embeddings ni se escribe en el índice.
+
+        Args:
+            courses_dir: Directorio donde están las carpetas de cursos
+            use_pdf: Si True, busca archivos PDF de rúbricas en vez de JSON
+
+        Returns:
+            Dict con 'courses', 'failed', 'indexed', 'deleted', 'unchanged' y 'seconds'
+        """
+        start = time.perf_counter()
+        if use_pdf:
+            # Se importa antes de los hilos (importaciones concurrentes ven el módulo a medio
+            # cargar); sin PyPDF2/pdfplumber falla aquí con la dependencia que falta
+            import processors.rubric_processor  # noqa: F401
+        courses = self.discover_courses(courses_dir, use_pdf)
+        print(f"[LOAD] {len(courses)} curso(s) en '{courses_dir}' ({'PDFs automáticos' if use_pdf else 'JSON manual'})")
+
+        # Elementos de todas las rúbricas: se indexan juntos al final
+        items, loaded, failed, course_names = [], [], [], set()
+        with ThreadPoolExecutor(max_workers=max(1, min(8, len(courses)))) as executor:
+            futures = {executor.submit(self._prepare_course, course, use_pdf): course for course in courses}
+            for future in as_completed(futures):
+                try:
+                    course_name, course_items = future.result()
+                except Exception as e:
+                    failed.append(futures[future]['folder'])
+                    print(f"  ✗ {futures[future]['folder']}: {e}")
+                    continue
+                loaded.append(f"{course_name} ({len(course_items)})")
+                course_names.add(course_name)
+                items.extend(course_items)
+
+        # Solo se borran vectores de cursos que se leyeron: un curso fallido o sin PDF de rúbrica
+        # (use_pdf) conserva los suyos. Sin PDFs ni fallos, los cursos quitados de disco se eliminan
+        sync = self._sync_items(items, courses=course_names if (use_pdf or failed) else None)
+
+        result = {'courses': sorted(loaded), 'failed': failed, **sync, 'seconds': round(time.perf_counter() - start, 2)}
+        print(
+            f"✓ Rúbricas cargadas en el índice vectorial: {', '.join(result['courses']) or 'ninguna'} | "
+            f"{sync['indexed']} indexados, {sync['deleted']} eliminados, {sync['unchanged']} sin cambios | "
+            f"{result['seconds']} s" + (f" | con errores: {', '.join(failed)}" if failed else "")
+        )
+        return result
+
+    def _upsert(self, vectors: List[Dict]):
+        """Inserta o reemplaza vectores {'id', 'values', 'metadata'} en el índice"""
+        raise NotImplementedError
+
+    def _delete(self, ids: List[str]):
+        """Elimina vectores por id"""
+        raise NotImplementedError
+
+    def _query(self, vector: List[float], top_k: int, course_name: str) -> List[Tuple[Dict, float]]:
+        """Vectores más similares del curso: lista de (metadatos, similitud coseno)"""
+        raise NotImplementedError
+
+    def get_index_stats(self) -> Dict:
+        """Obtiene estadísticas del índice"""
+        raise NotImplementedError